@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+"""
+Import time benchmark of the commandline interface, measured with
+python -X importtime. Serves as regression guard: it fails if a heavy module
+is imported while showing the help or completing a subcommand name, or if the
+startup gets slower than the given limit.
+
+Usage: python -m benchmarks.bench_import [--max-ms 150]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+TOOLBOX = os.path.join(os.path.dirname(os.path.dirname(__file__)), "vault_toolbox.py")
+
+# Modules that must not be imported without a subcommand to run
+HEAVY_MODULES = ["requests", "yaml", "urllib3", "asyncio", "vault.vault"]
+
+# Commandlines to measure, the second element tells whether heavy modules are
+# allowed
+COMMANDLINES = [
+    (["--help"], False),
+    (["secret-list", "--help"], True),
+]
+
+
+def import_times(arguments, env=None):
+    """ Run the toolbox with -X importtime and parse the result
+
+    :arguments: commandline arguments for the toolbox
+    :env: environment of the process
+    :returns: dict of top level module names and cumulative microseconds
+
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", TOOLBOX] + arguments,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=env,
+        text=True,
+        check=False,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|", 2)
+        # Keep the indentation of nested imports, drop the separator space
+        times[name[1:].rstrip()] = int(cumulative)
+    return times
+
+
+def total_ms(times):
+    """ Sum up the cumulative time of the top level imports
+
+    :times: dict as returned by import_times
+    :returns: milliseconds
+
+    """
+    # Nested imports are indented and already part of their parent
+    return sum(value for name, value in times.items() if name == name.lstrip()) / 1000
+
+
+def main():
+    """Entrypoint when used as an executable
+    :returns: None
+
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--max-ms", type=float, help="fail if --help imports take longer than this"
+    )
+    args = parser.parse_args()
+
+    failed = False
+    completion = dict(os.environ, _ARGCOMPLETE="1", COMP_LINE="vault_toolbox.py sec")
+    runs = [(arguments, allowed, None) for arguments, allowed in COMMANDLINES]
+    runs.append((["<tab completion>"], False, completion))
+    for arguments, heavy_allowed, env in runs:
+        times = import_times(arguments if env is None else [], env)
+        names = {name.strip() for name in times}
+        heavy = [module for module in HEAVY_MODULES if module in names]
+        milliseconds = total_ms(times)
+        print(f"{' '.join(arguments):30} {milliseconds:8.1f} ms  heavy: {heavy}")
+        if heavy and not heavy_allowed:
+            failed = True
+        if args.max_ms and not heavy_allowed and milliseconds > args.max_ms:
+            failed = True
+    if failed:
+        print("Import time regression", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+"""
+Benchmark comparing one connection per request (module level requests.request)
+with the pooled keep-alive session of the Vault class.
+
+Usage: python -m benchmarks.bench_session [requests]
+"""
+import sys
+import time
+import requests
+from vault.vault import Vault
+from .fake_vault import FakeVault
+
+
+def bench(request, count):
+    """Issue the given number of requests and measure the throughput
+
+    :request: callable issuing a single request
+    :count: number of requests
+    :returns: requests per second
+
+    """
+    start = time.perf_counter()
+    for _ in range(count):
+        request()
+    return count / (time.perf_counter() - start)
+
+
+def main():
+    """Entrypoint when used as an executable
+    :returns: None
+
+    """
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with FakeVault({"folder/secret": {"user": "name"}}) as server:
+        vault = Vault(server.url, "token")
+        address = server.url + "/v1/secret/metadata/folder"
+        before = bench(
+            lambda: requests.request("LIST", address, headers=vault.token_header),
+            count,
+        )
+        after = bench(
+            lambda: vault.requests_request("LIST", address, headers=vault.token_header),
+            count,
+        )
+        vault.close()
+    print(f"requests.request:         {before:10.1f} req/s")
+    print(f"Vault.requests_request:   {after:10.1f} req/s")
+    print(f"speedup:                  {after / before:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
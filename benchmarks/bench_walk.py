@@ -0,0 +1,120 @@
+#!/usr/bin/python3
+"""
+Microbenchmark of the sequential tree traversal of Secret.recursive_list on
+synthetic listings with one million entries. The listings are generated in
+memory, so only the traversal itself is measured. The recursive generator
+chain the traversal used before is timed for comparison.
+
+Usage: python -m benchmarks.bench_walk [--entries 1000000] [--memory]
+"""
+import argparse
+import sys
+import time
+import tracemalloc
+from vault.secret import Secret
+from vault.vault import Vault
+
+
+class SyntheticSecret(Secret):
+
+    """Secret class listing a generated tree instead of vault."""
+
+    def __init__(self, shape, entries):
+        """
+        :shape: "wide" for 1000 folders with the same number of secrets each,
+        "deep" for a chain of 2000 folders with the same number of secrets
+        on every level
+        :entries: total number of secrets
+        """
+        super().__init__(Vault)
+        self.shape = shape
+        self.entries = entries
+        if shape == "wide":
+            self.folders = 1000
+            self.keys = ["secret%d" % number for number in range(entries // 1000)]
+        else:
+            self.folders = 2000
+            self.keys = ["secret%d" % number for number in range(entries // 2000)]
+
+    def list(self, engine_path, path):
+        depth = path.count("/")
+        if self.shape == "wide":
+            if depth <= 1:
+                return ["folder%d/" % number for number in range(self.folders)]
+            return self.keys
+        if depth < self.folders:
+            return self.keys + ["folder/"]
+        return self.keys
+
+
+def legacy_recursive_list(secret, engine_path, path):
+    """ The recursive traversal with one generator per folder level, every
+    secret passes through the generators of all levels above it
+
+    :returns: generator for the secret list
+
+    """
+    for key in secret.list(engine_path, path):
+        new_secret = secret.join(path, key)
+        yield new_secret
+        if key.endswith("/"):
+            yield from legacy_recursive_list(secret, engine_path, new_secret)
+
+
+def measure(walk, memory):
+    """ Consume the given walk
+
+    :walk: callable returning the generator
+    :memory: trace the allocations, slows the walk down
+    :returns: tuple of entries, seconds and peak memory in bytes or None
+
+    """
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    entries = 0
+    for _ in walk():
+        entries = entries + 1
+    seconds = time.perf_counter() - start
+    peak = None
+    if memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return entries, seconds, peak
+
+
+def main():
+    """Entrypoint when used as an executable
+    :returns: None
+
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument(
+        "--memory", help="also report the peak memory", action="store_true"
+    )
+    args = parser.parse_args()
+
+    for shape in ["wide", "deep"]:
+        secret = SyntheticSecret(shape, args.entries)
+        walks = [
+            ("iterative", lambda: secret.recursive_list("secret", "bench")),
+            ("recursive", lambda: legacy_recursive_list(secret, "secret", "bench")),
+        ]
+        for name, walk in walks:
+            try:
+                entries, seconds, peak = measure(walk, args.memory)
+            except RecursionError:
+                print("{:5} {:10} recursion limit exceeded".format(shape, name))
+                continue
+            line = "{:5} {:10} {:>8} entries {:>8.3f}s {:>12.0f} entries/s".format(
+                shape, name, entries, seconds, entries / seconds
+            )
+            if peak is not None:
+                line = line + " {:>8.1f} MiB peak".format(peak / 1024 / 1024)
+            print(line)
+            sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,518 @@
+"""
+In-process fake of the vault http api. It only implements the parts of the api
+that are used by the toolbox and is meant for benchmarks, not for correctness
+tests of vault itself.
+
+Implemented endpoints:
+    {kv engine}/data/*, {kv engine}/metadata/*, {kv engine}/delete/*,
+    {kv engine}/destroy/*
+    {totp engine}/keys/*, {totp engine}/code/*
+    identity/entity, identity/entity/name/*, identity/entity-alias,
+    identity/group/name/*
+    auth/userpass/users/*
+    sys/auth, sys/policies/acl/*, sys/wrapping/wrap, sys/wrapping/unwrap
+"""
+import datetime
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def now():
+    """ Current time in the format used by vault
+    :returns: timestamp as string
+
+    """
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+class NotFound(Exception):
+
+    """Raised by the handlers if the requested path does not exist."""
+
+
+class KVStore:
+
+    """Versioned key value store with an index of the folders, so that a list
+    request does not need to scan all secrets."""
+
+    def __init__(self):
+        self.secrets = {}
+        self.folders = {"": set()}
+
+    def put(self, path, data, cas=None):
+        """ Write a new version of the given secret
+
+        :path: path of the secret
+        :data: data of the secret
+        :cas: expected current version, None to skip the check
+        :returns: metadata of the new version
+
+        """
+        metadata = self.secrets.get(path)
+        current_version = metadata["current_version"] if metadata else 0
+        if cas is not None and cas != current_version:
+            raise ValueError("check-and-set parameter did not match")
+        if metadata is None:
+            metadata = {
+                "created_time": now(),
+                "current_version": 0,
+                "max_versions": 0,
+                "versions": {},
+            }
+            self.secrets[path] = metadata
+            self._index(path)
+        version = metadata["current_version"] + 1
+        timestamp = now()
+        metadata["current_version"] = version
+        metadata["updated_time"] = timestamp
+        metadata["versions"][str(version)] = {
+            "created_time": timestamp,
+            "deletion_time": "",
+            "destroyed": False,
+            "data": data,
+        }
+        max_versions = metadata["max_versions"]
+        while max_versions and len(metadata["versions"]) > max_versions:
+            del metadata["versions"][min(metadata["versions"], key=int)]
+        return {"version": version, "created_time": timestamp}
+
+    def read(self, path, version=None):
+        """ Read a version of the given secret
+
+        :path: path of the secret
+        :version: version to read, the current one if None
+        :returns: data and metadata of the version
+
+        """
+        if path not in self.secrets:
+            raise NotFound(path)
+        metadata = self.secrets[path]
+        version = str(version or metadata["current_version"])
+        if version not in metadata["versions"]:
+            raise NotFound(path)
+        details = metadata["versions"][version]
+        # Like vault, deleted and destroyed versions are not found
+        if details["deletion_time"] or details["destroyed"]:
+            raise NotFound(path)
+        return {
+            "data": details["data"],
+            "metadata": {
+                "version": int(version),
+                "created_time": details["created_time"],
+                "deletion_time": details["deletion_time"],
+                "destroyed": details["destroyed"],
+            },
+        }
+
+    def metadata(self, path):
+        """ Read the metadata of the given secret
+
+        :path: path of the secret
+        :returns: metadata as returned by vault
+
+        """
+        if path not in self.secrets:
+            raise NotFound(path)
+        metadata = self.secrets[path]
+        versions = {
+            version: {key: value for key, value in details.items() if key != "data"}
+            for version, details in metadata["versions"].items()
+        }
+        return {**metadata, "versions": versions}
+
+    def update_metadata(self, path, options):
+        """ Update the settings in the metadata of the given secret
+
+        :path: path of the secret
+        :options: settings to update
+        :returns: None
+
+        """
+        if path not in self.secrets:
+            raise NotFound(path)
+        if "max_versions" in options:
+            self.secrets[path]["max_versions"] = int(options["max_versions"])
+
+    def soft_delete(self, path, versions=None):
+        """ Mark the given versions as deleted, their data can be undeleted
+
+        :path: path of the secret
+        :versions: list of version numbers, the current version if None
+        :returns: None
+
+        """
+        if path not in self.secrets:
+            return
+        metadata = self.secrets[path]
+        if versions is None:
+            versions = [metadata["current_version"]]
+        for version in versions:
+            details = metadata["versions"].get(str(version))
+            if details is not None and not details["deletion_time"]:
+                details["deletion_time"] = now()
+
+    def destroy(self, path, versions):
+        """ Destroy the data of the given versions
+
+        :path: path of the secret
+        :versions: list of version numbers
+        :returns: None
+
+        """
+        if path not in self.secrets:
+            return
+        for version in versions:
+            details = self.secrets[path]["versions"].get(str(version))
+            if details is not None:
+                details["destroyed"] = True
+                details["data"] = None
+
+    def delete(self, path):
+        """ Delete the given secret with all versions
+
+        :path: path of the secret
+        :returns: None
+
+        """
+        if self.secrets.pop(path, None) is None:
+            return
+        while True:
+            folder, _, key = path.rstrip("/").rpartition("/")
+            folder = folder + "/" if folder else ""
+            key = key + "/" if path.endswith("/") else key
+            self.folders[folder].discard(key)
+            if self.folders[folder] or not folder:
+                return
+            del self.folders[folder]
+            path = folder
+
+    def list(self, path):
+        """ List the keys of the given folder
+
+        :path: path of the folder
+        :returns: sorted list of keys
+
+        """
+        folder = path.strip("/")
+        folder = folder + "/" if folder else ""
+        if not self.folders.get(folder):
+            raise NotFound(path)
+        return sorted(self.folders[folder])
+
+    def _index(self, path):
+        parts = path.split("/")
+        folder = ""
+        for part in parts[:-1]:
+            self.folders.setdefault(folder, set()).add(part + "/")
+            folder = folder + part + "/"
+        self.folders.setdefault(folder, set()).add(parts[-1])
+
+
+class FakeVaultState:
+
+    """All data stored in the fake vault server."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.kv = {}
+        self.totp = {}
+        self.entities = {}
+        self.aliases = {}
+        self.groups = {}
+        self.policies = {}
+        self.userpass = {}
+        self.wrapped = {}
+        self.requests = 0
+
+    def engine(self, name):
+        """ Get the kv store of the given engine, it is created on first use
+
+        :name: name of the engine
+        :returns: KVStore
+
+        """
+        if name not in self.kv:
+            self.kv[name] = KVStore()
+        return self.kv[name]
+
+
+class FakeVaultHandler(BaseHTTPRequestHandler):
+
+    """Request handler answering with the data of the fake vault server."""
+
+    # Keep-alive is only possible with HTTP/1.1
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, avoid delayed ack stalls
+    disable_nagle_algorithm = True
+
+    def log_message(self, *_):  # pylint: disable=arguments-differ
+        """ Silence the default logging to stderr """
+
+    def _send(self, status, body=None, headers=None):
+        """ Send the given body as json response
+
+        :status: http status code
+        :body: dict to send as json, nothing is sent if None
+        :headers: additional headers
+        :returns: None
+
+        """
+        content = b"" if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _handle(self):
+        """ Dispatch the request to the matching handler
+        :returns: None
+
+        """
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length)) if length else {}
+        path, _, query = self.path.partition("?")
+        query = dict(part.split("=", 1) for part in query.split("&") if "=" in part)
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        if server.error_rate and random.random() < server.error_rate:
+            self._send(
+                server.error_status,
+                {"errors": ["injected error"]},
+                {"Retry-After": "0"},
+            )
+            return
+        if not path.startswith("/v1/"):
+            self._send(404, {"errors": []})
+            return
+        parts = path[len("/v1/") :].split("/")
+        state = server.state
+        try:
+            with state.lock:
+                state.requests = state.requests + 1
+                status, response = self._dispatch(state, parts, query, body)
+        except NotFound:
+            status, response = 404, {"errors": []}
+        except ValueError as error:
+            status, response = 400, {"errors": [str(error)]}
+        self._send(status, response)
+
+    def _dispatch(self, state, parts, query, body):
+        """ Handle the request for the given path
+        :returns: status code and response body
+
+        """
+        method = self.command
+        if parts[0] == "sys":
+            return self._sys(state, parts[1:], body)
+        if parts[0] == "identity":
+            return self._identity(state, parts[1:], body)
+        if parts[:3] == ["auth", "userpass", "users"]:
+            return self._userpass(state, parts[3:], body)
+        if len(parts) < 2:
+            raise NotFound()
+        engine, kind, rest = parts[0], parts[1], "/".join(parts[2:])
+        if kind in ("keys", "code"):
+            return self._totp(state.totp.setdefault(engine, {}), kind, rest, body)
+        store = state.engine(engine)
+        if kind == "metadata":
+            if method == "LIST":
+                return 200, {"data": {"keys": store.list(rest)}}
+            if method == "GET":
+                return 200, {"data": store.metadata(rest)}
+            if method == "DELETE":
+                store.delete(rest)
+                return 204, None
+            if method == "POST":
+                store.update_metadata(rest, body)
+                return 204, None
+        if kind == "data":
+            if method == "GET":
+                return 200, {"data": store.read(rest, query.get("version"))}
+            if method == "POST":
+                cas = body.get("options", {}).get("cas")
+                return 200, {"data": store.put(rest, body["data"], cas)}
+            if method == "DELETE":
+                store.soft_delete(rest)
+                return 204, None
+        if kind == "delete" and method == "POST":
+            store.soft_delete(rest, body.get("versions", []))
+            return 204, None
+        if kind == "destroy" and method == "POST":
+            store.destroy(rest, body.get("versions", []))
+            return 204, None
+        raise NotFound()
+
+    def _sys(self, state, parts, body):
+        method = self.command
+        if parts == ["auth"]:
+            return 200, {"userpass/": {"accessor": "auth_userpass_fake"}}
+        if parts[:2] == ["policies", "acl"]:
+            if len(parts) == 2 and method == "LIST":
+                if not state.policies:
+                    raise NotFound()
+                return 200, {"data": {"keys": sorted(state.policies)}}
+            name = parts[2]
+            if method == "GET":
+                if name not in state.policies:
+                    raise NotFound()
+                return 200, {"data": {"name": name, "policy": state.policies[name]}}
+            if method == "POST":
+                state.policies[name] = body["policy"]
+                return 204, None
+            if method == "DELETE":
+                state.policies.pop(name, None)
+                return 204, None
+        if parts == ["wrapping", "wrap"]:
+            token = str(uuid.uuid4())
+            state.wrapped[token] = body
+            return 200, {"wrap_info": {"token": token}}
+        if parts == ["wrapping", "unwrap"]:
+            token = self.headers.get("X-Vault-Token")
+            if token not in state.wrapped:
+                return 400, {"errors": ["wrapping token is not valid"]}
+            return 200, {"data": state.wrapped.pop(token)}
+        raise NotFound()
+
+    def _identity(self, state, parts, body):
+        method = self.command
+        if parts == ["entity"] and method == "POST":
+            for entity in state.entities.values():
+                if entity["name"] == body["name"]:
+                    return 204, None
+            entity = {**body, "id": str(uuid.uuid4()), "aliases": []}
+            state.entities[entity["id"]] = entity
+            return 200, {"data": {"id": entity["id"]}}
+        if parts[:2] == ["entity", "name"]:
+            names = {entity["name"]: entity for entity in state.entities.values()}
+            if len(parts) == 2 and method == "LIST":
+                if not names:
+                    raise NotFound()
+                return 200, {"data": {"keys": sorted(names)}}
+            if parts[2] not in names:
+                raise NotFound()
+            entity = names[parts[2]]
+            if method == "GET":
+                return 200, {"data": entity}
+            if method == "DELETE":
+                del state.entities[entity["id"]]
+                return 204, None
+        if parts == ["entity-alias"] and method == "POST":
+            alias = {**body, "id": str(uuid.uuid4())}
+            entity = state.entities[body["canonical_id"]]
+            entity["aliases"].append(alias)
+            return 200, {"data": {"id": alias["id"]}}
+        if parts[:2] == ["group", "name"]:
+            if len(parts) == 2 and method == "LIST":
+                if not state.groups:
+                    raise NotFound()
+                return 200, {"data": {"keys": sorted(state.groups)}}
+            name = parts[2]
+            if method == "POST":
+                group = state.groups.setdefault(name, {"name": name, "policies": []})
+                group.update(body)
+                return 204, None
+            if name not in state.groups:
+                raise NotFound()
+            if method == "GET":
+                return 200, {"data": state.groups[name]}
+            if method == "DELETE":
+                del state.groups[name]
+                return 204, None
+        raise NotFound()
+
+    def _userpass(self, state, parts, body):
+        method = self.command
+        if not parts and method == "LIST":
+            if not state.userpass:
+                raise NotFound()
+            return 200, {"data": {"keys": sorted(state.userpass)}}
+        if method == "POST":
+            state.userpass[parts[0]] = body
+            return 204, None
+        if method == "DELETE":
+            state.userpass.pop(parts[0], None)
+            return 204, None
+        raise NotFound()
+
+    def _totp(self, keys, kind, name, body):
+        method = self.command
+        if kind == "keys":
+            if not name and method == "LIST":
+                if not keys:
+                    raise NotFound()
+                return 200, {"data": {"keys": sorted(keys)}}
+            if method == "POST":
+                keys[name] = body
+                return 200, None
+            if method == "DELETE":
+                keys.pop(name, None)
+                return 204, None
+        if kind == "code" and method == "GET":
+            if name not in keys:
+                raise NotFound()
+            return 200, {"data": {"code": "%06d" % random.randrange(10 ** 6)}}
+        raise NotFound()
+
+    do_GET = _handle
+    do_LIST = _handle
+    do_POST = _handle
+    do_PUT = _handle
+    do_DELETE = _handle
+
+
+class FakeVault:
+
+    """Fake vault server running in a background thread."""
+
+    def __init__(
+        self, secrets=None, engine="secret", latency=0, error_rate=0, error_status=503
+    ):
+        """
+        :secrets: dict of secret paths and data stored in the given engine
+        :engine: name of the kv engine for the given secrets
+        :latency: seconds every request is delayed
+        :error_rate: fraction of requests answered with error_status
+        :error_status: status code of the injected errors
+        """
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeVaultHandler)
+        self.server.daemon_threads = True
+        self.server.state = FakeVaultState()
+        self.server.latency = latency
+        self.server.error_rate = error_rate
+        self.server.error_status = error_status
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        for path, data in (secrets or {}).items():
+            self.state.engine(engine).put(path, data)
+
+    @property
+    def state(self):
+        """ Data stored in the server
+        :returns: FakeVaultState
+
+        """
+        return self.server.state
+
+    @property
+    def url(self):
+        """ Url of the running server
+        :returns: url as string
+
+        """
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.server.shutdown()
+        self.server.server_close()
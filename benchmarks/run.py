@@ -0,0 +1,262 @@
+#!/usr/bin/python3
+"""
+Benchmark suite for the hot paths of the toolbox. Every benchmark runs against
+a fresh fake vault server filled with a synthetic tree and the results are
+written as json report, so regressions can be tracked.
+
+Usage: python -m benchmarks.run [--sizes 1000,10000,100000] [--output FILE]
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from vault import import_from_csv, policy, user
+from vault.vault import Vault
+from .fake_vault import FakeVault
+
+ENGINE = "secret"
+
+
+def synthetic_paths(size, fanout=10):
+    """ Paths of a synthetic tree with the given number of secrets
+
+    :size: number of secrets
+    :fanout: number of entries per folder
+    :returns: list of secret paths
+
+    """
+    paths = []
+    for number in range(size):
+        folders = []
+        rest = number // fanout
+        while rest:
+            folders.append("folder%d" % (rest % fanout))
+            rest = rest // fanout
+        paths.append("/".join(["bench"] + folders[::-1] + ["secret%d" % number]))
+    return paths
+
+
+def seed_secrets(server, size):
+    """ Fill the kv engine of the server with a synthetic tree
+    :returns: None
+
+    """
+    store = server.state.engine(ENGINE)
+    for path in synthetic_paths(size):
+        store.put(path, {"username": "user", "password": path})
+
+
+def seed_entities(server, size):
+    """ Fill the server with users, entities and aliases
+    :returns: None
+
+    """
+    state = server.state
+    for number in range(size):
+        name = "user%d" % number
+        state.userpass[name] = {"password": "secret"}
+        entity_id = "entity%d" % number
+        state.entities[entity_id] = {
+            "id": entity_id,
+            "name": name,
+            "aliases": [{"name": name}],
+        }
+
+
+def write_csv(directory, size):
+    """ Write a keepass like csv export with the given number of rows
+    :returns: path of the csv file
+
+    """
+    filename = os.path.join(directory, "export.csv")
+    with open(filename, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(["Group", "Title", "Username", "Password", "URL", "Notes"])
+        for path in synthetic_paths(size):
+            folder, _, title = path.rpartition("/")
+            writer.writerow(["Root/" + folder, title, "user", "pass", "", ""])
+    return filename
+
+
+def write_policies(directory, size):
+    """ Write the given number of policy files
+    :returns: path of the policy directory
+
+    """
+    policy_dir = os.path.join(directory, "policies")
+    os.mkdir(policy_dir)
+    for number in range(size):
+        with open(os.path.join(policy_dir, "policy%d.hcl" % number), "w") as f:
+            f.write('path "secret/data/%d/*" { capabilities = ["read"] }' % number)
+    return policy_dir
+
+
+def groups_yaml(size):
+    """ Group definition for yaml_import with the given number of groups
+    :returns: yaml as string
+
+    """
+    lines = ["group%d: [policy%d]" % (number, number) for number in range(size)]
+    return "\n".join(lines)
+
+
+def namespace(**kwargs):
+    """ Commandline arguments for the run functions of the subcommands
+    :returns: argparse namespace
+
+    """
+    return argparse.Namespace(**kwargs)
+
+
+def no_setup(server, size):
+    """ Setup for benchmarks starting with an empty server
+    :returns: None
+
+    """
+
+
+# Each benchmark is a tuple of name, setup and run function. The setup gets
+# the server and size, the run function a Vault instance, the size and a
+# temporary directory for input files.
+BENCHMARKS = [
+    (
+        "recursive_list",
+        seed_secrets,
+        lambda vault, size, directory: sum(
+            1 for _ in vault.secret.recursive_list(ENGINE, "bench", workers=1)
+        ),
+    ),
+    (
+        "recursive_list_workers_8",
+        seed_secrets,
+        lambda vault, size, directory: sum(
+            1 for _ in vault.secret.recursive_list(ENGINE, "bench", workers=8)
+        ),
+    ),
+    (
+        "recursive_delete",
+        seed_secrets,
+        lambda vault, size, directory: vault.secret.recursive_delete(
+            ENGINE, "bench", 8
+        ),
+    ),
+    (
+        "recursive_mv",
+        seed_secrets,
+        lambda vault, size, directory: vault.secret.recursive_mv(
+            ENGINE, "bench", "moved", 8
+        ),
+    ),
+    (
+        "import_from_csv",
+        no_setup,
+        lambda vault, size, directory: import_from_csv.run(
+            namespace(
+                file=write_csv(directory, size),
+                vaultpath="import",
+                engine=ENGINE,
+                dryrun=False,
+                reject_file=None,
+                workers=8,
+                incremental=False,
+                hash_cache=None,
+                report_missing=False,
+                format="keepass",
+                column=None,
+                delimiter=",",
+            ),
+            vault,
+        ),
+    ),
+    (
+        "group_yaml_import",
+        no_setup,
+        lambda vault, size, directory: vault.group.yaml_import(groups_yaml(size)),
+    ),
+    (
+        "policy_import",
+        no_setup,
+        lambda vault, size, directory: policy.policy_import(
+            namespace(dir=write_policies(directory, size)), vault
+        ),
+    ),
+    (
+        "list_user",
+        seed_entities,
+        lambda vault, size, directory: user.list_user(None, vault),
+    ),
+]
+
+
+def run_benchmark(name, setup, run, size, latency):
+    """ Run a single benchmark against a fresh server
+    :returns: result as dict
+
+    """
+    with FakeVault(latency=latency) as server, tempfile.TemporaryDirectory() as tmp:
+        setup(server, size)
+        vault = Vault(server.url, "token")
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            run(vault, size, tmp)
+        seconds = time.perf_counter() - start
+        vault.close()
+        requests = server.state.requests
+    return {
+        "benchmark": name,
+        "size": size,
+        "seconds": round(seconds, 4),
+        "requests": requests,
+        "requests_per_second": round(requests / seconds, 1),
+    }
+
+
+def main():
+    """Entrypoint when used as an executable
+    :returns: None
+
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--sizes", default="1000", help="comma separated tree sizes to benchmark"
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0, help="injected latency in seconds"
+    )
+    parser.add_argument("--only", help="comma separated benchmarks to run")
+    parser.add_argument("--output", help="file for the json report, default stdout")
+    args = parser.parse_args()
+
+    results = []
+    for size in [int(size) for size in args.sizes.split(",")]:
+        for name, setup, run in BENCHMARKS:
+            if args.only and name not in args.only.split(","):
+                continue
+            result = run_benchmark(name, setup, run, size, args.latency)
+            print(
+                "{benchmark:28} {size:>8} {seconds:>10.3f}s "
+                "{requests_per_second:>10.1f} req/s".format(**result),
+                file=sys.stderr,
+            )
+            results.append(result)
+
+    report = {
+        "python": platform.python_version(),
+        "latency": args.latency,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
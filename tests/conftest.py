@@ -0,0 +1,43 @@
+"""
+Fixtures running the toolbox against the fake vault server of the benchmarks.
+"""
+import sys
+import pytest
+import vault_toolbox
+from benchmarks.fake_vault import FakeVault
+from vault.vault import Vault
+
+
+@pytest.fixture
+def server():
+    """ Fake vault server, the secrets are stored in the engine secret """
+    with FakeVault() as fake:
+        yield fake
+
+
+@pytest.fixture
+def kv(server):
+    """ KVStore of the engine secret of the fake server """
+    return server.state.engine("secret")
+
+
+@pytest.fixture
+def vault(server):
+    """ Vault client connected to the fake server """
+    client = Vault(server.url, "token")
+    yield client
+    client.close()
+
+
+@pytest.fixture
+def cli(server, monkeypatch):
+    """ Run the commandline interface against the fake server, the token and
+    url are appended to the given arguments """
+
+    def run(*argv):
+        monkeypatch.setattr(
+            sys, "argv", ["vault_toolbox.py", "--no-cache", *argv, "token", server.url]
+        )
+        vault_toolbox.main()
+
+    return run
@@ -0,0 +1,127 @@
+"""
+Tests of the asyncio client.
+"""
+import asyncio
+import time
+import pytest
+from vault.async_vault import AsyncVault
+from vault.exceptions import VaultHTTPError
+from vault.vault import Vault
+
+
+def run(vault, operation, concurrency=2):
+    async def main():
+        async with AsyncVault.from_vault(vault, concurrency) as async_vault:
+            return await operation(async_vault)
+
+    return asyncio.run(main())
+
+
+def test_recursive_list_keeps_the_depth_first_order(vault, kv):
+    for path in ["b/x", "a/y/z", "a/w", "c"]:
+        kv.put(path, {})
+
+    async def collect(async_vault):
+        walk = async_vault.secret.recursive_list("secret", "")
+        return [secret async for secret in walk]
+
+    assert run(vault, collect) == list(vault.secret.recursive_list("secret", ""))
+
+
+def test_recursive_delete_stops_at_the_first_error(vault, kv):
+    for number in range(100):
+        kv.put("team/secret%02d" % number, {})
+    original_delete = kv.delete
+
+    def delete(path):
+        if path == "team/secret05":
+            raise ValueError("injected error")
+        original_delete(path)
+
+    kv.delete = delete
+
+    with pytest.raises(VaultHTTPError):
+        run(
+            vault,
+            lambda async_vault: async_vault.secret.recursive_delete("secret", "team"),
+        )
+
+    # Only the tasks pending at the error were started
+    assert len(kv.secrets) > 80
+
+
+def test_recursive_mv(vault, kv):
+    for number in range(20):
+        kv.put("team/sub/secret%d" % number, {"number": number})
+        kv.put("team/sub/secret%d" % number, {"number": -number})
+
+    run(
+        vault,
+        lambda async_vault: async_vault.secret.recursive_mv("secret", "team", "moved"),
+    )
+
+    assert sorted(kv.secrets) == sorted(
+        "moved/sub/secret%d" % number for number in range(20)
+    )
+    assert kv.secrets["moved/sub/secret3"]["current_version"] == 2
+
+
+def test_recursive_delete_bounds_the_pending_tasks(vault, kv):
+    for number in range(100):
+        kv.put("team/secret%02d" % number, {})
+    tasks = []
+
+    async def operation(async_vault):
+        delete = async_vault.secret.delete
+
+        async def counting_delete(engine_path, path):
+            tasks.append(len(asyncio.all_tasks()))
+            await delete(engine_path, path)
+
+        async_vault.secret.delete = counting_delete
+        await async_vault.secret.recursive_delete("secret", "team")
+
+    run(vault, operation)
+
+    assert not kv.secrets
+    # The main task, the listing and twice concurrency deletes
+    assert max(tasks) <= 6
+
+
+def test_close_keeps_a_shared_vault_open(server, kv, monkeypatch):
+    kv.put("team/a", {"user": "a"})
+    closed = []
+    shared = Vault(server.url, "token")
+    monkeypatch.setattr(shared, "close", lambda: closed.append("shared"))
+    run(shared, lambda async_vault: async_vault.secret.list("secret", "team"))
+    assert closed == []
+
+    async def main():
+        async with AsyncVault(server.url, "token") as async_vault:
+            monkeypatch.setattr(async_vault.vault, "close", lambda: closed.append(1))
+
+    asyncio.run(main())
+    assert closed == [1]
+
+
+def test_close_does_not_block_the_event_loop(vault):
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(1)
+            await asyncio.sleep(0.01)
+
+    async def main():
+        async_vault = AsyncVault.from_vault(vault, 2)
+        ticker = asyncio.ensure_future(tick())
+        # A request still running in the thread pool
+        request = asyncio.ensure_future(async_vault.run(time.sleep, 0.3))
+        await asyncio.sleep(0)
+        await async_vault.close()
+        ticker.cancel()
+        await request
+
+    asyncio.run(main())
+
+    assert len(ticks) > 10
@@ -0,0 +1,71 @@
+"""
+Tests of secret-changes.
+"""
+import json
+import os
+import pytest
+from vault.changes import diff_versions
+
+
+def events(output):
+    return sorted(tuple(line.split()[:2]) for line in output.splitlines())
+
+
+def test_diff_versions():
+    previous = {"a": 1, "b": 2, "c": 1}
+    current = {
+        "a": {"current_version": 1, "updated_time": "t"},
+        "b": {"current_version": 3, "updated_time": "t"},
+        "d": {"current_version": 1, "updated_time": "t"},
+    }
+
+    changes = list(diff_versions(previous, current))
+
+    assert changes == [
+        {"event": "updated", "path": "b", "version": 3, "updated_time": "t"},
+        {"event": "added", "path": "d", "version": 1, "updated_time": "t"},
+        {"event": "deleted", "path": "c"},
+    ]
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_changes_since_the_watermark(cli, kv, tmp_path, capsys, indexed):
+    kv.put("team/a", {})
+    kv.put("team/b", {})
+    kv.put("team/sub/c", {})
+    watermark = str(tmp_path / "watermark.json")
+    index = ["--index", str(tmp_path / "index"), "--max-staleness", "0"]
+    options = ["--watermark", watermark, *(index if indexed else [])]
+
+    # The first run only creates the watermark
+    cli("secret-changes", *options, "secret", "team")
+    assert capsys.readouterr().out == ""
+    with open(watermark) as f:
+        assert json.load(f)["versions"] == {"team/a": 1, "team/b": 1, "team/sub/c": 1}
+    assert not os.path.exists(watermark + ".tmp")
+
+    kv.put("team/a", {"changed": True})
+    kv.delete("team/sub/c")
+    kv.put("team/d", {})
+    cli("secret-changes", *options, "secret", "team")
+    assert events(capsys.readouterr().out) == [
+        ("added", "team/d"),
+        ("deleted", "team/sub/c"),
+        ("updated", "team/a"),
+    ]
+
+    # The watermark was moved to this run
+    cli("secret-changes", *options, "secret", "team")
+    assert capsys.readouterr().out == ""
+    with open(watermark) as f:
+        assert json.load(f)["versions"] == {"team/a": 2, "team/b": 1, "team/d": 1}
+
+
+def test_stale_secrets(cli, kv, capsys):
+    kv.put("team/old", {})
+    kv.put("team/new", {})
+    kv.secrets["team/old"]["updated_time"] = "2000-01-01T00:00:00.123456789Z"
+
+    cli("secret-changes", "--stale-days", "30", "secret", "team")
+
+    assert events(capsys.readouterr().out) == [("stale", "team/old")]
@@ -0,0 +1,101 @@
+"""
+Tests of secret-dump and secret-restore.
+"""
+import json
+
+
+def read_dump(path):
+    with open(path) as f:
+        return {record["path"]: record for record in map(json.loads, f)}
+
+
+def test_dump_marks_deleted_versions(cli, kv, tmp_path):
+    kv.put("team/kept", {"password": "a"})
+    kv.put("team/deleted", {"password": "b"})
+    kv.put("team/deleted", {"password": "c"})
+    kv.soft_delete("team/deleted")
+    kv.put("team/destroyed", {"password": "d"})
+    kv.destroy("team/destroyed", [1])
+    dumpfile = str(tmp_path / "dump.ndjson")
+
+    cli("secret-dump", "-o", dumpfile, "--all-versions", "secret", "team")
+
+    records = read_dump(dumpfile)
+    assert records["team/kept"]["data"] == {"password": "a"}
+    assert "deleted" not in records["team/kept"]
+    assert records["team/deleted"]["version"] == 2
+    assert records["team/deleted"]["data"] is None
+    assert records["team/deleted"]["deleted"]
+    assert records["team/deleted"]["versions"] == {"1": {"password": "b"}, "2": None}
+    assert records["team/destroyed"]["deleted"]
+
+
+def test_restore_skips_deleted_records(cli, kv, tmp_path, capsys):
+    kv.put("team/kept", {"password": "a"})
+    kv.put("team/deleted", {"password": "b"})
+    kv.soft_delete("team/deleted")
+    dumpfile = str(tmp_path / "dump.ndjson")
+    cli("secret-dump", "-o", dumpfile, "secret", "team")
+    kv.put("team/kept", {"password": "changed"})
+
+    cli("secret-restore", "secret", dumpfile)
+
+    assert kv.read("team/kept")["data"] == {"password": "a"}
+    assert kv.secrets["team/deleted"]["current_version"] == 1
+    output = capsys.readouterr().out
+    assert "1 secrets written, 0 unchanged, 0 conflicts, 1 deleted skipped" in output
+
+
+def test_dump_restore_round_trip(cli, kv, tmp_path, capsys):
+    secrets = {"team/a": {"user": "a"}, "team/sub/b": {"user": "b", "url": "x"}}
+    for path, data in secrets.items():
+        kv.put(path, data)
+    dumpfile = str(tmp_path / "dump.ndjson")
+    cli("secret-dump", "-o", dumpfile, "secret", "team")
+    for path in secrets:
+        kv.delete(path)
+
+    cli("secret-restore", "secret", dumpfile)
+
+    assert {path: kv.read(path)["data"] for path in kv.secrets} == secrets
+    assert "2 secrets written, 0 unchanged" in capsys.readouterr().out
+
+
+def test_restore_skips_unchanged_secrets(cli, kv, server, tmp_path, capsys):
+    kv.put("team/a", {"user": "a"})
+    kv.put("team/b", {"user": "b"})
+    dumpfile = str(tmp_path / "dump.ndjson")
+    hashes = str(tmp_path / "hashes.json")
+    cli("secret-dump", "-o", dumpfile, "secret", "team")
+    capsys.readouterr()
+
+    server.state.requests = 0
+    cli("secret-restore", "--hash-cache", hashes, "secret", dumpfile)
+    # Only the current secrets are read
+    assert server.state.requests == 2
+    assert "0 secrets written, 2 unchanged" in capsys.readouterr().out
+
+    server.state.requests = 0
+    cli("secret-restore", "--hash-cache", hashes, "secret", dumpfile)
+    assert server.state.requests == 0
+    assert kv.secrets["team/a"]["current_version"] == 1
+
+
+def test_restore_does_not_overwrite_concurrent_changes(cli, kv, tmp_path, capsys):
+    kv.put("team/a", {"user": "a"})
+    dumpfile = str(tmp_path / "dump.ndjson")
+    cli("secret-dump", "-o", dumpfile, "secret", "team")
+    kv.put("team/a", {"user": "changed"})
+    original_put = kv.put
+
+    def put(path, data, cas=None):
+        # Another client writes between the read and the write of the restore
+        original_put(path, {"user": "other"})
+        return original_put(path, data, cas)
+
+    kv.put = put
+
+    cli("secret-restore", "secret", dumpfile)
+
+    assert kv.read("team/a")["data"] == {"user": "other"}
+    assert "0 secrets written, 0 unchanged, 1 conflicts" in capsys.readouterr().out
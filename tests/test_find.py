@@ -0,0 +1,51 @@
+"""
+Tests of secret-find.
+"""
+import pytest
+
+
+@pytest.fixture
+def tree(kv, tmp_path):
+    kv.put("team/db/prod", {"password": "x", "host": "db1"})
+    kv.put("team/db/test", {"password": "y"})
+    kv.put("team/web", {"token": "z"})
+    return str(tmp_path / "index.sqlite")
+
+
+@pytest.mark.parametrize("vaultpath", ["team", "/team"])
+@pytest.mark.parametrize("indexed", [False, True])
+def test_path_pattern_matches_without_leading_slash(
+    cli, tree, capsys, vaultpath, indexed
+):
+    index = ["--index", tree] if indexed else []
+
+    cli("secret-find", "--path", "team/db/*", *index, "secret", vaultpath)
+
+    assert capsys.readouterr().out.split() == ["team/db/prod", "team/db/test"]
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+def test_key_search(cli, tree, capsys, indexed):
+    index = ["--index", tree] if indexed else []
+
+    cli("secret-find", "--key", "host", *index, "secret", "/team")
+
+    assert capsys.readouterr().out.split() == ["team/db/prod:", "host"]
+
+
+def test_changed_indexed_values_are_read_again(cli, tree, capsys):
+    cli("secret-find", "--value", "db1", "--index", tree, "secret", "team")
+    assert capsys.readouterr().out == ""
+
+    cli(
+        "secret-find",
+        "--value",
+        "db1",
+        "--indexed-values",
+        "host",
+        "--index",
+        tree,
+        "secret",
+        "team",
+    )
+    assert capsys.readouterr().out == "team/db/prod: host\n"
@@ -0,0 +1,156 @@
+"""
+Tests of the csv import.
+"""
+import csv
+import os
+import stat
+import pytest
+
+
+def write_export(path, rows, header=("Group", "Title", "Username", "Password")):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return str(path)
+
+
+def current_data(kv, path):
+    metadata = kv.secrets[path]
+    return metadata["versions"][str(metadata["current_version"])]["data"]
+
+
+def test_import_strips_the_common_group(cli, kv, tmp_path):
+    export = write_export(
+        tmp_path / "export.csv",
+        [
+            ["Root/Team A", "Web Site", "user", "secret"],
+            ["Root/Team B", "Mail", "other", ""],
+        ],
+    )
+
+    cli("import_from_csv", "secret", "imported", export)
+
+    assert sorted(kv.secrets) == ["imported/a/web_site", "imported/b/mail"]
+    assert current_data(kv, "imported/a/web_site") == {
+        "Username": "user",
+        "Password": "secret",
+    }
+    assert current_data(kv, "imported/b/mail") == {"Username": "other"}
+
+
+def test_duplicate_rows_last_row_wins(cli, kv, tmp_path):
+    rows = [
+        ["Root/team", "entry%d" % (number % 5), "u%d" % number, "p"]
+        for number in range(50)
+    ]
+    export = write_export(tmp_path / "export.csv", rows)
+
+    for run in range(3):
+        cli("import_from_csv", "-w", "8", "secret", "run%d" % run, export)
+        for entry in range(5):
+            path = "run%d/entry%d" % (run, entry)
+            assert current_data(kv, path) == {
+                "Username": "u%d" % (45 + entry),
+                "Password": "p",
+            }
+            assert kv.secrets[path]["current_version"] == 10
+
+
+def test_rejected_rows_are_written_to_the_reject_file(cli, kv, tmp_path):
+    export = write_export(
+        tmp_path / "export.csv",
+        [["Root/a", "good", "u", "p"], ["Root/a", "bad", "u", "p", "extra"]],
+    )
+
+    with pytest.raises(SystemExit) as exit_info:
+        cli("import_from_csv", "secret", "imported", export)
+
+    assert exit_info.value.code == 1
+    assert list(kv.secrets) == ["imported/good"]
+    with open(export + ".rejected.csv", newline="") as f:
+        rejected = list(csv.DictReader(f))
+    assert [row["Title"] for row in rejected] == ["bad"]
+    assert stat.S_IMODE(os.stat(export + ".rejected.csv").st_mode) == 0o600
+
+
+def test_existing_reject_file_is_made_private(cli, kv, tmp_path):
+    export = write_export(tmp_path / "export.csv", [["Root/a", "bad", "u", "p", "x"]])
+    reject_file = tmp_path / "rejects.csv"
+    reject_file.write_text("old")
+    reject_file.chmod(0o644)
+
+    with pytest.raises(SystemExit):
+        cli("import_from_csv", "--reject-file", str(reject_file), "secret", "i", export)
+
+    assert stat.S_IMODE(os.stat(reject_file).st_mode) == 0o600
+    assert "old" not in reject_file.read_text()
+
+
+def test_incremental_import_writes_only_changes(cli, kv, tmp_path, capsys):
+    rows = [["Root/team", "entry%d" % number, "u", "p"] for number in range(10)]
+    export = write_export(tmp_path / "export.csv", rows)
+    cli("import_from_csv", "secret", "imported", export)
+
+    rows[3][3] = "changed"
+    export = write_export(tmp_path / "export.csv", rows + [rows[3]])
+    cli("import_from_csv", "--incremental", "secret", "imported", export)
+
+    versions = {path: kv.secrets[path]["current_version"] for path in kv.secrets}
+    assert versions.pop("imported/entry3") == 2
+    assert set(versions.values()) == {1}
+    assert "1 updated, 10 unchanged, 0 rejected" in capsys.readouterr().out
+
+
+def test_incremental_dryrun_and_hash_cache(cli, kv, server, tmp_path, capsys):
+    rows = [["Root/team", "entry%d" % number, "u", "p"] for number in range(10)]
+    export = write_export(tmp_path / "export.csv", rows)
+    hashes = str(tmp_path / "hashes.json")
+    cli("import_from_csv", "--hash-cache", hashes, "secret", "imported", export)
+    capsys.readouterr()
+
+    rows[0][3] = "changed"
+    export = write_export(tmp_path / "export.csv", rows)
+    cli("import_from_csv", "--hash-cache", hashes, "-d", "secret", "imported", export)
+
+    output = capsys.readouterr().out
+    assert "updated  imported/entry0" in output
+    assert "1 secrets read, 1 writes would be made" in output
+    assert kv.secrets["imported/entry0"]["current_version"] == 1
+
+    server.state.requests = 0
+    cli("import_from_csv", "--hash-cache", hashes, "secret", "imported", export)
+    # Only the changed row is read and written
+    assert server.state.requests == 2
+
+
+def test_report_missing_ignores_rejected_rows(cli, kv, tmp_path, capsys):
+    kv.put("imported/gone", {"Username": "u"})
+    kv.put("imported/kept", {"Username": "u"})
+    kv.put("imported/conflict", {"Username": "u"})
+    export = write_export(
+        tmp_path / "export.csv", [["Root", "kept", "u"], ["Root", "conflict", "x"]]
+    )
+    # A write failing with a conflict rejects the row
+    original_put = kv.put
+
+    def put(path, data, cas=None):
+        if path == "imported/conflict":
+            raise ValueError("check-and-set parameter did not match")
+        return original_put(path, data, cas)
+
+    kv.put = put
+
+    with pytest.raises(SystemExit):
+        cli(
+            "import_from_csv",
+            "--incremental",
+            "--report-missing",
+            "secret",
+            "imported",
+            export,
+        )
+
+    output = capsys.readouterr().out
+    assert "missing  imported/gone" in output
+    assert "imported/conflict" not in output
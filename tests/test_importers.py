@@ -0,0 +1,65 @@
+"""
+Tests of the streaming export adapters.
+"""
+import io
+import json
+import pytest
+from vault.importers import iter_json_object
+
+
+class CountingReader(io.StringIO):
+
+    """Counts the chunks read from the document."""
+
+    reads = 0
+
+    def read(self, size=-1):
+        self.reads = self.reads + 1
+        return super().read(size)
+
+
+DOCUMENT = {
+    "encrypted": False,
+    "folders": [{"id": "f1", "name": "Team"}],
+    "items": [
+        {"name": "a", "number": 1e5, "fraction": -12.5e-3, "values": [1, 10, 100]},
+        {"name": "b\u00e9\"", "flags": [True, False, None]},
+    ],
+    "x": 1e5,
+    "y": 12345,
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 1 << 16])
+def test_members_are_decoded_across_chunks(chunk_size):
+    text = json.dumps(DOCUMENT, indent=1)
+
+    members = list(iter_json_object(io.StringIO(text), ("items",), chunk_size))
+
+    assert members == [
+        ("encrypted", False),
+        ("folders", DOCUMENT["folders"]),
+        ("items", DOCUMENT["items"][0]),
+        ("items", DOCUMENT["items"][1]),
+        ("x", 1e5),
+        ("y", 12345),
+    ]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3])
+def test_numbers_split_at_the_chunk_boundary(chunk_size):
+    text = '{"items": [] , "x": 1e5, "y": [1.25e-2, 3]}'
+
+    members = dict(iter_json_object(io.StringIO(text), ("items",), chunk_size))
+
+    assert members == {"x": 1e5, "y": [1.25e-2, 3]}
+
+
+def test_invalid_json_fails_without_reading_the_rest():
+    text = '{"folders": [{"id": 1 "name": "x"}], "items": [' + "1, " * 10000 + "1]}"
+    reader = CountingReader(text)
+
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_object(reader, ("items",), chunk_size=8))
+
+    assert reader.reads < 10
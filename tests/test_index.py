@@ -0,0 +1,57 @@
+"""
+Tests of the local index.
+"""
+import os
+import sqlite3
+import stat
+from vault.index import SecretIndex
+
+
+def backdate(filename, seconds, tables=("secrets", "roots")):
+    columns = {"secrets": "indexed_at", "roots": "refreshed_at"}
+    with sqlite3.connect(filename) as connection:
+        for table in tables:
+            connection.execute(
+                "UPDATE %s SET %s = %s - ?" % (table, columns[table], columns[table]),
+                (seconds,),
+            )
+
+
+def test_old_metadata_is_not_fresh(vault, kv, tmp_path):
+    kv.put("team/a", {"user": "a"})
+    filename = str(tmp_path / "index.sqlite")
+    index = SecretIndex(filename)
+    index.refresh(vault, "secret", "team")
+    assert index.is_fresh("secret", "team", 300)
+
+    # A refresh keeps metadata younger than max_age but bumps the root
+    backdate(filename, 1000, ["secrets"])
+    assert not index.is_fresh("secret", "team", 300)
+    assert index.refresh(vault, "secret", "team", max_age=300) == 1
+    assert index.is_fresh("secret", "team", 300)
+    index.close()
+
+
+def test_find_rereads_metadata_older_than_max_staleness(cli, kv, tmp_path, capsys):
+    kv.put("team/a", {"user": "a"})
+    filename = str(tmp_path / "index.sqlite")
+    cli("secret-find", "--key", "host", "--index", filename, "secret", "team")
+    assert capsys.readouterr().out == ""
+
+    kv.put("team/a", {"user": "a", "host": "db1"})
+    backdate(filename, 1000)
+    cli("secret-find", "--key", "host", "--index", filename, "secret", "team")
+
+    assert capsys.readouterr().out == "team/a: host\n"
+
+
+def test_index_is_private(tmp_path):
+    filename = tmp_path / "index.sqlite"
+    filename.write_bytes(b"")
+    filename.chmod(0o644)
+
+    SecretIndex(str(filename)).close()
+    SecretIndex(str(tmp_path / "new.sqlite")).close()
+
+    assert stat.S_IMODE(os.stat(filename).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(tmp_path / "new.sqlite").st_mode) == 0o600
@@ -0,0 +1,18 @@
+"""
+Tests of the move journal.
+"""
+from vault.journal import MoveJournal
+
+
+def test_entries_after_a_cut_line_are_kept(tmp_path):
+    filename = tmp_path / "journal"
+    filename.write_text('{"from": "a", "to": "b", "version": "1"}\n{"from": "a"')
+
+    journal = MoveJournal(str(filename))
+    journal.version_written("a", "b", "2")
+    journal.close()
+
+    journal = MoveJournal(str(filename))
+    assert journal.written_versions("a", "b") == {"1", "2"}
+    assert not journal.is_done("a", "b")
+    journal.close()
@@ -0,0 +1,84 @@
+"""
+Tests of the client side concurrency limits.
+"""
+import random
+import pytest
+from vault.limiter import AdaptiveLimiter, ConcurrencyLimiter
+
+
+def request(limiter, latency=0.01, throttled=False):
+    limiter.acquire()
+    limiter.release(latency, throttled)
+
+
+@pytest.mark.parametrize("maximum", [1, 2, 3, 4, 64])
+def test_initial_limit_is_within_the_bounds(maximum):
+    limiter = AdaptiveLimiter(maximum=maximum)
+
+    assert 1 <= limiter.limit <= maximum
+
+
+def test_limit_grows_up_to_the_maximum():
+    limiter = AdaptiveLimiter(initial=1, maximum=5, window=10)
+
+    for number in range(1, 10):
+        for _ in range(10):
+            request(limiter)
+        assert limiter.limit == min(5, 1 + number)
+
+
+def test_rate_limits_cut_the_limit_down_to_the_minimum():
+    limiter = AdaptiveLimiter(initial=16, maximum=16)
+
+    limits = []
+    for _ in range(10):
+        request(limiter, throttled=True)
+        limits.append(limiter.limit)
+
+    assert limits[:4] == [8, 4, 2, 1]
+    assert limits[-1] == 1
+
+
+def test_rising_latency_cuts_the_limit():
+    limiter = AdaptiveLimiter(initial=8, maximum=16, window=10)
+    for _ in range(10):
+        request(limiter, latency=0.01)
+    assert limiter.limit == 9
+
+    for _ in range(10):
+        request(limiter, latency=0.05)
+
+    assert limiter.limit == 4.5
+    assert limiter.baseline == 0.05
+
+
+def test_limit_stays_within_the_bounds():
+    rng = random.Random(1)
+    limiter = AdaptiveLimiter(initial=4, maximum=12, window=5)
+
+    for _ in range(5000):
+        request(limiter, rng.uniform(0.01, 0.03), rng.random() < 0.05)
+        assert 1 <= limiter.limit <= 12
+
+
+def test_requests_in_flight_before_a_cut_are_ignored():
+    limiter = AdaptiveLimiter(initial=4, maximum=8)
+    for _ in range(3):
+        limiter.acquire()
+
+    limiter.release(0.01, throttled=True)
+    limiter.release(0.01, throttled=True)
+    limiter.release(0.01, throttled=True)
+
+    assert limiter.limit == 2
+    assert limiter.in_flight == 0
+
+
+def test_fixed_limit():
+    limiter = ConcurrencyLimiter(2)
+    limiter.acquire()
+    limiter.acquire()
+
+    assert limiter.in_flight == 2
+    limiter.release(0.01)
+    assert limiter.in_flight == 1
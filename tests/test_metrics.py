@@ -0,0 +1,91 @@
+"""
+Tests of the request metrics.
+"""
+import json
+import pytest
+from vault.metrics import LATENCY_BUCKETS, LatencyHistogram, Metrics, endpoint_template
+from vault.vault import Vault
+
+
+@pytest.mark.parametrize(
+    "url, template",
+    [
+        ("https://vault/v1/passwords/metadata/team/secret", "{engine}/metadata/*"),
+        ("https://vault/v1/passwords/data/secret", "{engine}/data/*"),
+        ("https://vault/v1/passwords/metadata", "{engine}/metadata"),
+        ("https://vault/v1/totp", "{engine}"),
+        ("https://vault/v1/sys/policies/acl", "sys/policies/acl"),
+        ("https://vault/v1/sys/policies/acl/admin", "sys/policies/acl/*"),
+        ("https://vault/v1/identity/entity", "identity/entity"),
+        ("https://vault/v1/identity/entity-alias", "identity/entity-alias"),
+        ("https://vault/v1/identity/entity/name/alice", "identity/entity/name/*"),
+        ("https://vault/v1/auth/userpass/users/bob?x=1", "auth/userpass/users/*"),
+    ],
+)
+def test_endpoint_template(url, template):
+    assert endpoint_template(url) == template
+
+
+def test_histogram_buckets():
+    histogram = LatencyHistogram()
+    for latency in [0.001, 0.0011, 0.05, 0.05, 1000]:
+        histogram.add(latency)
+
+    # A latency on a bound belongs to that bucket, larger ones to the next
+    assert histogram.counts[0] == 1
+    assert histogram.counts[1] == 1
+    assert histogram.counts[-1] == 1
+    assert histogram.total == 5
+    assert histogram.percentile(0.5) == pytest.approx(0.05, rel=0.25)
+    assert histogram.percentile(0.5) >= 0.05
+    assert histogram.percentile(1.0) == LATENCY_BUCKETS[-1]
+    assert LatencyHistogram().percentile(0.5) == 0.0
+
+
+def test_prometheus_text_format():
+    metrics = Metrics()
+    url = "https://vault/v1/secret/data/a"
+    metrics.record("get", url, 200, 0, 100, 0.001)
+    metrics.record("GET", url, 404, 0, 20, 0.01)
+    metrics.record("GET", url, None, 0, 0, 500)
+
+    lines = metrics.to_prometheus().splitlines()
+
+    labels = 'method="GET",endpoint="{engine}/data/*"'
+    assert f"vault_toolbox_requests_total{{{labels}}} 3" in lines
+    assert f"vault_toolbox_request_errors_total{{{labels}}} 2" in lines
+    assert f"vault_toolbox_response_bytes_total{{{labels}}} 120" in lines
+    buckets = [
+        line for line in lines if line.startswith("vault_toolbox_request_duration")
+    ]
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets[: len(LATENCY_BUCKETS)]]
+    # The buckets are cumulative
+    assert counts == sorted(counts)
+    assert counts[0] == 1
+    assert counts[-1] == 2
+    assert buckets[len(LATENCY_BUCKETS)] == (
+        f'vault_toolbox_request_duration_seconds_bucket{{{labels},le="+Inf"}} 3'
+    )
+    assert f"vault_toolbox_request_duration_seconds_count{{{labels}}} 3" in lines
+    assert f"vault_toolbox_request_duration_seconds_sum{{{labels}}} 500.011000" in lines
+    for line in lines:
+        assert line.startswith("# TYPE ") or line.startswith("vault_toolbox_")
+
+
+@pytest.mark.parametrize("keyword", ["data", "json"])
+def test_bytes_sent_counts_json_bodies(server, keyword):
+    metrics = Metrics()
+    vault = Vault(server.url, "token", metrics=metrics)
+    payload = {"policy": "a" * 100}
+    body = json.dumps(payload) if keyword == "data" else payload
+
+    vault.requests_request(
+        "POST",
+        server.url + "/v1/sys/policies/acl/test",
+        headers=vault.token_header,
+        **{keyword: body},
+    )
+    vault.close()
+
+    (stats,) = metrics.to_dict()
+    assert stats["bytes_sent"] == len(json.dumps(payload))
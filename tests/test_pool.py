@@ -0,0 +1,47 @@
+"""
+Tests of the bounded worker pools.
+"""
+import threading
+import time
+import pytest
+from vault.pool import bounded_map, keyed_map
+
+
+def test_bounded_map_yields_every_item():
+    results = bounded_map(lambda item: item * 2, range(100), workers=4)
+    assert sorted(results) == [(item, item * 2) for item in range(100)]
+
+
+def test_bounded_map_ordered():
+    results = bounded_map(lambda item: item, range(100), workers=4, ordered=True)
+    assert [item for item, _ in results] == list(range(100))
+
+
+def test_keyed_map_keeps_the_order_per_key():
+    seen = {}
+    lock = threading.Lock()
+
+    def handle(item):
+        key, number = item
+        # Later items of a key would overtake earlier ones without ordering
+        time.sleep(0.001 * (10 - number % 10))
+        with lock:
+            seen.setdefault(key, []).append(number)
+        return number
+
+    items = [(number % 3, number) for number in range(60)]
+    results = list(keyed_map(handle, items, lambda item: item[0], workers=4))
+
+    assert len(results) == 60
+    for key, numbers in seen.items():
+        assert numbers == [number for number in range(60) if number % 3 == key]
+
+
+def test_keyed_map_raises_the_first_error():
+    def handle(item):
+        if item == 5:
+            raise ValueError("broken")
+        return item
+
+    with pytest.raises(ValueError):
+        list(keyed_map(handle, range(100), lambda item: item, workers=4))
@@ -0,0 +1,83 @@
+"""
+Tests of secret-prune.
+"""
+import datetime
+import pytest
+from vault.prune import versions_to_destroy
+
+NOW = datetime.datetime(2024, 1, 10, tzinfo=datetime.timezone.utc)
+
+
+def metadata(days_old, current=None, destroyed=()):
+    """ Metadata with one version per age in days, oldest first """
+    versions = {
+        str(number): {
+            "created_time": (NOW - datetime.timedelta(days=days)).isoformat(),
+            "destroyed": number in destroyed,
+        }
+        for number, days in enumerate(days_old, 1)
+    }
+    return {"current_version": current or len(days_old), "versions": versions}
+
+
+@pytest.mark.parametrize(
+    "keep, older_than, expected",
+    [
+        (1, None, ["1", "2", "3", "4"]),
+        (2, None, ["1", "2", "3"]),
+        (5, None, []),
+        (None, 5, ["1", "2"]),
+        (2, 7, ["1"]),
+        (None, 100, []),
+    ],
+)
+def test_versions_to_destroy(keep, older_than, expected):
+    older_than = None if older_than is None else datetime.timedelta(days=older_than)
+
+    destroy = versions_to_destroy(metadata([9, 6, 4, 2, 0]), keep, older_than, NOW)
+
+    assert destroy == expected
+
+
+def test_current_and_destroyed_versions_are_skipped():
+    # The current version was restored from an older one
+    secret = metadata([9, 6, 4, 2, 0], current=2, destroyed=[1])
+
+    assert versions_to_destroy(secret, keep=1, now=NOW) == ["3", "4"]
+
+
+@pytest.mark.parametrize("keep", [0, -1])
+def test_keep_below_one_is_rejected(cli, kv, keep):
+    kv.put("team/a", {})
+    kv.put("team/a", {})
+
+    with pytest.raises(SystemExit) as exit_info:
+        cli("secret-prune", "--keep", str(keep), "secret", "team")
+
+    assert exit_info.value.code == 2
+    with pytest.raises(ValueError):
+        versions_to_destroy(kv.metadata("team/a"), keep)
+
+
+def test_prune_and_dryrun(cli, kv, capsys):
+    for number in range(4):
+        kv.put("team/a", {"number": number})
+    kv.put("team/b", {})
+
+    cli("secret-prune", "--keep", "2", "--dryrun", "secret", "team")
+
+    assert not any(
+        details["destroyed"] for details in kv.secrets["team/a"]["versions"].values()
+    )
+    assert "Would destroy 2 versions of 1 of 2 secrets" in capsys.readouterr().out
+
+    cli("secret-prune", "--keep", "2", "secret", "team")
+
+    versions = kv.secrets["team/a"]["versions"]
+    assert [versions[str(number)]["destroyed"] for number in range(1, 5)] == [
+        True,
+        True,
+        False,
+        False,
+    ]
+    assert "Destroyed 2 versions of 1 of 2 secrets" in capsys.readouterr().out
@@ -0,0 +1,110 @@
+"""
+Tests of the secret subcommands.
+"""
+import datetime
+import pytest
+from vault.secret import parse_time
+
+
+@pytest.mark.parametrize("mode", [[], ["--asyncio"]])
+def test_recursive_delete_dryrun_writes_nothing(cli, kv, capsys, mode):
+    for number in range(5):
+        kv.put("team/sub/secret%d" % number, {"number": number})
+    kv.put("team/top", {})
+
+    cli("secret-del", "-r", "--dryrun", *mode, "secret", "team")
+
+    assert len(kv.secrets) == 6
+    output = capsys.readouterr().out
+    assert "Would issue 6 DELETE requests after 2 LIST requests" in output
+
+
+@pytest.mark.parametrize("mode", [[], ["--asyncio"]])
+def test_recursive_delete(cli, kv, mode):
+    for number in range(5):
+        kv.put("team/sub/secret%d" % number, {"number": number})
+    kv.put("other", {})
+
+    cli("secret-del", "-r", *mode, "secret", "team")
+
+    assert list(kv.secrets) == ["other"]
+
+
+def test_asyncio_list_answers_from_the_index(cli, kv, server, tmp_path, capsys):
+    kv.put("team/a", {})
+    kv.put("team/sub/b", {})
+    index = str(tmp_path / "index.sqlite")
+    cli("secret-list", "--index", index, "secret", "team")
+    capsys.readouterr()
+
+    server.state.requests = 0
+    cli("secret-list", "--asyncio", "--index", index, "secret", "team")
+
+    assert server.state.requests == 0
+    assert capsys.readouterr().out.split() == ["team/a", "team/sub/", "team/sub/b"]
+
+
+def test_asyncio_move_rejects_journal(cli, kv, tmp_path):
+    kv.put("team/a", {})
+
+    with pytest.raises(SystemExit) as exit_info:
+        cli(
+            "secret-mv",
+            "-r",
+            "--asyncio",
+            "--journal",
+            str(tmp_path / "journal"),
+            "secret",
+            "team",
+            "moved",
+        )
+
+    assert exit_info.value.code == 1
+    assert list(kv.secrets) == ["team/a"]
+
+
+@pytest.mark.parametrize(
+    "timestamp",
+    [
+        "2018-03-22T02:24:06.945319214Z",
+        "2018-03-22T02:24:06.945319+00:00",
+        "2018-03-22T04:24:06.945319+02:00",
+        "2018-03-22T02:24:06.945319",
+    ],
+)
+def test_parse_time(timestamp):
+    expected = datetime.datetime(
+        2018, 3, 22, 2, 24, 6, 945319, tzinfo=datetime.timezone.utc
+    )
+    assert parse_time(timestamp) == expected
+
+
+def test_parse_time_without_fraction_and_offset():
+    assert parse_time("2018-03-22T02:24:06").tzinfo == datetime.timezone.utc
+    assert parse_time("") is None
+
+
+def test_move_resumes_from_the_journal(cli, kv, tmp_path):
+    for number in range(1, 4):
+        kv.put("team/a", {"version": number})
+    # A move interrupted after the first version, the last line was cut
+    kv.put("moved/a", {"version": 1})
+    journal = tmp_path / "journal"
+    journal.write_text(
+        '{"from": "team/a", "to": "moved/a", "version": "1"}\n{"from": "te'
+    )
+
+    cli("secret-mv", "--journal", str(journal), "secret", "team/a", "moved/a")
+
+    assert list(kv.secrets) == ["moved/a"]
+    versions = kv.secrets["moved/a"]["versions"]
+    assert [versions[str(number)]["data"] for number in range(1, 4)] == [
+        {"version": 1},
+        {"version": 2},
+        {"version": 3},
+    ]
+
+    # The move is recorded as done, a rerun writes nothing
+    kv.put("team/a", {"version": 4})
+    cli("secret-mv", "--journal", str(journal), "secret", "team/a", "moved/a")
+    assert kv.secrets["moved/a"]["current_version"] == 3
@@ -0,0 +1,22 @@
+"""
+Tests of secret-stats.
+"""
+import json
+
+
+def test_total_is_labeled(cli, kv, capsys):
+    kv.put("team/a/one", {"user": "u"})
+    kv.put("team/b/two", {"user": "u", "password": "p"})
+    kv.put("team/b/two", {"user": "u"})
+
+    cli("secret-stats", "--json", "--group-depth", "0", "secret", "team")
+
+    summaries = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [summary["prefix"] for summary in summaries] == ["team/", "TOTAL"]
+    assert summaries[-1]["secrets"] == 2
+    assert summaries[-1]["versions"]["max"] == 2
+
+    cli("secret-stats", "secret", "team")
+
+    rows = capsys.readouterr().out.splitlines()
+    assert [row.split()[0] for row in rows[1:]] == ["team/a/", "team/b/", "TOTAL"]
@@ -0,0 +1,105 @@
+"""
+Tests of secret-sync.
+"""
+from benchmarks.fake_vault import FakeVault
+
+
+def test_hash_cache_is_kept_per_target(cli, kv, tmp_path):
+    kv.put("team/a", {"user": "a"})
+    kv.put("team/b", {"user": "b"})
+    hashes = str(tmp_path / "hashes.json")
+
+    for _ in range(2):
+        with FakeVault() as target:
+            cli(
+                "secret-sync",
+                "--target-url",
+                target.url,
+                "--hash-cache",
+                hashes,
+                "secret",
+                "team",
+                "copy",
+            )
+            assert sorted(target.state.engine("secret").secrets) == [
+                "copy/a",
+                "copy/b",
+            ]
+
+
+def test_concurrent_change_of_the_target_is_a_conflict(cli, kv, capsys):
+    kv.put("team/a", {"user": "new"})
+    kv.put("copy/a", {"user": "old"})
+    original_put = kv.put
+
+    def put(path, data, cas=None):
+        # Another client writes between the read and the write of the sync
+        if path == "copy/a" and cas is not None:
+            original_put(path, {"user": "other"})
+        return original_put(path, data, cas)
+
+    kv.put = put
+
+    cli("secret-sync", "secret", "team", "copy")
+
+    assert kv.read("copy/a")["data"] == {"user": "other"}
+    assert "0 updated and 0 deleted, 0 unchanged, 1 conflicts" in (
+        capsys.readouterr().out
+    )
+
+
+def test_extra_secrets_are_only_deleted_with_delete_extra(cli, kv, capsys):
+    kv.put("team/a", {"user": "a"})
+    kv.put("copy/a", {"user": "a"})
+    kv.put("copy/extra", {"user": "x"})
+
+    cli("secret-sync", "secret", "team", "copy")
+    assert "copy/extra" in kv.secrets
+    assert "0 deleted" in capsys.readouterr().out
+
+    cli("secret-sync", "--delete-extra", "--dryrun", "secret", "team", "copy")
+    assert "copy/extra" in kv.secrets
+    assert "1 deleted" in capsys.readouterr().out
+
+    cli("secret-sync", "--delete-extra", "secret", "team", "copy")
+    assert sorted(kv.secrets) == ["copy/a", "team/a"]
+    assert "1 deleted" in capsys.readouterr().out
+
+
+def test_dryrun_writes_nothing(cli, kv, capsys):
+    kv.put("team/a", {"user": "a"})
+    kv.put("team/b", {"user": "b"})
+    kv.put("copy/b", {"user": "old"})
+    kv.put("copy/extra", {})
+    versions = {path: kv.secrets[path]["current_version"] for path in kv.secrets}
+
+    cli(
+        "secret-sync",
+        "--dryrun",
+        "--delete-extra",
+        "--preserve-versions",
+        "secret",
+        "team",
+        "copy",
+    )
+
+    assert {path: kv.secrets[path]["current_version"] for path in kv.secrets} == (
+        versions
+    )
+    assert capsys.readouterr().out.startswith(
+        "1 secrets would be copied, 1 updated and 1 deleted"
+    )
+
+
+def test_preserve_versions_copies_the_history(cli, kv):
+    for number in range(3):
+        kv.put("team/a", {"version": number})
+    kv.soft_delete("team/a", [2])
+
+    cli("secret-sync", "--preserve-versions", "secret", "team", "copy")
+
+    versions = kv.secrets["copy/a"]["versions"]
+    assert [versions[str(number)]["data"] for number in (1, 2)] == [
+        {"version": 0},
+        {"version": 2},
+    ]
@@ -0,0 +1,97 @@
+"""
+Tests of the retries and the response cache of the Vault class.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+import requests
+from benchmarks.fake_vault import FakeVault
+from vault.cache import ResponseCache
+from vault.exceptions import VaultHTTPError
+from vault.retry import RetryPolicy
+from vault.vault import Vault
+
+SECRETS = {"team/secret%d" % number: {"number": number} for number in range(50)}
+
+
+def test_transient_errors_are_retried():
+    policy = RetryPolicy(retries=20, backoff=0.001)
+    with FakeVault(SECRETS, error_rate=0.3) as server:
+        vault = Vault(server.url, "token", retry_policy=policy)
+        secrets = list(vault.secret.recursive_list("secret", "team", workers=4))
+        for secret in secrets:
+            data, _ = vault.secret.read_current("secret", secret)
+            assert data == SECRETS[secret.lstrip("/")]
+        vault.close()
+    assert len(secrets) == 50
+
+
+@pytest.mark.parametrize("status, retried", [(503, True), (500, False)])
+def test_errors_are_raised_after_the_retries(status, retried, monkeypatch):
+    policy = RetryPolicy(retries=3, backoff=0.001)
+    attempts = []
+    monkeypatch.setattr(
+        policy, "wait", lambda attempt, _=None: attempts.append(attempt)
+    )
+    with FakeVault(SECRETS, error_rate=1, error_status=status) as server:
+        vault = Vault(server.url, "token", retry_policy=policy)
+        with pytest.raises(VaultHTTPError) as error:
+            vault.secret.list("secret", "team")
+        vault.close()
+    assert error.value.status_code == status
+    assert attempts == ([0, 1, 2] if retried else [])
+
+
+def test_writes_invalidate_the_cached_responses(server):
+    cache = ResponseCache()
+    vault = Vault(server.url, "token", cache=cache)
+    address = server.url + "/v1/sys/policies/acl"
+    server.state.policies["first"] = "path {}"
+
+    def list_policies():
+        response = vault.requests_request("LIST", address, headers=vault.token_header)
+        return response.json()["data"]["keys"]
+
+    assert list_policies() == ["first"]
+    requests = server.state.requests
+    assert list_policies() == ["first"]
+    assert server.state.requests == requests
+
+    vault.requests_request(
+        "POST",
+        address + "/second",
+        headers=vault.token_header,
+        json={"policy": "path {}"},
+    )
+    assert list_policies() == ["first", "second"]
+    assert cache.hits == 1
+    vault.close()
+
+
+class LockCheckingCache(ResponseCache):
+
+    """Response cache failing if its counters are updated without the lock"""
+
+    def __setattr__(self, name, value):
+        if name in ("hits", "misses") and hasattr(self, "_lock"):
+            assert self._lock.locked(), "%s updated without the lock" % name
+        super().__setattr__(name, value)
+
+
+def test_cache_counters_are_updated_under_the_lock():
+    cache = LockCheckingCache()
+    url = "http://vault/v1/sys/policies/acl"
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'{"data": {"keys": []}}'
+    cache.put("token", "LIST", url, response)
+
+    def read(token):
+        for _ in range(500):
+            cache.get(token, "LIST", url)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(read, token) for token in ["token", "other"] * 4]
+        for future in futures:
+            future.result()
+    assert cache.hits == 2000
+    assert cache.misses == 2000
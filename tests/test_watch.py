@@ -0,0 +1,97 @@
+"""
+Tests of the adaptive polling of secret-watch.
+"""
+from vault.watch import Schedule, Watcher
+
+
+class Clock:
+
+    """Monotonic clock that only moves when the test advances it."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_quiet_entries_back_off_up_to_the_maximum():
+    schedule = Schedule(1, 8)
+    schedule.add("a", 0)
+    assert schedule.due(0) == ["a"]
+
+    now = 0
+    for expected in [2, 4, 8, 8, 8]:
+        schedule.reschedule("a", False, now)
+        assert schedule.intervals["a"] == expected
+        # Quiet entries get a jitter of up to half their interval
+        due_at = schedule.next_due()
+        assert now + expected / 2 <= due_at <= now + expected
+        assert schedule.due(due_at - 0.01) == []
+        assert schedule.due(due_at) == ["a"]
+        now = due_at
+
+
+def test_changed_entries_are_reset_to_the_minimum():
+    schedule = Schedule(1, 8)
+    schedule.add("a", 0)
+    schedule.due(0)
+    for _ in range(3):
+        schedule.reschedule("a", False, 0)
+        schedule.due(100)
+
+    schedule.reschedule("a", True, 100)
+
+    assert schedule.intervals["a"] == 1
+    assert schedule.next_due() == 101
+
+
+def test_removed_entries_are_not_due():
+    schedule = Schedule(1, 8)
+    schedule.add("a", 0)
+    schedule.add("b", 0)
+    schedule.remove("a")
+
+    assert schedule.due(0) == ["b"]
+    assert schedule.next_due() is None
+
+
+def test_watcher_reports_changes_and_backs_off(vault, kv):
+    kv.put("team/a", {"user": "a"})
+    clock = Clock()
+    watcher = Watcher(
+        vault, "secret", "team", min_interval=1, max_interval=8, clock=clock
+    )
+
+    # The first poll only records the tree
+    assert list(watcher.poll()) == []
+    assert watcher.secret_schedule.intervals["team/a"] == 1
+
+    # Nothing changes, the folder and the secret are polled less and less often
+    for expected in [2, 4, 8, 8]:
+        clock.now = clock.now + 8
+        assert list(watcher.poll()) == []
+        assert watcher.secret_schedule.intervals["team/a"] == expected
+        assert watcher.folder_schedule.intervals["team/"] == expected
+    assert watcher.next_poll() > clock.now + 3
+
+    kv.put("team/a", {"user": "changed"})
+    clock.now = clock.now + 8
+    events = list(watcher.poll())
+
+    assert [(event["event"], event["path"]) for event in events] == [
+        ("updated", "team/a")
+    ]
+    assert watcher.secret_schedule.intervals["team/a"] == 1
+    assert watcher.secret_schedule.next_due() == clock.now + 1
+
+    kv.put("team/b", {})
+    kv.delete("team/a")
+    clock.now = clock.now + 8
+    events = list(watcher.poll())
+    # New secrets of a listing are polled right away
+    assert sorted((event["event"], event["path"]) for event in events) == [
+        ("added", "team/b"),
+        ("deleted", "team/a"),
+    ]
+    assert watcher.folder_schedule.intervals["team/"] == 1
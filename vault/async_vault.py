@@ -0,0 +1,364 @@
+"""
+Asyncio counterpart of the Vault class. The requests are sent on the pooled
+session of a Vault instance by a bounded thread pool, so url building and
+error handling are exactly the same as in the synchronous client.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from .vault import Vault
+from .walker import visit
+
+
+class AsyncVault:
+
+    """Class for wrapping the vault http api with asyncio."""
+
+    def __init__(self, vault_adress, token, concurrency=10, **kwargs):
+        """
+        :vault_adress: url of the vault server
+        :token: vault token
+        :concurrency: maximal number of requests in flight
+        :kwargs: connection settings passed on to Vault
+        """
+        kwargs.setdefault("pool_size", concurrency)
+        self._init(Vault(vault_adress, token, **kwargs), concurrency)
+        self._owns_vault = True
+
+    @classmethod
+    def from_vault(cls, vault, concurrency=10):
+        """ Create an async client sharing the session of the given Vault,
+        the Vault is not closed with the async client
+
+        :vault: Vault instance
+        :concurrency: maximal number of requests in flight
+        :returns: AsyncVault
+
+        """
+        async_vault = cls.__new__(cls)
+        async_vault._init(vault, concurrency)  # pylint: disable=protected-access
+        return async_vault
+
+    def _init(self, vault, concurrency):
+        self.vault = vault
+        self.vault_adress = vault.vault_adress
+        self.token = vault.token
+        self.token_header = vault.token_header
+        self.concurrency = concurrency
+        self._semaphore = None
+        self._executor = ThreadPoolExecutor(max_workers=concurrency)
+        # A Vault passed to from_vault is closed by its owner
+        self._owns_vault = False
+
+        # Initialize Subclasses
+        self.secret = AsyncSecret(self, vault.secret)
+        self.totp = AsyncSubclient(self, vault.totp)
+        self.user = AsyncUser(self, vault.user)
+        self.policy = AsyncSubclient(self, vault.policy)
+        self.group = AsyncGroup(self, vault.group)
+
+    normalize = staticmethod(Vault.normalize)
+
+    def path_to_ui_link(self, engine_path, path):
+        """ Generate a url from the given path, see Vault.path_to_ui_link """
+        return self.vault.path_to_ui_link(engine_path, path)
+
+    def unwrap_str(self, token):
+        """ Generates an unwrap commanline, see Vault.unwrap_str """
+        return self.vault.unwrap_str(token)
+
+    async def run(self, func, *args, **kwargs):
+        """ Run the given blocking function without blocking the event loop.
+        At most concurrency functions run at the same time.
+
+        :func: function to run
+        :returns: return value of the function
+
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        loop = asyncio.get_running_loop()
+        async with self._semaphore:
+            return await loop.run_in_executor(
+                self._executor, functools.partial(func, *args, **kwargs)
+            )
+
+    async def requests_request(self, *args, **kwargs):
+        """ Async version of Vault.requests_request
+        :returns: response
+
+        """
+        return await self.run(self.vault.requests_request, *args, **kwargs)
+
+    async def wrap(self, data, ttl=600):
+        """ Async version of Vault.wrap
+        :returns: wrapping token
+
+        """
+        return await self.run(self.vault.wrap, data, ttl)
+
+    async def unwrap(self, token=None):
+        """ Async version of Vault.unwrap
+        :returns: Unwraped data
+
+        """
+        return await self.run(self.vault.unwrap, token)
+
+    async def close(self):
+        """ Close the thread pool and, if this instance created the Vault, all
+        pooled connections
+        :returns: None
+
+        """
+        # Waiting for the running requests must not block the event loop
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, functools.partial(self._executor.shutdown, wait=True)
+        )
+        if self._owns_vault:
+            self.vault.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+
+class AsyncSubclient:
+
+    """Async version of a Vault subclass. Every method of the wrapped
+    subclass is available as coroutine function with the same arguments."""
+
+    def __init__(self, async_vault, client):
+        self.async_vault = async_vault
+        self.client = client
+
+    def __getattr__(self, name):
+        attribute = getattr(self.client, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        async def method(*args, **kwargs):
+            return await self.async_vault.run(attribute, *args, **kwargs)
+
+        return method
+
+
+class AsyncSecret(AsyncSubclient):
+
+    """Async version of the Secret class."""
+
+    async def recursive_list(self, engine_path, path, ordered=True, path_filter=None):
+        """ List secrets on a given path recursively, sibling folders are listed
+        concurrently
+
+        :engine_path: path of the secret engine
+        :path: path to list
+        :ordered: keep the depth first order of Secret.recursive_list,
+        otherwise secrets are yielded as soon as their folder was listed
+        :path_filter: optional PathFilter, pruned folders are not listed
+        :returns: async generator for the secret list
+
+        """
+        if ordered:
+            walk = self._walk_ordered(engine_path, path, path_filter)
+        else:
+            walk = self._walk_unordered(engine_path, path, path_filter)
+        async for secret in walk:
+            yield secret
+
+    def _list_task(self, engine_path, path):
+        return asyncio.ensure_future(self.list(engine_path, path))
+
+    async def _walk_ordered(self, engine_path, path, path_filter):
+        def expand(folder, keys):
+            entries = []
+            for key in keys:
+                child = self.client.join(folder, key)
+                yielded, listed = visit(child, path_filter)
+                task = None
+                if listed:
+                    task = self._list_task(engine_path, child)
+                if yielded:
+                    entries.append((child, task))
+            return iter(entries)
+
+        stack = [expand(path, await self.list(engine_path, path))]
+        try:
+            while stack:
+                for child, task in stack[-1]:
+                    yield child
+                    if task is not None:
+                        stack.append(expand(child, await task))
+                        break
+                else:
+                    stack.pop()
+        finally:
+            for entries in stack:
+                for _, task in entries:
+                    if task is not None:
+                        task.cancel()
+
+    async def _walk_unordered(self, engine_path, path, path_filter):
+        pending = {self._list_task(engine_path, path): path}
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    folder = pending.pop(task)
+                    children = []
+                    for key in task.result():
+                        child = self.client.join(folder, key)
+                        yielded, listed = visit(child, path_filter)
+                        if listed:
+                            pending[self._list_task(engine_path, child)] = child
+                        if yielded:
+                            children.append(child)
+                    for child in children:
+                        yield child
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _run_bounded(self, operation, items):
+        """ Run the given coroutine function for every item, at most twice
+        concurrency tasks are pending. The first error cancels the pending
+        tasks and stops reading the items.
+
+        :operation: coroutine function taking an item
+        :items: async generator of items
+        :returns: None
+
+        """
+        limit = 2 * self.async_vault.concurrency
+        pending = set()
+        try:
+            async for item in items:
+                while len(pending) >= limit:
+                    done, pending = await asyncio.wait(
+                        pending, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    for task in done:
+                        task.result()
+                pending.add(asyncio.ensure_future(operation(item)))
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    task.result()
+        finally:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            await items.aclose()
+
+    async def recursive_delete(self, engine_path, path, path_filter=None, dryrun=False):
+        """ Delete all secrets under the given path permanently from vault,
+        the deletes run concurrently
+
+        :engine_path: path of the secret engine
+        :path: path to delete
+        :path_filter: optional PathFilter, only matching secrets are deleted
+        :dryrun: only count the requests that would be issued
+        :returns: tuple of the number of list and delete requests
+
+        """
+        # The given path itself is listed as well
+        counts = {"lists": 1, "deletes": 0}
+
+        async def secrets():
+            walk = self.recursive_list(engine_path, path, False, path_filter)
+            async for secret in walk:
+                # Folders vanish with their last secret
+                if secret.endswith("/"):
+                    if path_filter is None or path_filter.descend(secret):
+                        counts["lists"] += 1
+                    continue
+                counts["deletes"] += 1
+                yield secret
+
+        if dryrun:
+            async for _ in secrets():
+                pass
+            print(
+                "Would issue %d DELETE requests after %d LIST requests"
+                % (counts["deletes"], counts["lists"])
+            )
+        else:
+            await self._run_bounded(
+                lambda secret: self.delete(engine_path, secret), secrets()
+            )
+        return counts["lists"], counts["deletes"]
+
+    async def recursive_mv(self, engine_path, from_path, to_path, path_filter=None):
+        """ Move the given folders with all secrets and versions, the secrets
+        are moved concurrently
+
+        :engine_path: path of the secret engine
+        :from_path: path of the folders
+        :to_path: path to move the folders
+        :path_filter: optional PathFilter, only matching secrets are moved
+        :returns: None
+
+        """
+        if not from_path.endswith("/"):
+            from_path = from_path + "/"
+
+        if not to_path.endswith("/"):
+            to_path = to_path + "/"
+
+        async def secrets():
+            walk = self.recursive_list(engine_path, from_path, False, path_filter)
+            async for secret in walk:
+                if not secret.endswith("/"):
+                    yield secret
+
+        await self._run_bounded(
+            lambda secret: self.mv(
+                engine_path, secret, secret.replace(from_path, to_path)
+            ),
+            secrets(),
+        )
+
+
+class AsyncUser(AsyncSubclient):
+
+    """Async version of the User class."""
+
+    async def get_entities(self):
+        """ Get all entities in vault, the entities are read concurrently
+        :returns: async generator over entities
+
+        """
+        address = self.async_vault.vault_adress + "/v1/identity/entity/name"
+        request = await self.async_vault.requests_request(
+            "LIST", address, headers=self.async_vault.token_header
+        )
+        entity_names = request.json()["data"]["keys"]
+        tasks = [
+            asyncio.ensure_future(self.get_entity_by_name(name))
+            for name in entity_names
+        ]
+        for task in tasks:
+            yield await task
+
+
+class AsyncGroup(AsyncSubclient):
+
+    """Async version of the Group class."""
+
+    async def recursive_read(self):
+        """ read the details of all groups concurrently
+
+        :returns: async generator over group names and details
+
+        """
+        groups = await self.list()
+        tasks = [asyncio.ensure_future(self.read(group)) for group in groups]
+        for group, task in zip(groups, tasks):
+            yield group, await task
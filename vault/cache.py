@@ -0,0 +1,265 @@
+"""
+Response cache for read mostly endpoints of the vault api. Only endpoints with
+a configured time to live are cached, the data of kv secrets never is. A write
+of the client to a path invalidates all cached responses of the same mount,
+e.g. a POST to identity/entity-alias drops the cached entities.
+"""
+import collections
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from .metrics import endpoint_template
+
+# Time to live in seconds per method and endpoint template
+DEFAULT_TTLS = {
+    ("GET", "sys/auth"): 300,
+    ("LIST", "sys/policies/acl"): 60,
+    ("GET", "sys/policies/acl/*"): 60,
+    ("LIST", "identity/entity/name"): 60,
+    ("GET", "identity/entity/name/*"): 60,
+    ("LIST", "identity/group/name"): 60,
+    ("GET", "identity/group/name/*"): 60,
+    ("LIST", "auth/userpass/users"): 60,
+}
+
+READ_METHODS = frozenset(["GET", "LIST"])
+WRITE_METHODS = frozenset(["POST", "PUT", "PATCH", "DELETE"])
+
+
+def mount_of(url):
+    """ First path segment after /v1, writes invalidate everything below it
+
+    :url: url of the request
+    :returns: mount as string
+
+    """
+    path = urlsplit(url).path
+    if path.startswith("/v1/"):
+        path = path[len("/v1/") :]
+    return path.strip("/").split("/", 1)[0]
+
+
+def token_hash(token):
+    """ Hash of the token, so responses are never shared between tokens and
+    the token is not written to disk
+
+    :token: vault token
+    :returns: hex digest
+
+    """
+    return hashlib.sha256((token or "").encode()).hexdigest()
+
+
+class CachedResponse:
+
+    """Serializable copy of a response."""
+
+    def __init__(self, status_code, reason, headers, content, expires):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+        self.expires = expires
+
+    @classmethod
+    def from_response(cls, response, ttl):
+        """ Copy the given response
+        :returns: CachedResponse
+
+        """
+        return cls(
+            response.status_code,
+            response.reason,
+            dict(response.headers),
+            response.content,
+            time.time() + ttl,
+        )
+
+    def to_response(self, url):
+        """ Create a new requests response from the copy
+        :returns: requests.Response
+
+        """
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.reason = self.reason
+        response.headers.update(self.headers)
+        response._content = self.content  # pylint: disable=protected-access
+        response.url = url
+        return response
+
+    def to_json(self):
+        """ Serialize the copy
+        :returns: json string
+
+        """
+        return json.dumps(
+            {
+                "status_code": self.status_code,
+                "reason": self.reason,
+                "headers": self.headers,
+                "content": self.content.decode("latin-1"),
+                "expires": self.expires,
+            }
+        )
+
+    @classmethod
+    def from_json(cls, data):
+        """ Deserialize a copy
+        :returns: CachedResponse
+
+        """
+        data = json.loads(data)
+        data["content"] = data["content"].encode("latin-1")
+        return cls(**data)
+
+
+class DiskBackend:
+
+    """Stores cached responses as files, so consecutive runs can share them.
+    The files are only readable by the current user."""
+
+    def __init__(self, directory):
+        self.directory = os.path.expanduser(directory)
+
+    def _path(self, token, url, method=None):
+        path = os.path.join(self.directory, token_hash(token), mount_of(url))
+        if method is None:
+            return path
+        key = hashlib.sha256((method + " " + url).encode()).hexdigest()
+        return os.path.join(path, key + ".json")
+
+    def get(self, token, method, url):
+        """ Load a cached response
+        :returns: CachedResponse or None
+
+        """
+        try:
+            with open(self._path(token, url, method), "r") as f:
+                return CachedResponse.from_json(f.read())
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def put(self, token, method, url, cached):
+        """ Store a cached response
+        :returns: None
+
+        """
+        path = self._path(token, url, method)
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        tmp_path = path + ".%d.tmp" % threading.get_ident()
+        file_descriptor = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(file_descriptor, "w") as f:
+            f.write(cached.to_json())
+        os.replace(tmp_path, path)
+
+    def invalidate(self, token, url):
+        """ Drop all cached responses of the mount of the given url
+        :returns: None
+
+        """
+        shutil.rmtree(self._path(token, url), ignore_errors=True)
+
+
+class ResponseCache:
+
+    """Thread safe LRU cache of responses with a time to live per endpoint and
+    an upper bound for the size of the cached content."""
+
+    def __init__(self, ttls=None, max_size=16 * 1024 * 1024, backend=None):
+        """
+        :ttls: time to live per method and endpoint template, see DEFAULT_TTLS
+        :max_size: maximal size of the cached content in memory in bytes
+        :backend: optional second level cache, e.g. DiskBackend
+        """
+        self.ttls = DEFAULT_TTLS if ttls is None else ttls
+        self.max_size = max_size
+        self.backend = backend
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def ttl(self, method, url):
+        """ Time to live for the given request
+        :returns: seconds or None if the request is not cached
+
+        """
+        return self.ttls.get((method.upper(), endpoint_template(url)))
+
+    def get(self, token, method, url):
+        """ Look up a cached response
+
+        :token: token of the request
+        :method: http method
+        :url: url of the request
+        :returns: requests.Response or None
+
+        """
+        method = method.upper()
+        if method not in READ_METHODS or self.ttl(method, url) is None:
+            return None
+        key = (token_hash(token), method, url)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+        if cached is None and self.backend is not None:
+            cached = self.backend.get(token, method, url)
+            if cached is not None and cached.expires > time.time():
+                self._store(key, cached)
+        if cached is None or cached.expires <= time.time():
+            with self._lock:
+                self.misses = self.misses + 1
+            return None
+        with self._lock:
+            self.hits = self.hits + 1
+        logging.debug("Cache hit for %s %s", method, url)
+        return cached.to_response(url)
+
+    def put(self, token, method, url, response):
+        """ Cache the given response if its endpoint has a time to live
+        :returns: None
+
+        """
+        method = method.upper()
+        ttl = self.ttl(method, url)
+        if method not in READ_METHODS or ttl is None:
+            return
+        cached = CachedResponse.from_response(response, ttl)
+        self._store((token_hash(token), method, url), cached)
+        if self.backend is not None:
+            self.backend.put(token, method, url, cached)
+
+    def invalidate(self, token, method, url):
+        """ Drop all responses of the mount written by the given request
+        :returns: None
+
+        """
+        if method.upper() not in WRITE_METHODS:
+            return
+        mount = mount_of(url)
+        with self._lock:
+            for key in list(self._entries):
+                if mount_of(key[2]) == mount:
+                    self.size = self.size - len(self._entries.pop(key).content)
+        if self.backend is not None:
+            self.backend.invalidate(token, url)
+
+    def _store(self, key, cached):
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size = self.size - len(previous.content)
+            self._entries[key] = cached
+            self.size = self.size + len(cached.content)
+            while self.size > self.max_size and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self.size = self.size - len(evicted.content)
@@ -0,0 +1,227 @@
+"""
+This module reports changed and stale secrets below a path. Only the metadata
+of the secrets is read, a watermark file remembers the current versions of the
+last run, so the next run reports what was added, updated or deleted since.
+"""
+import datetime
+import json
+import logging
+import os
+from .index import SecretIndex
+from .pool import Progress, bounded_map
+from .secret import (
+    add_engine_argument,
+    add_index_arguments,
+    add_walk_arguments,
+    parse_time,
+)
+
+
+class Watermark:
+
+    """Current versions of the secrets below a path at the time of the last
+    run, stored as json."""
+
+    def __init__(self, filename):
+        """
+        :filename: path of the watermark file, it is loaded if it exists
+        """
+        self.filename = filename
+        self.time = None
+        self.versions = None
+        if os.path.exists(filename):
+            with open(filename, "r") as f:
+                data = json.load(f)
+            self.time = data["time"]
+            self.versions = data["versions"]
+
+    def save(self, time, versions):
+        """ Replace the watermark atomically
+
+        :time: timestamp of the run as string
+        :versions: dict of secret paths to their current version
+        :returns: None
+
+        """
+        tmp_file = self.filename + ".tmp"
+        with open(tmp_file, "w") as f:
+            json.dump({"time": time, "versions": versions}, f, separators=(",", ":"))
+        os.replace(tmp_file, self.filename)
+        self.time = time
+        self.versions = versions
+
+
+def compact_metadata(metadata):
+    """ The fields of the metadata needed to detect changes
+
+    :metadata: metadata of a secret
+    :returns: dict with current_version, created_time and updated_time
+
+    """
+    return {
+        "current_version": metadata["current_version"],
+        "created_time": metadata.get("created_time"),
+        "updated_time": metadata.get("updated_time"),
+    }
+
+
+def walk_metadata(vault, engine_path, path, workers=8, index=None):
+    """ Metadata of all secrets below the given path. The metadata is read
+    concurrently while the tree is walked, or taken from the index.
+
+    :vault: Vault class
+    :engine_path: path of the secret engine
+    :path: path to walk
+    :workers: number of concurrent requests
+    :index: optional SecretIndex, it has to be refreshed by the caller
+    :returns: generator of tuples of secret path and compact metadata
+
+    """
+    if index is not None:
+        for secret in index.secrets(vault, engine_path, path):
+            yield secret, compact_metadata(index.metadata(engine_path, secret))
+        return
+    secrets = (
+        secret.lstrip("/")
+        for secret in vault.secret.recursive_list(engine_path, path, workers, False)
+        if not secret.endswith("/")
+    )
+    progress = Progress("Read metadata")
+    results = bounded_map(
+        lambda secret: vault.secret.read_metadata(engine_path, secret),
+        secrets,
+        workers,
+    )
+    for secret, metadata in results:
+        progress.advance()
+        yield secret, compact_metadata(metadata)
+    progress.finish()
+
+
+def change_event(event, path, metadata=None):
+    """ Event describing the change of a secret
+
+    :event: "added", "updated", "deleted" or "stale"
+    :path: path of the secret
+    :metadata: compact metadata of the secret, None if it was deleted
+    :returns: dict
+
+    """
+    change = {"event": event, "path": path}
+    if metadata is not None:
+        change["version"] = metadata["current_version"]
+        change["updated_time"] = metadata["updated_time"]
+    return change
+
+
+def diff_versions(previous, current):
+    """ Compare the versions of two runs
+
+    :previous: dict of secret paths to versions of the last run
+    :current: dict of secret paths to compact metadata of this run
+    :returns: generator of change events
+
+    """
+    for path, metadata in current.items():
+        if path not in previous:
+            yield change_event("added", path, metadata)
+        elif previous[path] != metadata["current_version"]:
+            yield change_event("updated", path, metadata)
+    for path in previous:
+        if path not in current:
+            yield change_event("deleted", path)
+
+
+def print_event(change, as_json=False):
+    """ Print a change event as json or a line of text
+    :returns: None
+
+    """
+    if as_json:
+        print(json.dumps(change), flush=True)
+        return
+    print(
+        "{:8} {} {} {}".format(
+            change["event"],
+            change["path"],
+            change.get("version", ""),
+            change.get("updated_time", ""),
+        ).rstrip(),
+        flush=True,
+    )
+
+
+def run(args, vault):
+    """Run this module
+    :returns: None
+
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    index = SecretIndex(args.index) if args.index else None
+    try:
+        if index is not None and not index.is_fresh(
+            args.engine, args.vaultpath, args.max_staleness
+        ):
+            # The metadata has to be as recent as the index itself
+            index.refresh(
+                vault, args.engine, args.vaultpath, args.workers, args.max_staleness
+            )
+        current = dict(
+            walk_metadata(vault, args.engine, args.vaultpath, args.workers, index)
+        )
+    finally:
+        if index is not None:
+            index.close()
+
+    if args.since is not None:
+        since = now - datetime.timedelta(hours=args.since)
+        for path, metadata in sorted(current.items()):
+            updated = parse_time(metadata["updated_time"])
+            if updated is not None and updated >= since:
+                print_event(change_event("updated", path, metadata), args.json)
+    if args.stale_days is not None:
+        stale = now - datetime.timedelta(days=args.stale_days)
+        for path, metadata in sorted(current.items()):
+            updated = parse_time(metadata["updated_time"])
+            if updated is not None and updated < stale:
+                print_event(change_event("stale", path, metadata), args.json)
+    if args.watermark:
+        watermark = Watermark(args.watermark)
+        if watermark.versions is None:
+            logging.info("Created the watermark %s", args.watermark)
+        else:
+            for change in diff_versions(watermark.versions, current):
+                print_event(change, args.json)
+        watermark.save(
+            now.isoformat(),
+            {path: metadata["current_version"] for path, metadata in current.items()},
+        )
+
+
+def parse_commandline_arguments(subparsers, config):
+    """ Commandline argument parser for this module
+    :returns: None
+
+    """
+    parser = subparsers.add_parser("secret-changes")
+    parser.set_defaults(func=run)
+    add_engine_argument(parser, config)
+    parser.add_argument("vaultpath", help="path of the secrets to check")
+    parser.add_argument(
+        "--watermark",
+        help="file with the versions of the last run, the changes since then "
+        + "are reported and the file is updated",
+    )
+    parser.add_argument(
+        "--since", type=float, help="report secrets updated in the last hours"
+    )
+    parser.add_argument(
+        "--stale-days",
+        type=float,
+        help="report secrets that were not updated for this number of days",
+    )
+    parser.add_argument(
+        "--json", help="print the changes as json lines", action="store_true"
+    )
+    add_walk_arguments(parser)
+    add_index_arguments(parser)
@@ -0,0 +1,273 @@
+"""
+This module dumps all secrets under a given path as newline delimited json and
+restores such a dump. Every line is one record with path, version, data and
+metadata of a secret.
+"""
+import collections
+import json
+import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from .exceptions import VaultHTTPError
+from .manifest import HashManifest
+from .pool import Progress, bounded_map
+from .secret import add_engine_argument, add_walk_arguments, content_hash
+
+
+def dump_secret(vault, engine_path, path, all_versions=False, executor=None):
+    """ Read data and metadata of the given secret
+
+    :vault: Vault class
+    :engine_path: path of the secret engine
+    :path: path of the secret
+    :all_versions: also read the data of all older versions
+    :executor: optional executor to read the metadata concurrently to the data
+    :returns: record as dict, data is None and deleted is set if the current
+    version is deleted or destroyed, None if the secret does not exist anymore
+
+    """
+    future = None
+    if executor is not None:
+        future = executor.submit(vault.secret.read_metadata, engine_path, path)
+    data, version = vault.secret.read_current(engine_path, path)
+    try:
+        if future is None:
+            metadata = vault.secret.read_metadata(engine_path, path)
+        else:
+            metadata = future.result()
+    except VaultHTTPError as error:
+        if error.status_code != 404:
+            raise
+        metadata = None
+    if metadata is None or not version:
+        # Deleted between listing and reading the secret
+        return None
+    record = {"path": path, "version": version, "data": data, "metadata": metadata}
+    if data is None:
+        record["deleted"] = True
+    if all_versions:
+        versions = {}
+        for version in sorted(metadata["versions"], key=int):
+            details = metadata["versions"][version]
+            if details.get("destroyed") or details.get("deletion_time"):
+                versions[version] = None
+                continue
+            try:
+                versions[version] = vault.secret.read_version(
+                    engine_path, path, version
+                )
+            except VaultHTTPError as error:
+                # Deleted between reading the metadata and the version
+                if error.status_code != 404:
+                    raise
+                versions[version] = None
+        record["versions"] = versions
+    return record
+
+
+def dump(vault, engine_path, path, output, workers=8, ordered=True, all_versions=False):
+    """ Write all secrets under the given path as ndjson records. The secrets
+    are read concurrently, at most a few records per worker are held in memory.
+
+    :vault: Vault class
+    :engine_path: path of the secret engine
+    :path: path to dump
+    :output: file object the records are written to
+    :workers: number of concurrent requests
+    :ordered: write the records in the depth first order of the walk
+    :all_versions: include the data of all versions
+    :returns: number of dumped secrets
+
+    """
+    secrets = (
+        secret
+        for secret in vault.secret.recursive_list(engine_path, path, workers, ordered)
+        if not secret.endswith("/")
+    )
+    progress = Progress("Dumped secrets")
+    with ThreadPoolExecutor(max_workers=workers) as metadata_executor:
+        records = bounded_map(
+            lambda secret: dump_secret(
+                vault, engine_path, secret, all_versions, metadata_executor
+            ),
+            secrets,
+            workers,
+            ordered,
+        )
+        for _, record in records:
+            if record is None:
+                continue
+            output.write(json.dumps(record) + "\n")
+            progress.advance()
+    progress.finish()
+    return progress.count
+
+
+def read_records(dumpfile):
+    """ Read the records of a dump one by one
+
+    :dumpfile: file object of the dump
+    :returns: generator of records
+
+    """
+    for line in dumpfile:
+        if line.strip():
+            yield json.loads(line)
+
+
+def restore_secret(vault, engine_path, record, manifest=None, dryrun=False):
+    """ Write the data of the record if it differs from the current secret.
+    The write uses check-and-set, so a secret changed in the meantime is not
+    overwritten.
+
+    :vault: Vault class
+    :engine_path: path of the secret engine
+    :record: record of a dump
+    :manifest: optional HashManifest, secrets with a matching hash are
+    skipped without reading them
+    :dryrun: do not write anything
+    :returns: "unchanged", "written", "conflict" or "deleted"
+
+    """
+    path = record["path"]
+    # The current version was deleted when the dump was written
+    if record.get("deleted"):
+        return "deleted"
+    digest = content_hash(record["data"])
+    key = engine_path + "/" + path
+    if manifest is not None and manifest.get(key) == digest:
+        return "unchanged"
+    data, version = vault.secret.read_current(engine_path, path)
+    if data is not None and content_hash(data) == digest:
+        if manifest is not None:
+            manifest.set(key, digest)
+        return "unchanged"
+    if dryrun:
+        return "written"
+    try:
+        vault.secret.add(engine_path, path, record["data"], cas=version)
+    except VaultHTTPError as error:
+        if error.status_code != 400:
+            raise
+        logging.warning("Secret %s was changed during the restore: %s", path, error)
+        return "conflict"
+    if manifest is not None:
+        manifest.set(key, digest)
+    return "written"
+
+
+def restore(vault, engine_path, records, workers=8, manifest=None, dryrun=False):
+    """ Restore the given records, only changed secrets are written
+
+    :vault: Vault class
+    :engine_path: path of the secret engine
+    :records: iterable of dump records
+    :workers: number of concurrent requests
+    :manifest: optional HashManifest of the secrets known to be in vault
+    :dryrun: only count the writes
+    :returns: counter of the results
+
+    """
+    progress = Progress("Restored secrets")
+    counts = collections.Counter()
+    results = bounded_map(
+        lambda record: restore_secret(vault, engine_path, record, manifest, dryrun),
+        records,
+        workers,
+    )
+    for _, result in results:
+        counts[result] += 1
+        progress.advance()
+    progress.finish()
+    return counts
+
+
+def run(args, vault):
+    """Run this module
+    :returns: None
+
+    """
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        dump(
+            vault,
+            args.engine,
+            args.vaultpath,
+            output,
+            args.workers,
+            not args.unordered,
+            args.all_versions,
+        )
+    finally:
+        if args.output:
+            output.close()
+
+
+def run_restore(args, vault):
+    """Run the restore subcommand
+    :returns: None
+
+    """
+    manifest = HashManifest(args.hash_cache) if args.hash_cache else None
+    with open(args.dumpfile, "r") as dumpfile:
+        counts = restore(
+            vault,
+            args.engine,
+            read_records(dumpfile),
+            args.workers,
+            manifest,
+            args.dryrun,
+        )
+    if manifest is not None and not args.dryrun:
+        manifest.save()
+    verb = "would be written" if args.dryrun else "written"
+    print(
+        "%d secrets %s, %d unchanged, %d conflicts, %d deleted skipped"
+        % (
+            counts["written"],
+            verb,
+            counts["unchanged"],
+            counts["conflict"],
+            counts["deleted"],
+        )
+    )
+
+
+def parse_commandline_arguments(subparsers, config):
+    """ Commandline argument parser for this module
+    :returns: None
+
+    """
+    restore_parser = subparsers.add_parser("secret-restore")
+    restore_parser.set_defaults(func=run_restore)
+    add_engine_argument(restore_parser, config)
+    restore_parser.add_argument("dumpfile", help="ndjson file written by secret-dump")
+    restore_parser.add_argument(
+        "--hash-cache",
+        help="file with the content hashes of the restored secrets, secrets "
+        + "with an unchanged hash are skipped without reading them from vault",
+    )
+    restore_parser.add_argument(
+        "--dryrun", "-d", help="only count the secrets to write", action="store_true"
+    )
+    add_walk_arguments(restore_parser)
+
+    parser = subparsers.add_parser("secret-dump")
+    parser.set_defaults(func=run)
+    add_engine_argument(parser, config)
+    parser.add_argument(
+        "vaultpath", help="path of the secrets inside the secret engine vault"
+    )
+    parser.add_argument("-o", "--output", help="file to write to, default stdout")
+    parser.add_argument(
+        "--all-versions",
+        help="include the data of all versions of every secret",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--unordered",
+        help="write the secrets as soon as they are read instead of keeping "
+        + "the depth first order",
+        action="store_true",
+    )
+    add_walk_arguments(parser)
@@ -0,0 +1,55 @@
+"""
+Exceptions raised by the vault api wrapper.
+"""
+
+
+class VaultError(Exception):
+
+    """Base class of all errors raised while talking to vault."""
+
+
+class VaultConnectionError(VaultError):
+
+    """No response could be received from vault."""
+
+
+class VaultHTTPError(VaultError):
+
+    """Vault answered with an error status code."""
+
+    def __init__(self, response):
+        self.response = response
+        self.status_code = response.status_code
+        self.reason = response.reason
+        try:
+            self.errors = response.json()["errors"]
+        except (ValueError, KeyError, TypeError):
+            self.errors = []
+        message = f"{self.status_code} {self.reason}"
+        if self.errors:
+            message = message + "\n" + "\n".join(self.errors)
+        super().__init__(message)
+
+    @staticmethod
+    def from_response(response):
+        """ Create the matching exception for the given error response
+
+        :response: response with an error status code
+        :returns: VaultHTTPError or one of its subclasses
+
+        """
+        if response.status_code == 429:
+            return VaultRateLimitError(response)
+        if response.status_code >= 500:
+            return VaultServerError(response)
+        return VaultHTTPError(response)
+
+
+class VaultRateLimitError(VaultHTTPError):
+
+    """Vault rejected the request because of a rate limit quota."""
+
+
+class VaultServerError(VaultHTTPError):
+
+    """Vault answered with a 5xx status code."""
@@ -1,6 +1,12 @@
 """
 This module exports a given path in vault to html
 """
+from .secret import (
+    add_filter_arguments,
+    add_index_arguments,
+    add_walk_arguments,
+    get_path_filter,
+)
 
 
 def run(args, vault):
@@ -9,7 +15,18 @@ def run(args, vault):
 
     """
 
-    secrets = vault.secret.recursive_list(args.engine, args.vaultpath)
+    if args.index:
+        # pylint: disable=import-outside-toplevel
+        from .index import indexed_list
+
+        secrets = indexed_list(vault, args)
+    else:
+        secrets = vault.secret.recursive_list(
+            args.engine,
+            args.vaultpath,
+            args.workers,
+            path_filter=get_path_filter(args),
+        )
     path_depth = 0
     ul_count = 0
     for secret in secrets:
@@ -70,3 +87,6 @@ def parse_commandline_arguments(subparsers, config):
         "vaultpath",
         help="path where to find the passwords inside the secret engine vault",
     )
+    add_walk_arguments(parser)
+    add_filter_arguments(parser)
+    add_index_arguments(parser)
@@ -0,0 +1,183 @@
+"""
+This module searches the secrets below a path by their path, the names of
+their fields and the values of their fields.
+"""
+from .index import INDEXED_VALUES, SecretIndex
+from .pool import bounded_map
+from .secret import add_engine_argument, add_index_arguments, add_walk_arguments
+from .walker import compile_pattern
+
+
+def match_fields(data, key_match, value_match):
+    """ Names of the fields of a secret matching the given functions
+
+    :data: data of the secret
+    :key_match: match function for field names or None
+    :value_match: match function for field values or None
+    :returns: generator of field names
+
+    """
+    for key, value in data.items():
+        if key_match is not None and not key_match(key):
+            continue
+        if value_match is not None and (value is None or not value_match(str(value))):
+            continue
+        yield key
+
+
+def find(
+    vault,
+    engine_path,
+    path,
+    path_match=None,
+    key_match=None,
+    value_match=None,
+    workers=8,
+):
+    """ Search the secrets below the given path in vault. The tree is walked
+    concurrently, the secrets are only read if fields are searched.
+
+    :vault: Vault class
+    :engine_path: path of the secret engine
+    :path: path to search
+    :path_match: match function for the secret paths or None
+    :key_match: match function for field names or None
+    :value_match: match function for field values or None
+    :workers: number of concurrent requests
+    :returns: generator of tuples of secret path and field name, the field
+    name is None if no fields are searched
+
+    """
+    # The patterns are matched like in the index, without a leading slash
+    secrets = (
+        secret
+        for secret in (
+            secret.lstrip("/")
+            for secret in vault.secret.recursive_list(engine_path, path, workers, False)
+        )
+        if not secret.endswith("/") and (path_match is None or path_match(secret))
+    )
+    if key_match is None and value_match is None:
+        for secret in secrets:
+            yield secret, None
+        return
+    results = bounded_map(
+        lambda secret: vault.secret.read_current(engine_path, secret)[0],
+        secrets,
+        workers,
+    )
+    for secret, data in results:
+        for key in match_fields(data or {}, key_match, value_match):
+            yield secret, key
+
+
+def find_indexed(
+    vault, index, engine_path, path, path_match=None, key_match=None, value_match=None
+):
+    """ Search the secrets below the given path in the local index. Values
+    are only found in the fields whose values are indexed.
+
+    :vault: Vault class
+    :index: SecretIndex with fields, see SecretIndex.refresh_fields
+    :engine_path: path of the secret engine
+    :path: path to search
+    :path_match: match function for the secret paths or None
+    :key_match: match function for field names or None
+    :value_match: match function for field values or None
+    :returns: generator of tuples of secret path and field name
+
+    """
+    if key_match is None and value_match is None:
+        for secret in index.secrets(vault, engine_path, path):
+            if path_match is None or path_match(secret):
+                yield secret, None
+        return
+    for secret, key, value in index.fields(vault, engine_path, path):
+        if path_match is not None and not path_match(secret):
+            continue
+        if list(match_fields({key: value}, key_match, value_match)):
+            yield secret, key
+
+
+def run(args, vault):
+    """Run this module
+    :returns: None
+
+    """
+    path_match = compile_pattern(args.path, args.regex)
+    key_match = compile_pattern(args.key, args.regex)
+    value_match = compile_pattern(args.value, args.regex)
+    if args.index:
+        index = SecretIndex(args.index)
+        try:
+            if not index.is_fresh(args.engine, args.vaultpath, args.max_staleness):
+                index.refresh(
+                    vault,
+                    args.engine,
+                    args.vaultpath,
+                    args.workers,
+                    args.max_staleness,
+                )
+            # Only reads secrets whose version changed since they were indexed
+            index.refresh_fields(
+                vault,
+                args.engine,
+                args.vaultpath,
+                args.workers,
+                args.indexed_values.split(","),
+            )
+            matches = list(
+                find_indexed(
+                    vault,
+                    index,
+                    args.engine,
+                    args.vaultpath,
+                    path_match,
+                    key_match,
+                    value_match,
+                )
+            )
+        finally:
+            index.close()
+    else:
+        matches = find(
+            vault,
+            args.engine,
+            args.vaultpath,
+            path_match,
+            key_match,
+            value_match,
+            args.workers,
+        )
+    for secret, key in matches:
+        print(secret if key is None else "{}: {}".format(secret, key))
+
+
+def parse_commandline_arguments(subparsers, config):
+    """ Commandline argument parser for this module
+    :returns: None
+
+    """
+    parser = subparsers.add_parser("secret-find")
+    parser.set_defaults(func=run)
+    add_engine_argument(parser, config)
+    parser.add_argument("vaultpath", help="path to search inside the secret engine")
+    parser.add_argument("--path", help="pattern the path of the secret has to match")
+    parser.add_argument("--key", help="pattern a field name has to match")
+    parser.add_argument(
+        "--value",
+        help="pattern a field value has to match, with --index only the "
+        + "fields given by --indexed-values are searched",
+    )
+    parser.add_argument(
+        "--regex",
+        help="the patterns are regular expressions instead of globs",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--indexed-values",
+        default=",".join(sorted(INDEXED_VALUES)),
+        help="comma separated field names whose values are stored in the index",
+    )
+    add_walk_arguments(parser)
+    add_index_arguments(parser)
@@ -1,9 +1,128 @@
 """
-This module takes a given csv keypass export and imports it in vault.
+This module takes a given csv keypass export and imports it in vault. Other
+export formats are read by the adapters in importers.py.
 """
+import collections
 import logging
 import csv
-import re
+import os
+from .exceptions import VaultError, VaultHTTPError
+from .importers import FORMATS, create_adapter
+from .manifest import HashManifest
+from .pool import Progress, keyed_map
+from .secret import content_hash
+
+
+def import_secret(
+    vault, engine_path, path, data, manifest=None, incremental=False, dryrun=False
+):
+    """ Write the secret of a row. In incremental mode it is compared with
+    the current secret first and only written if it is new or changed, the
+    write then uses check-and-set.
+
+    :vault: Vault class
+    :engine_path: path of the secret engine
+    :path: path of the secret
+    :data: data of the row
+    :manifest: optional HashManifest of the last import, secrets with a
+    matching hash are skipped without reading them
+    :incremental: only write new or changed secrets
+    :dryrun: do not write anything
+    :returns: "written" if the secret was not compared, "added", "updated",
+    "unchanged" or "cached" if it was unchanged in the manifest
+
+    """
+    if not incremental:
+        if not dryrun:
+            # Acually run vault
+            vault.secret.add(engine_path, path, data)
+        return "written"
+    digest = content_hash(data)
+    key = engine_path + "/" + path
+    if manifest is not None and manifest.get(key) == digest:
+        return "cached"
+    current, version = vault.secret.read_current(engine_path, path)
+    if current is not None and content_hash(current) == digest:
+        if manifest is not None:
+            manifest.set(key, digest)
+        return "unchanged"
+    result = "added" if current is None else "updated"
+    if not dryrun:
+        try:
+            vault.secret.add(engine_path, path, data, cas=version)
+        except VaultHTTPError as error:
+            if error.status_code != 400:
+                raise
+            raise VaultError("the secret was changed during the import") from error
+        if manifest is not None:
+            manifest.set(key, digest)
+    return result
+
+
+def missing_secrets(vault, engine_path, path, imported, workers=8):
+    """ Secrets below the given path that were not part of the import
+
+    :vault: Vault class
+    :engine_path: path of the secret engine
+    :path: path the export was imported to
+    :imported: set of the imported paths
+    :workers: number of concurrent list requests
+    :returns: generator of secret paths
+
+    """
+    try:
+        for secret in vault.secret.recursive_list(engine_path, path, workers, False):
+            secret = secret.lstrip("/")
+            if not secret.endswith("/") and secret not in imported:
+                yield secret
+    except VaultHTTPError as error:
+        # Nothing was imported to the path yet
+        if error.status_code != 404:
+            raise
+
+
+class RejectFile:
+
+    """Csv file collecting the rows that could not be imported together with
+    the error, it is only created when the first row is rejected. The rows
+    contain the secrets in clear text, so only the owner may read the file."""
+
+    def __init__(self, filename):
+        """
+        :filename: path of the reject file
+        """
+        self.filename = filename
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def add(self, row, error):
+        """ Write a rejected row
+        :returns: None
+
+        """
+        if self._writer is None:
+            file_descriptor = os.open(
+                self.filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600
+            )
+            # The mode only applies to new files
+            os.fchmod(file_descriptor, 0o600)
+            self._file = os.fdopen(file_descriptor, "w", newline="")
+            fieldnames = [field for field in row if field is not None] + ["Error"]
+            self._writer = csv.DictWriter(
+                self._file, fieldnames, extrasaction="ignore", restval=""
+            )
+            self._writer.writeheader()
+        self._writer.writerow({**row, "Error": error})
+        self.count = self.count + 1
+
+    def close(self):
+        """ Close the file if it was created
+        :returns: None
+
+        """
+        if self._file is not None:
+            self._file.close()
 
 
 def run(args, vault):
@@ -11,49 +130,96 @@ def run(args, vault):
     :returns: None
 
     """
-    # Import data from csv
-    csv_input = []
-    with open(args.file, newline="") as csvfile:
-        logging.info("Reading CSV file")
-        csv_reader = csv.DictReader(csvfile, delimiter=",", quotechar='"')
-        for row in csv_reader:
-            logging.debug(row)
-            csv_input.append(row)
-
-    # Check whether all path start with a common path, this will then be
-    # stipped
-    logging.debug("Searching for a common leading path")
-    leading_path = None
-    for row in csv_input:
-        if leading_path is None:
-            leading_path = row["Group"]
-        new_leading_path = ""
-        for key, char in enumerate(leading_path):
-            if not row["Group"][key] == char:
-                break
-            new_leading_path = new_leading_path + char
-        leading_path = new_leading_path
-    if leading_path:
-        logging.info(
-            "The common leading path %s was found and will be ignored", leading_path
-        )
+    try:
+        adapter = create_adapter(args.format, args.file, args.column, args.delimiter)
+    except ValueError as error:
+        logging.error("The file %s cannot be imported: %s", args.file, error)
+        exit(1)
+    manifest = HashManifest(args.hash_cache) if args.hash_cache else None
+    incremental = args.incremental or manifest is not None
 
-    for row in csv_input:
-        # Strip the common leading path
-        group = re.sub(r"^" + leading_path, "", row["Group"])
-        # Remove spaces and double slashes
-        path = normalize(args.vaultpath + "/" + group + "/" + row["Title"])
-        del row["Group"]
-        del row["Title"]
-        # Delete empty rows
-        new_row = dict()
-        for field in row:
-            if row[field]:
-                new_row[field] = row[field]
-        row = new_row
-        if not args.dryrun:
-            # Acually run vault
-            vault.secret.add(args.engine, path, row)
+    # Every path of the input is kept to find the missing secrets
+    imported = set()
+
+    def rows():
+        for position, record in adapter.records():
+            try:
+                relative, data = adapter.prepare(record)
+            except ValueError as error:
+                yield position, record, None, None, str(error)
+                continue
+            # Remove spaces and double slashes
+            path = normalize(args.vaultpath + "/" + relative).lstrip("/")
+            if args.report_missing:
+                imported.add(path)
+            yield position, record, path, data, None
+
+    def import_row(row):
+        _, _, path, data, error = row
+        if error is not None:
+            return "rejected", error
+        try:
+            result = import_secret(
+                vault, args.engine, path, data, manifest, incremental, args.dryrun
+            )
+        except VaultError as error:
+            return "rejected", str(error)
+        return result, None
+
+    counts = collections.Counter()
+    rejects = RejectFile(args.reject_file or args.file + ".rejected.csv")
+    progress = Progress("Imported rows")
+    try:
+        # Rows of the same path are written by one worker in the order of the
+        # file, so the last row wins like in a serial import
+        results = keyed_map(import_row, rows(), lambda row: row[2], args.workers)
+        for (position, record, path, _, _), (result, error) in results:
+            if result == "rejected":
+                logging.error("The %s could not be imported: %s", position, error)
+                rejects.add(adapter.reject_row(record), error)
+            if args.dryrun and result in ("written", "added", "updated"):
+                print("{:8} {}".format(result, path))
+            counts[result] += 1
+            progress.advance()
+    finally:
+        rejects.close()
+    progress.finish()
+    if manifest is not None and not args.dryrun:
+        manifest.save()
+
+    if args.report_missing:
+        for secret in missing_secrets(
+            vault, args.engine, args.vaultpath, imported, args.workers
+        ):
+            print("{:8} {}".format("missing", secret))
+            counts["missing"] += 1
+    if args.dryrun or incremental:
+        reads = counts["added"] + counts["updated"] + counts["unchanged"]
+        writes = counts["written"] + counts["added"] + counts["updated"]
+        print(
+            "%d rows: %d added, %d updated, %d unchanged, %d rejected, %d not "
+            "compared; %d missing in the csv; %d secrets read, %d writes%s"
+            % (
+                progress.count,
+                counts["added"],
+                counts["updated"],
+                counts["unchanged"] + counts["cached"],
+                counts["rejected"],
+                counts["written"],
+                counts["missing"],
+                reads,
+                writes,
+                " would be made" if args.dryrun else "",
+            )
+        )
+    if rejects.count:
+        logging.error(
+            "%d of %d rows were rejected and written to %s",
+            rejects.count,
+            progress.count,
+            rejects.filename,
+        )
+        exit(1)
 
 
 def normalize(path):
@@ -90,7 +256,58 @@ def parse_commandline_arguments(subparsers, config):
         "vaultpath",
         help="path where to put the passwords inside the secret engine vault",
     )
-    parser.add_argument("file", help="CSV file with keypass export")
+    parser.add_argument("file", help="export file, by default a keepass csv export")
+    parser.add_argument(
+        "--format",
+        choices=FORMATS,
+        default="keepass",
+        help="format of the file: keepass csv export, csv with any columns or "
+        + "unencrypted bitwarden json export",
+    )
+    parser.add_argument(
+        "--column",
+        action="append",
+        help="column mapping field=column for --format csv, the fields folder "
+        + "and title form the path (title defaults to the column Title), other "
+        + "fields rename a column, can be given multiple times",
+    )
+    parser.add_argument(
+        "--delimiter", default=",", help="field delimiter for --format csv"
+    )
+    parser.add_argument(
+        "--dryrun",
+        "-d",
+        help="only print the secrets that would be written and the number of "
+        + "requests",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--incremental",
+        help="compare every row with the current secret and only write new or "
+        + "changed secrets",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--hash-cache",
+        help="file with the content hashes of the last incremental import, "
+        + "unchanged rows are skipped without reading the secret, implies "
+        + "--incremental",
+    )
+    parser.add_argument(
+        "--report-missing",
+        help="print the secrets below the path that are not in the csv file",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--reject-file",
+        help="csv file the rows that could not be imported are written to, "
+        + "default the csv file with the suffix .rejected.csv, it contains the "
+        + "secrets of the rows and is only readable by the owner",
+    )
     parser.add_argument(
-        "--dryrun", "-d", help="Only show what would be executed", action="store_true"
+        "-w",
+        "--workers",
+        type=int,
+        default=8,
+        help="number of rows that are written concurrently",
     )
@@ -0,0 +1,422 @@
+"""
+Streaming adapters for the export formats of password managers. An adapter
+yields the records of an export one by one and turns a single record into
+the path and data of a secret, the import pipeline in import_from_csv.py
+writes them to vault.
+"""
+import csv
+import json
+import logging
+import os
+import re
+
+
+def read_rows(filename, delimiter=","):
+    """ Stream the rows of a csv file
+
+    :filename: path of the csv file
+    :delimiter: field delimiter
+    :returns: generator of tuples of the line number and the row as dict
+
+    """
+    with open(filename, newline="") as csvfile:
+        csv_reader = csv.DictReader(csvfile, delimiter=delimiter, quotechar='"')
+        for row in csv_reader:
+            logging.debug(row)
+            yield csv_reader.line_num, row
+
+
+def common_leading_path(rows):
+    """ Common leading characters of the groups of all rows, they are stripped
+    from the paths in vault
+
+    :rows: iterable of rows as dict
+    :returns: leading path as string
+
+    """
+    leading_path = None
+    for row in rows:
+        group = row.get("Group") or ""
+        if leading_path is None:
+            leading_path = group
+        elif not group.startswith(leading_path):
+            leading_path = os.path.commonprefix([leading_path, group])
+    return leading_path or ""
+
+
+class KeePassCSV:
+
+    """Csv export of KeePass with the columns Group and Title. The common
+    leading group of all rows is found in a first pass over the file and
+    stripped from the paths."""
+
+    def __init__(self, filename):
+        """
+        :filename: path of the csv file
+        """
+        self.filename = filename
+        # The first pass only keeps the common leading path, so the memory
+        # does not grow with the size of the export
+        logging.info("Reading CSV file")
+        self.leading_path = common_leading_path(row for _, row in read_rows(filename))
+        if self.leading_path:
+            logging.info(
+                "The common leading path %s was found and will be ignored",
+                self.leading_path,
+            )
+
+    def records(self):
+        """ Stream the rows of the export
+        :returns: generator of tuples of the position and the row
+
+        """
+        for line, row in read_rows(self.filename):
+            yield "line %d" % line, row
+
+    def prepare(self, row):
+        """ Path and data of the secret of a row
+
+        :row: row of the export as dict
+        :returns: tuple of the path below the import path and the data
+        without empty fields
+
+        """
+        if row.get("Group") is None or row.get("Title") is None:
+            raise ValueError("the row has no Group or Title")
+        if None in row:
+            raise ValueError("the row has more fields than the header")
+        # Strip the common leading path
+        group = row["Group"][len(self.leading_path) :]
+        data = {
+            field: value
+            for field, value in row.items()
+            if field not in ("Group", "Title") and value
+        }
+        return group + "/" + row["Title"], data
+
+    def reject_row(self, row):
+        """ Row of the reject file for a record that could not be imported
+        :returns: dict
+
+        """
+        return row
+
+
+def parse_columns(columns):
+    """ Parse the column mapping of the commandline
+
+    :columns: list of strings like field=column
+    :returns: dict of fields to columns
+
+    """
+    mapping = {}
+    for column in columns or []:
+        field, separator, name = column.partition("=")
+        if not separator or not field or not name:
+            raise ValueError("the column mapping %s is not field=column" % column)
+        mapping[field] = name
+    return mapping
+
+
+class ColumnCSV:
+
+    """Csv file with any columns. The mapping names the columns of the folder
+    and the title of the secrets and renames other fields, columns that are
+    not mapped are imported under their own name."""
+
+    def __init__(self, filename, columns=None, delimiter=","):
+        """
+        :filename: path of the csv file
+        :columns: dict of fields to columns, the fields folder and title form
+        the path of a secret, title defaults to the column Title
+        :delimiter: field delimiter
+        """
+        self.filename = filename
+        self.delimiter = delimiter
+        self.columns = dict(columns or {})
+        self.folder = self.columns.pop("folder", None)
+        self.title = self.columns.pop("title", "Title")
+        with open(filename, newline="") as csvfile:
+            header = next(csv.reader(csvfile, delimiter=delimiter), [])
+        mapped = [self.folder, self.title] + list(self.columns.values())
+        missing = [column for column in mapped if column and column not in header]
+        if missing:
+            raise ValueError("the columns %s are not in the csv file" % missing)
+        self.renames = {column: field for field, column in self.columns.items()}
+
+    def records(self):
+        """ Stream the rows of the file
+        :returns: generator of tuples of the position and the row
+
+        """
+        for line, row in read_rows(self.filename, self.delimiter):
+            yield "line %d" % line, row
+
+    def prepare(self, row):
+        """ Path and data of the secret of a row
+
+        :row: row of the file as dict
+        :returns: tuple of the path below the import path and the data
+        without empty fields
+
+        """
+        if None in row:
+            raise ValueError("the row has more fields than the header")
+        if not row.get(self.title):
+            raise ValueError("the row has no %s" % self.title)
+        folder = (row.get(self.folder) or "") if self.folder else ""
+        data = {
+            self.renames.get(column, column): value
+            for column, value in row.items()
+            if column not in (self.folder, self.title) and value
+        }
+        return folder + "/" + row[self.title], data
+
+    def reject_row(self, row):
+        """ Row of the reject file for a record that could not be imported
+        :returns: dict
+
+        """
+        return row
+
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Characters a number can continue with after a chunk boundary
+NUMBER_TAIL = re.compile(r"[0-9eE.+-]*")
+# Literals that can be cut by a chunk boundary
+LITERALS = ["true", "false", "null", "NaN", "Infinity", "-Infinity"]
+
+
+def is_truncated(error):
+    """ Check whether a decode error is caused by the end of the buffer and
+    can go away with more input
+
+    :error: json.JSONDecodeError of raw_decode
+    :returns: bool
+
+    """
+    rest = error.doc[error.pos :]
+    if error.msg.startswith("Unterminated string"):
+        return True
+    if error.msg.startswith("Invalid \\uXXXX escape"):
+        # The escape is only accepted with a character after it
+        return len(rest) <= 5
+    rest = rest.lstrip(" \t\n\r")
+    # A number cut before its fraction or exponent, e.g. [1e
+    if NUMBER_TAIL.fullmatch(rest):
+        return True
+    return any(literal.startswith(rest) for literal in LITERALS)
+
+
+class JSONStream:
+
+    """Reads a json document in chunks. Single values are decoded with
+    json.JSONDecoder.raw_decode as soon as they are complete, the consumed
+    part of the buffer is dropped."""
+
+    def __init__(self, f, chunk_size=1 << 16):
+        """
+        :f: file opened for reading text
+        :chunk_size: number of characters read at once
+        """
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _read(self):
+        """ Append the next chunk to the buffer
+        :returns: False at the end of the file
+
+        """
+        chunk = self.f.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """ Skip whitespace and return the next character without consuming it
+        :returns: character or "" at the end of the file
+
+        """
+        while True:
+            self.pos = WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._read():
+                return ""
+
+    def expect(self, chars):
+        """ Consume the next character, it has to be one of chars
+        :returns: the character
+
+        """
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError("expected one of %r but found %r" % (chars, char))
+        self.pos = self.pos + 1
+        return char
+
+    def decode(self):
+        """ Decode the next complete value
+        :returns: value
+
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as error:
+                # Only incomplete input is read further, other errors are
+                # raised before the rest of the file is read
+                if self.eof or not is_truncated(error) or not self._read():
+                    raise
+                continue
+            # A number at the end of the buffer may continue in the next
+            # chunk, e.g. 1 and e5 or 1e and 5
+            number = isinstance(value, (int, float)) and not isinstance(value, bool)
+            tail = NUMBER_TAIL.match(self.buffer, end).end() if number else end
+            if tail == len(self.buffer) and not self.eof and self._read():
+                continue
+            self.pos = end
+            return value
+
+
+def iter_json_object(f, arrays=(), chunk_size=1 << 16):
+    """ Stream the members of the top level object of a json document, the
+    elements of the given arrays are decoded one by one
+
+    :f: file opened for reading text
+    :arrays: keys of arrays whose elements are yielded separately
+    :chunk_size: number of characters read at once
+    :returns: generator of tuples of the key and the value, for the given
+    arrays of the key and every element
+
+    """
+    stream = JSONStream(f, chunk_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        return
+    while True:
+        key = stream.decode()
+        if not isinstance(key, str):
+            raise ValueError("expected a key but found %r" % key)
+        stream.expect(":")
+        if key in arrays and stream.peek() == "[":
+            stream.expect("[")
+            if stream.peek() == "]":
+                stream.expect("]")
+            else:
+                while True:
+                    yield key, stream.decode()
+                    if stream.expect(",]") == "]":
+                        break
+        else:
+            yield key, stream.decode()
+        if stream.expect(",}") == "}":
+            return
+
+
+class BitwardenJSON:
+
+    """Unencrypted json export of Bitwarden. The items are parsed one by one,
+    a first pass over the file collects the names of the folders and
+    collections so they may come after the items."""
+
+    def __init__(self, filename, chunk_size=1 << 16):
+        """
+        :filename: path of the json file
+        :chunk_size: number of characters read at once
+        """
+        self.filename = filename
+        self.chunk_size = chunk_size
+        logging.info("Reading the folders of the JSON file")
+        self.folders = {}
+        for key, value in self._members():
+            if key == "encrypted" and value:
+                raise ValueError("encrypted exports cannot be imported")
+            if key in ("folders", "collections"):
+                for folder in value:
+                    self.folders[folder["id"]] = folder["name"]
+
+    def _members(self):
+        with open(self.filename, "r", encoding="utf-8") as f:
+            yield from iter_json_object(f, ("items",), self.chunk_size)
+
+    def records(self):
+        """ Stream the items of the export
+        :returns: generator of tuples of the position and the item
+
+        """
+        number = 0
+        for key, item in self._members():
+            if key == "items":
+                number = number + 1
+                yield "item %d" % number, item
+
+    def prepare(self, item):
+        """ Path and data of the secret of an item
+
+        :item: item of the export as dict
+        :returns: tuple of the path below the import path and the data
+        without empty fields
+
+        """
+        if not isinstance(item, dict) or not item.get("name"):
+            raise ValueError("the item has no name")
+        folder = self.folders.get(item.get("folderId"), "")
+        if not folder and item.get("collectionIds"):
+            folder = self.folders.get(item["collectionIds"][0], "")
+        login = item.get("login") or {}
+        data = {
+            "Username": login.get("username"),
+            "Password": login.get("password"),
+            "TOTP": login.get("totp"),
+            "Notes": item.get("notes"),
+        }
+        uris = [uri.get("uri") for uri in login.get("uris") or [] if uri.get("uri")]
+        for number, uri in enumerate(uris, 1):
+            data["URL" if number == 1 else "URL%d" % number] = uri
+        for section in ("card", "identity"):
+            data.update(item.get(section) or {})
+        for field in item.get("fields") or []:
+            if field.get("name"):
+                data[field["name"]] = field.get("value")
+        data = {
+            field: str(value)
+            for field, value in data.items()
+            if value not in (None, "")
+        }
+        return folder + "/" + item["name"], data
+
+    def reject_row(self, item):
+        """ Row of the reject file for a record that could not be imported
+        :returns: dict
+
+        """
+        return {"item": json.dumps(item)}
+
+
+FORMATS = ["keepass", "csv", "bitwarden"]
+
+
+def create_adapter(file_format, filename, columns=None, delimiter=","):
+    """ Create the adapter for the given format
+
+    :file_format: one of FORMATS
+    :filename: path of the export
+    :columns: list of field=column strings for the csv format
+    :delimiter: field delimiter for the csv format
+    :returns: adapter
+
+    """
+    if file_format == "bitwarden":
+        return BitwardenJSON(filename)
+    if file_format == "csv":
+        return ColumnCSV(filename, parse_columns(columns), delimiter)
+    return KeePassCSV(filename)
@@ -0,0 +1,484 @@
+"""
+Local SQLite index of the folder tree and the kv metadata of a secret engine.
+Listings can be answered from the index within a staleness bound instead of
+walking the whole tree over the network.
+
+The kv list endpoint carries no modification time, so a refresh lists all
+folders again. The lists run concurrently and are cheap, the metadata of a
+secret is only read again if it is new or its entry is older than max_age.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from .pool import Progress, bounded_map
+from .secret import add_engine_argument, add_walk_arguments, get_path_filter
+from .walker import TreeWalker, visit
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    engine TEXT NOT NULL,
+    path TEXT NOT NULL,
+    keys TEXT NOT NULL,
+    listed_at REAL NOT NULL,
+    PRIMARY KEY (engine, path)
+);
+CREATE TABLE IF NOT EXISTS secrets (
+    engine TEXT NOT NULL,
+    path TEXT NOT NULL,
+    current_version INTEGER,
+    created_time TEXT,
+    updated_time TEXT,
+    versions TEXT,
+    indexed_at REAL NOT NULL,
+    PRIMARY KEY (engine, path)
+);
+CREATE TABLE IF NOT EXISTS documents (
+    engine TEXT NOT NULL,
+    path TEXT NOT NULL,
+    version INTEGER NOT NULL,
+    indexed_values TEXT,
+    PRIMARY KEY (engine, path)
+);
+CREATE TABLE IF NOT EXISTS fields (
+    engine TEXT NOT NULL,
+    path TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS fields_path ON fields (engine, path);
+CREATE TABLE IF NOT EXISTS roots (
+    engine TEXT NOT NULL,
+    path TEXT NOT NULL,
+    refreshed_at REAL NOT NULL,
+    PRIMARY KEY (engine, path)
+);
+"""
+
+# Only values of these fields are stored in the index, all others are indexed
+# by their name only
+INDEXED_VALUES = frozenset(["username", "user", "login", "email", "url"])
+
+
+def folder_key(vault, path):
+    """ Canonical form of a folder path in the index, e.g. team/sub/
+
+    :vault: Vault class used for normalization
+    :path: path of the folder
+    :returns: folder path with a trailing slash or "" for the engine root
+
+    """
+    path = vault.normalize(path).strip("/")
+    return path + "/" if path else ""
+
+
+class _RecordingLister:
+
+    """Wraps Secret.list and records every listing, used by the TreeWalker
+    during a refresh."""
+
+    def __init__(self, secret):
+        self.secret = secret
+        self.listings = {}
+        self._lock = threading.Lock()
+
+    def join(self, path, key):
+        """ See Secret.join """
+        return self.secret.join(path, key)
+
+    def list(self, engine_path, path):
+        """ See Secret.list """
+        keys = self.secret.list(engine_path, path)
+        with self._lock:
+            self.listings[folder_key(self.secret.vault, path)] = keys
+        return keys
+
+
+class SecretIndex:
+
+    """Class for the local index of secret engines."""
+
+    def __init__(self, filename):
+        """
+        :filename: path of the sqlite database, it is created if needed
+        """
+        self.filename = filename
+        # The index holds the paths and user names, only the owner may read it
+        file_descriptor = os.open(filename, os.O_CREAT | os.O_WRONLY, 0o600)
+        os.fchmod(file_descriptor, 0o600)
+        os.close(file_descriptor)
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(SCHEMA)
+        # Indexes written before the indexed values were recorded, their
+        # documents are read again
+        columns = [
+            row[1] for row in self.connection.execute("PRAGMA table_info(documents)")
+        ]
+        if "indexed_values" not in columns:
+            self.connection.execute(
+                "ALTER TABLE documents ADD COLUMN indexed_values TEXT"
+            )
+
+    def close(self):
+        """ Close the database
+        :returns: None
+
+        """
+        self.connection.close()
+
+    def refreshed_at(self, engine_path, path):
+        """ Time of the last refresh covering the given path
+
+        :engine_path: path of the secret engine
+        :path: path inside the engine
+        :returns: unix timestamp or None if the path is not indexed
+
+        """
+        folder = path.strip("/")
+        rows = self.connection.execute(
+            "SELECT path, refreshed_at FROM roots WHERE engine = ?", (engine_path,)
+        )
+        times = [
+            refreshed_at
+            for root, refreshed_at in rows
+            if folder == root.rstrip("/") or folder.startswith(root)
+        ]
+        return max(times) if times else None
+
+    def is_fresh(self, engine_path, path, max_staleness):
+        """ Check whether the index can answer for the given path. A refresh
+        lists all folders but keeps the metadata of secrets younger than its
+        max_age, so the oldest metadata below the path is checked as well.
+
+        :engine_path: path of the secret engine
+        :path: path inside the engine
+        :max_staleness: maximal age of the index in seconds
+        :returns: True if the index covers the path and is recent enough
+
+        """
+        refreshed_at = self.refreshed_at(engine_path, path)
+        if refreshed_at is None or time.time() - refreshed_at > max_staleness:
+            return False
+        prefix = path.strip("/")
+        (indexed_at,) = self.connection.execute(
+            "SELECT MIN(indexed_at) FROM secrets "
+            "WHERE engine = ? AND path LIKE ? ESCAPE '\\'",
+            (engine_path, like_prefix(prefix + "/" if prefix else "")),
+        ).fetchone()
+        return indexed_at is None or time.time() - indexed_at <= max_staleness
+
+    def refresh(self, vault, engine_path, path, workers=8, max_age=86400):
+        """ Bring the index of the given path up to date
+
+        :vault: Vault class
+        :engine_path: path of the secret engine
+        :path: path inside the engine
+        :workers: number of concurrent requests
+        :max_age: seconds after which the metadata of a secret is read again
+        :returns: number of metadata requests
+
+        """
+        started_at = time.time()
+        root = folder_key(vault, path)
+        lister = _RecordingLister(vault.secret)
+        secrets = set()
+        walker = TreeWalker(lister, max(workers, 2), ordered=False)
+        for secret in walker.walk(engine_path, path):
+            if not secret.endswith("/"):
+                secrets.add(secret.lstrip("/"))
+
+        cursor = self.connection.cursor()
+        # Drop everything below the root that does not exist anymore
+        known = {
+            row[0]: row[1]
+            for row in cursor.execute(
+                "SELECT path, indexed_at FROM secrets "
+                "WHERE engine = ? AND path LIKE ? ESCAPE '\\'",
+                (engine_path, like_prefix(root)),
+            )
+        }
+        removed = [(engine_path, secret) for secret in known if secret not in secrets]
+        for table in ["secrets", "documents", "fields"]:
+            cursor.executemany(
+                "DELETE FROM %s WHERE engine = ? AND path = ?" % table, removed
+            )
+        cursor.execute(
+            "DELETE FROM folders WHERE engine = ? AND path LIKE ? ESCAPE '\\'",
+            (engine_path, like_prefix(root)),
+        )
+        cursor.executemany(
+            "INSERT OR REPLACE INTO folders VALUES (?, ?, ?, ?)",
+            [
+                (engine_path, folder, json.dumps(keys), started_at)
+                for folder, keys in lister.listings.items()
+            ],
+        )
+
+        stale = [
+            secret
+            for secret in secrets
+            if secret not in known or started_at - known[secret] > max_age
+        ]
+        progress = Progress("Indexed metadata")
+        results = bounded_map(
+            lambda secret: vault.secret.read_metadata(engine_path, secret),
+            stale,
+            workers,
+        )
+        for secret, metadata in results:
+            cursor.execute(
+                "INSERT OR REPLACE INTO secrets VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    engine_path,
+                    secret,
+                    metadata.get("current_version"),
+                    metadata.get("created_time"),
+                    metadata.get("updated_time"),
+                    json.dumps(metadata.get("versions", {})),
+                    time.time(),
+                ),
+            )
+            progress.advance()
+        progress.finish()
+        cursor.execute(
+            "INSERT OR REPLACE INTO roots VALUES (?, ?, ?)",
+            (engine_path, root, started_at),
+        )
+        self.connection.commit()
+        logging.info(
+            "Indexed %d folders and %d secrets, %d removed",
+            len(lister.listings),
+            len(secrets),
+            len(removed),
+        )
+        return len(stale)
+
+    def refresh_fields(
+        self, vault, engine_path, path, workers=8, values=INDEXED_VALUES
+    ):
+        """ Index the field names of all secrets below the given path whose
+        current version or indexed values changed since they were indexed,
+        call refresh first
+
+        :vault: Vault class
+        :engine_path: path of the secret engine
+        :path: path inside the engine
+        :workers: number of concurrent requests
+        :values: names of the fields whose values are stored, compared
+        case insensitive
+        :returns: number of read secrets
+
+        """
+        values = {value.lower() for value in values}
+        # Secrets indexed with other values are read again
+        values_key = ",".join(sorted(values))
+        outdated = [
+            row[0]
+            for row in self.connection.execute(
+                "SELECT secrets.path FROM secrets LEFT JOIN documents "
+                "ON secrets.engine = documents.engine "
+                "AND secrets.path = documents.path "
+                "WHERE secrets.engine = ? AND secrets.path LIKE ? ESCAPE '\\' "
+                "AND (documents.version IS NULL "
+                "OR documents.version != secrets.current_version "
+                "OR documents.indexed_values IS NOT ?)",
+                (engine_path, like_prefix(folder_key(vault, path)), values_key),
+            )
+        ]
+        cursor = self.connection.cursor()
+        progress = Progress("Indexed fields")
+        results = bounded_map(
+            lambda secret: vault.secret.read_current(engine_path, secret),
+            outdated,
+            workers,
+        )
+        for secret, (data, version) in results:
+            cursor.execute(
+                "DELETE FROM fields WHERE engine = ? AND path = ?",
+                (engine_path, secret),
+            )
+            cursor.executemany(
+                "INSERT INTO fields VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        engine_path,
+                        secret,
+                        key,
+                        str(value) if key.lower() in values else None,
+                    )
+                    for key, value in (data or {}).items()
+                ],
+            )
+            cursor.execute(
+                "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)",
+                (engine_path, secret, version, values_key),
+            )
+            progress.advance()
+        progress.finish()
+        self.connection.commit()
+        return len(outdated)
+
+    def secrets(self, vault, engine_path, path):
+        """ All indexed secrets below the given path
+
+        :vault: Vault class used for normalization
+        :engine_path: path of the secret engine
+        :path: path inside the engine
+        :returns: generator of secret paths
+
+        """
+        rows = self.connection.execute(
+            "SELECT path FROM secrets WHERE engine = ? AND path LIKE ? ESCAPE '\\'",
+            (engine_path, like_prefix(folder_key(vault, path))),
+        )
+        for row in rows:
+            yield row[0]
+
+    def fields(self, vault, engine_path, path):
+        """ All indexed fields of the secrets below the given path
+
+        :vault: Vault class used for normalization
+        :engine_path: path of the secret engine
+        :path: path inside the engine
+        :returns: generator of tuples of secret path, field name and value,
+        the value is None if it is not stored in the index
+
+        """
+        rows = self.connection.execute(
+            "SELECT path, key, value FROM fields "
+            "WHERE engine = ? AND path LIKE ? ESCAPE '\\'",
+            (engine_path, like_prefix(folder_key(vault, path))),
+        )
+        yield from rows
+
+    def list(self, engine_path, path):
+        """ List the keys of a folder from the index
+
+        :engine_path: path of the secret engine
+        :path: canonical path of the folder, see folder_key
+        :returns: list of keys as returned by Secret.list
+
+        """
+        row = self.connection.execute(
+            "SELECT keys FROM folders WHERE engine = ? AND path = ?",
+            (engine_path, path),
+        ).fetchone()
+        return json.loads(row[0]) if row else []
+
+    def recursive_list(self, vault, engine_path, path, path_filter=None):
+        """ List secrets on a given path recursively from the index, in the
+        same order and format as Secret.recursive_list
+
+        :vault: Vault class used for normalization
+        :engine_path: path of the secret engine
+        :path: path to list
+        :path_filter: optional PathFilter
+        :returns: generator for the secret list
+
+        """
+        stack = [(path, iter(self.list(engine_path, folder_key(vault, path))))]
+        while stack:
+            folder, keys = stack[-1]
+            for key in keys:
+                secret = vault.secret.join(folder, key)
+                yielded, listed = visit(secret, path_filter)
+                if yielded:
+                    yield secret
+                if listed:
+                    child_keys = self.list(engine_path, folder_key(vault, secret))
+                    stack.append((secret, iter(child_keys)))
+                    break
+            else:
+                stack.pop()
+
+    def metadata(self, engine_path, path):
+        """ Metadata of a secret from the index
+
+        :engine_path: path of the secret engine
+        :path: path of the secret
+        :returns: dict with current_version, created_time, updated_time and
+        versions or None if the secret is not indexed
+
+        """
+        row = self.connection.execute(
+            "SELECT current_version, created_time, updated_time, versions "
+            "FROM secrets WHERE engine = ? AND path = ?",
+            (engine_path, path.lstrip("/")),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "current_version": row[0],
+            "created_time": row[1],
+            "updated_time": row[2],
+            "versions": json.loads(row[3]),
+        }
+
+
+def like_prefix(prefix):
+    """ SQL LIKE pattern matching everything starting with the given prefix
+
+    :prefix: literal prefix
+    :returns: pattern escaped with backslash
+
+    """
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return escaped + "%"
+
+
+def indexed_list(vault, args):
+    """ List secrets recursively from the index given in the commandline
+    arguments, the index is refreshed first if it is older than allowed
+
+    :vault: Vault class
+    :args: commandline arguments with engine, vaultpath, index, max_staleness
+    and workers
+    :returns: generator for the secret list
+
+    """
+    index = SecretIndex(args.index)
+    try:
+        if not index.is_fresh(args.engine, args.vaultpath, args.max_staleness):
+            index.refresh(
+                vault, args.engine, args.vaultpath, args.workers, args.max_staleness
+            )
+        yield from index.recursive_list(
+            vault, args.engine, args.vaultpath, get_path_filter(args)
+        )
+    finally:
+        index.close()
+
+
+def run(args, vault):
+    """Run this module
+    :returns: None
+
+    """
+    index = SecretIndex(args.index)
+    try:
+        index.refresh(vault, args.engine, args.vaultpath, args.workers, args.max_age)
+    finally:
+        index.close()
+
+
+def parse_commandline_arguments(subparsers, config):
+    """ Commandline argument parser for this module
+    :returns: None
+
+    """
+    parser = subparsers.add_parser("secret-index")
+    parser.set_defaults(func=run)
+    add_engine_argument(parser, config)
+    parser.add_argument(
+        "vaultpath", help="path of the secrets inside the secret engine vault"
+    )
+    parser.add_argument("--index", required=True, help="sqlite file of the index")
+    parser.add_argument(
+        "--max-age",
+        type=float,
+        default=86400,
+        help="seconds after which the metadata of a secret is read again",
+    )
+    add_walk_arguments(parser)
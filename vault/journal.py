@@ -0,0 +1,92 @@
+"""
+Journal of a move operation. Every written version and every finished secret
+is appended to a local file, so an interrupted move can be resumed without
+writing versions twice.
+"""
+import json
+import os
+import threading
+
+
+class MoveJournal:
+
+    """Append only journal of the progress of Secret.mv and recursive_mv."""
+
+    def __init__(self, filename):
+        """
+        :filename: path of the journal file, existing entries are loaded
+        """
+        self.filename = filename
+        self._versions = {}
+        self._done = set()
+        self._lock = threading.Lock()
+        line = "\n"
+        if os.path.exists(filename):
+            with open(filename, "r") as f:
+                for line in f:
+                    self._load(line)
+        self._file = open(filename, "a")
+        # Start a new line after a line cut by the interruption
+        if not line.endswith("\n"):
+            self._file.write("\n")
+
+    def _load(self, line):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            # A line cut by the interruption, the write was not journaled
+            return
+        key = (entry["from"], entry["to"])
+        if entry.get("done"):
+            self._done.add(key)
+        else:
+            self._versions.setdefault(key, set()).add(str(entry["version"]))
+
+    def written_versions(self, from_path, to_path):
+        """ Versions of the secret that were already written to the target
+
+        :from_path: path of the secret
+        :to_path: path the secret is moved to
+        :returns: set of version numbers as strings
+
+        """
+        with self._lock:
+            return set(self._versions.get((from_path, to_path), ()))
+
+    def is_done(self, from_path, to_path):
+        """ Check whether the move of the secret is complete
+        :returns: True if the secret was moved and deleted
+
+        """
+        with self._lock:
+            return (from_path, to_path) in self._done
+
+    def version_written(self, from_path, to_path, version):
+        """ Record a version written to the target
+        :returns: None
+
+        """
+        self._append({"from": from_path, "to": to_path, "version": str(version)})
+        with self._lock:
+            self._versions.setdefault((from_path, to_path), set()).add(str(version))
+
+    def done(self, from_path, to_path):
+        """ Record a completely moved secret
+        :returns: None
+
+        """
+        self._append({"from": from_path, "to": to_path, "done": True})
+        with self._lock:
+            self._done.add((from_path, to_path))
+
+    def _append(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+
+    def close(self):
+        """ Close the journal file
+        :returns: None
+
+        """
+        self._file.close()
@@ -0,0 +1,119 @@
+"""
+Client side limits for the number of requests in flight to vault.
+"""
+import collections
+import logging
+import threading
+
+
+class ConcurrencyLimiter:
+
+    """Limits the requests in flight to a fixed number."""
+
+    def __init__(self, limit):
+        """
+        :limit: maximal number of requests in flight
+        """
+        self.limit = limit
+        self.maximum = limit
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        """ Wait until another request may be sent
+        :returns: None
+
+        """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight = self.in_flight + 1
+
+    def release(self, latency, throttled=False):
+        """ Mark a request as finished
+
+        :latency: duration of the request in seconds
+        :throttled: True if vault rejected the request because of a rate limit
+        :returns: None
+
+        """
+        with self._condition:
+            self.in_flight = self.in_flight - 1
+            self._update(latency, throttled)
+            self._condition.notify_all()
+
+    def _update(self, latency, throttled):
+        """ Adapt the limit to the finished request, called with the lock held
+        :returns: None
+
+        """
+
+
+class AdaptiveLimiter(ConcurrencyLimiter):
+
+    """Limits the requests in flight with additive increase and multiplicative
+    decrease (AIMD). The limit grows by one for every window of requests with
+    a flat latency and is cut on a rate limit response or when the p95 latency
+    rises above the best one seen."""
+
+    def __init__(
+        self, initial=4, minimum=1, maximum=64, window=20, decrease=0.5, tolerance=2.0
+    ):
+        """
+        :initial: limit to start with
+        :minimum: lower bound of the limit
+        :maximum: upper bound of the limit
+        :window: number of requests after which the latency is evaluated
+        :decrease: factor the limit is multiplied with on congestion
+        :tolerance: factor the p95 latency may rise above the baseline
+        """
+        # A small maximum, e.g. a pool size below the default, caps the start
+        super().__init__(max(minimum, min(initial, maximum)))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.baseline = None
+        self._latencies = collections.deque(maxlen=window)
+        self._ignore = 0
+
+    def _update(self, latency, throttled):
+        if self._ignore > 0:
+            # Requests sent before the last decrease carry no new information
+            self._ignore = self._ignore - 1
+            return
+        if throttled:
+            self._cut("rate limit")
+            return
+        self._latencies.append(latency)
+        if len(self._latencies) < self._latencies.maxlen:
+            return
+        p95 = percentile(self._latencies, 0.95)
+        self._latencies.clear()
+        if self.baseline is not None and p95 > self.baseline * self.tolerance:
+            self._cut("rising latency")
+            # Accept the new latency level, otherwise the limit only falls
+            self.baseline = p95
+            return
+        if self.baseline is None or p95 < self.baseline:
+            self.baseline = p95
+        self.limit = min(self.maximum, self.limit + 1)
+
+    def _cut(self, cause):
+        self.limit = max(self.minimum, self.limit * self.decrease)
+        self._latencies.clear()
+        self._ignore = self.in_flight
+        logging.debug("Lowering concurrency to %d because of %s", self.limit, cause)
+
+
+def percentile(values, fraction):
+    """ Nearest rank percentile of the given values
+
+    :values: collection of numbers
+    :fraction: percentile between 0 and 1
+    :returns: percentile
+
+    """
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(fraction * len(ordered)))
+    return ordered[index]
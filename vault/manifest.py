@@ -0,0 +1,59 @@
+"""
+Local manifest of the content hashes of secrets. It remembers what was last
+written to or read from vault, so unchanged secrets can be skipped without
+a request.
+"""
+import json
+import os
+import threading
+
+
+class HashManifest:
+
+    """Thread safe mapping of secret paths to content hashes stored as json."""
+
+    def __init__(self, filename):
+        """
+        :filename: path of the manifest file, it is loaded if it exists
+        """
+        self.filename = filename
+        self.hashes = {}
+        self._lock = threading.Lock()
+        if os.path.exists(filename):
+            with open(filename, "r") as f:
+                self.hashes = json.load(f)
+
+    def get(self, path):
+        """ Hash recorded for the given path
+        :returns: hex digest or None
+
+        """
+        with self._lock:
+            return self.hashes.get(path)
+
+    def set(self, path, digest):
+        """ Record the hash of the given path
+        :returns: None
+
+        """
+        with self._lock:
+            self.hashes[path] = digest
+
+    def discard(self, path):
+        """ Forget the given path
+        :returns: None
+
+        """
+        with self._lock:
+            self.hashes.pop(path, None)
+
+    def save(self):
+        """ Write the manifest, the old file is replaced atomically
+        :returns: None
+
+        """
+        tmp_file = self.filename + ".tmp"
+        with self._lock:
+            with open(tmp_file, "w") as f:
+                json.dump(self.hashes, f, sort_keys=True)
+        os.replace(tmp_file, self.filename)
@@ -0,0 +1,248 @@
+"""
+Request metrics per method and endpoint of the vault api.
+"""
+import bisect
+import json
+import threading
+from urllib.parse import urlsplit
+
+# Endpoints with a fixed path, anything after them is replaced by a wildcard
+FIXED_ENDPOINTS = [
+    "sys/policies/acl",
+    "sys/wrapping/wrap",
+    "sys/wrapping/unwrap",
+    "sys/auth",
+    "identity/entity/name",
+    "identity/entity-alias",
+    "identity/entity",
+    "identity/group/name",
+    "auth/userpass/users",
+]
+
+# Upper bounds of the latency buckets in seconds, from 1ms to about 2 minutes
+LATENCY_BUCKETS = [0.001 * 1.25 ** exponent for exponent in range(53)]
+
+
+def endpoint_template(url):
+    """ Reduce the given url to the template of its endpoint, e.g.
+    https://vault/v1/passwords/metadata/team/secret becomes
+    {engine}/metadata/*
+
+    :url: url of the request
+    :returns: endpoint template as string
+
+    """
+    path = urlsplit(url).path
+    if path.startswith("/v1/"):
+        path = path[len("/v1/") :]
+    path = path.strip("/")
+    for endpoint in FIXED_ENDPOINTS:
+        if path == endpoint:
+            return endpoint
+        if path.startswith(endpoint + "/"):
+            return endpoint + "/*"
+    parts = path.split("/")
+    if len(parts) == 1:
+        return "{engine}"
+    template = "{engine}/" + parts[1]
+    if len(parts) > 2:
+        template = template + "/*"
+    return template
+
+
+def request_size(response, kwargs):
+    """ Size of the body of a request as sent, bodies given with data= or
+    json= are both counted
+
+    :response: response of the request, None on connection errors
+    :kwargs: keyword arguments of the request
+    :returns: number of bytes
+
+    """
+    if response is not None and response.request is not None:
+        body = response.request.body or b""
+    elif kwargs.get("json") is not None:
+        body = json.dumps(kwargs["json"])
+    else:
+        body = kwargs.get("data") or b""
+    if isinstance(body, str):
+        body = body.encode()
+    return len(body) if isinstance(body, bytes) else 0
+
+
+class LatencyHistogram:
+
+    """Histogram of latencies with fixed exponential buckets."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0
+        self.sum = 0.0
+
+    def add(self, latency):
+        """ Add a single latency in seconds
+        :returns: None
+
+        """
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+        self.total = self.total + 1
+        self.sum = self.sum + latency
+
+    def percentile(self, fraction):
+        """ Estimate the given percentile by the upper bound of its bucket
+
+        :fraction: percentile between 0 and 1
+        :returns: latency in seconds
+
+        """
+        if not self.total:
+            return 0.0
+        rank = fraction * self.total
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen = seen + count
+            if seen >= rank and count:
+                return LATENCY_BUCKETS[min(index, len(LATENCY_BUCKETS) - 1)]
+        return LATENCY_BUCKETS[-1]
+
+
+class EndpointStats:
+
+    """Counters of a single method and endpoint."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = LatencyHistogram()
+
+    def to_dict(self):
+        """ Summary of the counters
+        :returns: dict
+
+        """
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+            "latency_sum": round(self.latency.sum, 6),
+            "p50": round(self.latency.percentile(0.50), 6),
+            "p95": round(self.latency.percentile(0.95), 6),
+            "p99": round(self.latency.percentile(0.99), 6),
+        }
+
+
+class Metrics:
+
+    """Thread safe collection of the request metrics of a Vault instance."""
+
+    def __init__(self):
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, method, url, status_code, bytes_sent, bytes_received, latency):
+        """ Record a single request
+
+        :method: http method
+        :url: url of the request
+        :status_code: status code of the response, None on connection errors
+        :bytes_sent: size of the request body
+        :bytes_received: size of the response body
+        :latency: duration of the request in seconds
+        :returns: None
+
+        """
+        key = (method.upper(), endpoint_template(url))
+        with self._lock:
+            stats = self.endpoints.setdefault(key, EndpointStats())
+            stats.count = stats.count + 1
+            if status_code is None or status_code > 399:
+                stats.errors = stats.errors + 1
+            stats.bytes_sent = stats.bytes_sent + bytes_sent
+            stats.bytes_received = stats.bytes_received + bytes_received
+            stats.latency.add(latency)
+
+    def to_dict(self):
+        """ Summary of all endpoints, sorted by the time spent on them
+        :returns: list of dicts
+
+        """
+        with self._lock:
+            items = sorted(
+                self.endpoints.items(), key=lambda item: -item[1].latency.sum
+            )
+            return [
+                {"method": method, "endpoint": endpoint, **stats.to_dict()}
+                for (method, endpoint), stats in items
+            ]
+
+    def to_json(self):
+        """ Summary of all endpoints as json
+        :returns: json string
+
+        """
+        return json.dumps({"endpoints": self.to_dict()}, indent=2)
+
+    def summary(self):
+        """ Summary of all endpoints as human readable table
+        :returns: table as string
+
+        """
+        lines = [
+            "{:7} {:32} {:>7} {:>6} {:>10} {:>8} {:>8} {:>8}".format(
+                "METHOD", "ENDPOINT", "COUNT", "ERR", "BYTES", "P50", "P95", "P99"
+            )
+        ]
+        for row in self.to_dict():
+            lines.append(
+                "{method:7} {endpoint:32} {count:>7} {errors:>6} "
+                "{bytes_received:>10} {p50:>8.3f} {p95:>8.3f} {p99:>8.3f}".format(**row)
+            )
+        return "\n".join(lines)
+
+    def to_prometheus(self):
+        """ All metrics in the prometheus text format, e.g. for the textfile
+        collector of the node exporter
+
+        :returns: metrics as string
+
+        """
+        lines = [
+            "# TYPE vault_toolbox_requests_total counter",
+            "# TYPE vault_toolbox_request_errors_total counter",
+            "# TYPE vault_toolbox_response_bytes_total counter",
+            "# TYPE vault_toolbox_request_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (method, endpoint), stats in sorted(self.endpoints.items()):
+                labels = f'method="{method}",endpoint="{endpoint}"'
+                lines.append(f"vault_toolbox_requests_total{{{labels}}} {stats.count}")
+                lines.append(
+                    f"vault_toolbox_request_errors_total{{{labels}}} {stats.errors}"
+                )
+                lines.append(
+                    f"vault_toolbox_response_bytes_total{{{labels}}} "
+                    f"{stats.bytes_received}"
+                )
+                cumulative = 0
+                for bound, count in zip(LATENCY_BUCKETS, stats.latency.counts):
+                    cumulative = cumulative + count
+                    lines.append(
+                        "vault_toolbox_request_duration_seconds_bucket"
+                        f'{{{labels},le="{bound:.6g}"}} {cumulative}'
+                    )
+                lines.append(
+                    "vault_toolbox_request_duration_seconds_bucket"
+                    f'{{{labels},le="+Inf"}} {stats.latency.total}'
+                )
+                lines.append(
+                    f"vault_toolbox_request_duration_seconds_sum{{{labels}}} "
+                    f"{stats.latency.sum:.6f}"
+                )
+                lines.append(
+                    f"vault_toolbox_request_duration_seconds_count{{{labels}}} "
+                    f"{stats.latency.total}"
+                )
+        return "\n".join(lines) + "\n"
@@ -137,7 +137,8 @@ def policy_import(args, vault):
     :returns: None
 
     """
-    for policy_file in os.listdir(args.dir):
+    policy_files = set(os.listdir(args.dir))
+    for policy_file in policy_files:
         if not policy_file.endswith(".hcl"):
             continue
         filepath = os.path.join(args.dir, policy_file)
@@ -152,7 +153,7 @@ def policy_import(args, vault):
 
     delete_policies = []
     for policy in vault.policy.list():
-        if policy + ".hcl" not in os.listdir(args.dir):
+        if policy + ".hcl" not in policy_files:
             delete_policies.append(policy)
 
     if delete_policies:
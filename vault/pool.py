@@ -0,0 +1,183 @@
+"""
+Bounded worker pool for bulk operations on many secrets.
+"""
+import collections
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def bounded_map(func, items, workers=8, ordered=False):
+    """ Apply func to all items on a pool of threads. The items are consumed
+    lazily, at most twice the number of workers are in flight at any time, so
+    the memory stays constant for streams of any length.
+
+    :func: function taking a single item
+    :items: iterable of items
+    :workers: number of threads
+    :ordered: yield the results in the order of the items, otherwise they
+    are yielded as soon as they are done
+    :returns: generator of tuples of item and result
+
+    """
+    if workers <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = collections.OrderedDict()
+    try:
+        for item in items:
+            pending[executor.submit(func, item)] = item
+            if len(pending) >= 2 * workers:
+                yield from _collect(pending, ordered)
+        while pending:
+            yield from _collect(pending, ordered)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _collect(pending, ordered):
+    """ Wait for the next finished futures and remove them from pending
+    :returns: generator of tuples of item and result
+
+    """
+    if ordered:
+        future, item = next(iter(pending.items()))
+        del pending[future]
+        yield item, future.result()
+        return
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        yield pending.pop(future), future.result()
+
+
+# Marks the end of the items of a worker of keyed_map
+_DONE = object()
+
+
+def keyed_map(func, items, key, workers=8):
+    """ Apply func to all items on a pool of threads like bounded_map, but
+    items with the same key are handled one after another in the order of the
+    items. Every key belongs to one thread, each thread has a short queue, so
+    the memory stays constant for streams of any length.
+
+    :func: function taking a single item
+    :items: iterable of items
+    :key: function returning the key of an item
+    :workers: number of threads
+    :returns: generator of tuples of item and result, yielded as soon as they
+    are done
+
+    """
+    if workers <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+    results = queue.Queue()
+    inboxes = [queue.Queue(maxsize=2) for _ in range(workers)]
+    failed = threading.Event()
+
+    def work(inbox):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                results.put(_DONE)
+                return
+            # After an error the remaining items are only drained
+            if failed.is_set():
+                continue
+            try:
+                results.put((item, func(item), None))
+            except Exception as error:  # pylint: disable=broad-except
+                failed.set()
+                results.put((item, None, error))
+
+    def result(entry):
+        item, value, error = entry
+        if error is not None:
+            raise error
+        return item, value
+
+    threads = [threading.Thread(target=work, args=(inbox,)) for inbox in inboxes]
+    for thread in threads:
+        thread.start()
+    running = workers
+    try:
+        for item in items:
+            inboxes[hash(key(item)) % workers].put(item)
+            while not results.empty():
+                entry = results.get_nowait()
+                if entry is not _DONE:
+                    yield result(entry)
+        for inbox in inboxes:
+            inbox.put(_DONE)
+        while running:
+            entry = results.get()
+            if entry is _DONE:
+                running = running - 1
+            else:
+                yield result(entry)
+    finally:
+        if running:
+            # Stopped early, let the threads drain their queues and exit
+            failed.set()
+            for inbox in inboxes:
+                inbox.put(_DONE)
+        for thread in threads:
+            thread.join()
+
+
+class Progress:
+
+    """Thread safe progress and throughput report of a bulk operation."""
+
+    def __init__(self, label, interval=5):
+        """
+        :label: name of the operation in the log
+        :interval: minimal seconds between two log messages
+        """
+        self.label = label
+        self.interval = interval
+        self.count = 0
+        self.start = time.monotonic()
+        self._last_report = self.start
+        self._lock = threading.Lock()
+
+    def advance(self, count=1):
+        """ Count finished items and log the progress from time to time
+        :returns: None
+
+        """
+        with self._lock:
+            self.count = self.count + count
+            now = time.monotonic()
+            if now - self._last_report < self.interval:
+                return
+            self._last_report = now
+        logging.info(
+            "%s: %d done, %.1f/s", self.label, self.count, self.throughput()
+        )
+
+    def throughput(self):
+        """ Finished items per second since the start
+        :returns: float
+
+        """
+        seconds = time.monotonic() - self.start
+        return self.count / seconds if seconds > 0 else 0.0
+
+    def finish(self):
+        """ Log the final count and throughput
+        :returns: None
+
+        """
+        logging.info(
+            "%s: %d done in %.1fs, %.1f/s",
+            self.label,
+            self.count,
+            time.monotonic() - self.start,
+            self.throughput(),
+        )
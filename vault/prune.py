@@ -0,0 +1,207 @@
+"""
+This module prunes old versions of the secrets below a path. Versions are
+destroyed by count or by age, optionally max_versions is set in the metadata
+of every secret so vault drops old versions on its own.
+"""
+import argparse
+import collections
+import datetime
+import logging
+from .pool import Progress, bounded_map
+from .secret import add_engine_argument, add_walk_arguments, parse_time
+
+
+def versions_to_destroy(metadata, keep=None, older_than=None, now=None):
+    """ Versions of a secret to destroy. The current version is never
+    destroyed, a version is destroyed if it is not one of the newest keep
+    versions and was created before older_than, both criteria are optional.
+
+    :metadata: metadata of the secret
+    :keep: number of newest versions to keep
+    :older_than: timedelta, only older versions are destroyed
+    :now: reference time for older_than, default the current time
+    :returns: list of version numbers as strings
+
+    """
+    if keep is not None and keep < 1:
+        raise ValueError("keep has to be at least 1, not %d" % keep)
+    if now is None:
+        now = datetime.datetime.now(datetime.timezone.utc)
+    current = str(metadata["current_version"])
+    versions = sorted(metadata["versions"], key=int, reverse=True)
+    candidates = versions[keep:] if keep is not None else versions
+    destroy = []
+    for version in candidates:
+        details = metadata["versions"][version]
+        if version == current or details.get("destroyed"):
+            continue
+        if older_than is not None:
+            created = parse_time(details.get("created_time"))
+            if created is None or now - created < older_than:
+                continue
+        destroy.append(version)
+    return sorted(destroy, key=int)
+
+
+def positive_int(value):
+    """ Argparse type for a number of at least 1
+
+    :value: argument as string
+    :returns: int
+
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError("%s is not at least 1" % value)
+    return number
+
+
+def prune_secret(
+    vault,
+    engine_path,
+    path,
+    keep=None,
+    older_than=None,
+    max_versions=None,
+    dryrun=False,
+):
+    """ Prune the versions of a single secret
+
+    :vault: Vault class
+    :engine_path: path of the secret engine
+    :path: path of the secret
+    :keep: number of newest versions to keep
+    :older_than: timedelta, only older versions are destroyed
+    :max_versions: value for max_versions in the metadata or None
+    :dryrun: only count the changes
+    :returns: tuple of the number of destroyed versions and whether the
+    metadata was updated
+
+    """
+    metadata = vault.secret.read_metadata(engine_path, path)
+    destroy = []
+    if keep is not None or older_than is not None:
+        destroy = versions_to_destroy(metadata, keep, older_than)
+    update = max_versions is not None and metadata.get("max_versions") != max_versions
+    if not dryrun:
+        if destroy:
+            vault.secret.destroy(engine_path, path, destroy)
+        if update:
+            vault.secret.update_metadata(
+                engine_path, path, {"max_versions": max_versions}
+            )
+    return len(destroy), update
+
+
+def prune(
+    vault,
+    engine_path,
+    path,
+    workers=8,
+    keep=None,
+    older_than=None,
+    max_versions=None,
+    dryrun=False,
+):
+    """ Prune the versions of all secrets below the given path, the secrets
+    are handled concurrently while the tree is walked
+
+    :vault: Vault class
+    :engine_path: path of the secret engine
+    :path: path to prune
+    :workers: number of concurrent requests
+    :keep: number of newest versions to keep
+    :older_than: timedelta, only older versions are destroyed
+    :max_versions: value for max_versions in the metadata or None
+    :dryrun: only count the changes
+    :returns: counter with secrets, pruned secrets, destroyed versions and
+    updated metadata
+
+    """
+    secrets = (
+        secret
+        for secret in vault.secret.recursive_list(engine_path, path, workers, False)
+        if not secret.endswith("/")
+    )
+    counts = collections.Counter()
+    progress = Progress("Pruned secrets")
+    results = bounded_map(
+        lambda secret: prune_secret(
+            vault, engine_path, secret, keep, older_than, max_versions, dryrun
+        ),
+        secrets,
+        workers,
+    )
+    for _, (destroyed, updated) in results:
+        counts["secrets"] += 1
+        counts["versions"] += destroyed
+        counts["pruned"] += 1 if destroyed else 0
+        counts["metadata"] += 1 if updated else 0
+        progress.advance()
+    progress.finish()
+    return counts
+
+
+def run(args, vault):
+    """Run this module
+    :returns: None
+
+    """
+    if args.keep is None and args.older_than is None and args.max_versions is None:
+        logging.error("Give at least one of --keep, --older-than or --max-versions")
+        exit(1)
+    older_than = None
+    if args.older_than is not None:
+        older_than = datetime.timedelta(days=args.older_than)
+    counts = prune(
+        vault,
+        args.engine,
+        args.vaultpath,
+        args.workers,
+        args.keep,
+        older_than,
+        args.max_versions,
+        args.dryrun,
+    )
+    verb = "Would destroy" if args.dryrun else "Destroyed"
+    print(
+        "%s %d versions of %d of %d secrets, max_versions set on %d secrets"
+        % (
+            verb,
+            counts["versions"],
+            counts["pruned"],
+            counts["secrets"],
+            counts["metadata"],
+        )
+    )
+
+
+def parse_commandline_arguments(subparsers, config):
+    """ Commandline argument parser for this module
+    :returns: None
+
+    """
+    parser = subparsers.add_parser("secret-prune")
+    parser.set_defaults(func=run)
+    add_engine_argument(parser, config)
+    parser.add_argument("vaultpath", help="path of the secrets to prune")
+    parser.add_argument(
+        "--keep",
+        type=positive_int,
+        help="number of newest versions to keep per secret, at least 1",
+    )
+    parser.add_argument(
+        "--older-than",
+        type=float,
+        help="only destroy versions older than this number of days",
+    )
+    parser.add_argument(
+        "--max-versions",
+        type=int,
+        help="set max_versions in the metadata of every secret, vault then "
+        + "drops older versions on the next write",
+    )
+    parser.add_argument(
+        "--dryrun", "-d", help="only count the versions to destroy", action="store_true"
+    )
+    add_walk_arguments(parser)
@@ -0,0 +1,120 @@
+"""
+Retry policy for requests to vault. Failed requests are retried with
+exponential backoff and full jitter, a Retry-After header sent by vault is
+honored.
+"""
+import email.utils
+import random
+import threading
+import time
+import requests
+
+# Status codes that are worth a retry: rate limits, standby nodes and
+# proxies in front of vault
+RETRY_STATUS_CODES = frozenset([429, 502, 503, 504])
+# Status codes for which vault surely did not process the request
+NOT_PROCESSED_STATUS_CODES = frozenset([429, 503])
+# Methods that can be resent after the request possibly reached vault
+IDEMPOTENT_METHODS = frozenset(["GET", "LIST", "DELETE", "HEAD", "OPTIONS"])
+
+
+class RetryBudget:
+
+    """Thread safe counter of the retries left for one operation."""
+
+    def __init__(self, retries=None):
+        """
+        :retries: number of retries, None for unlimited retries
+        """
+        self.retries = retries
+        self._lock = threading.Lock()
+
+    def consume(self):
+        """ Take one retry from the budget
+        :returns: True if the retry may be done
+
+        """
+        if self.retries is None:
+            return True
+        with self._lock:
+            if self.retries <= 0:
+                return False
+            self.retries = self.retries - 1
+            return True
+
+
+class RetryPolicy:
+
+    """Class describing when and how long to wait before a retry."""
+
+    def __init__(self, retries=5, backoff=0.5, max_backoff=30, budget=None):
+        """
+        :retries: maximal number of retries of a single request
+        :backoff: base of the exponential backoff in seconds
+        :max_backoff: maximal wait between two attempts in seconds
+        :budget: maximal number of retries of all requests of one
+        operation, None for no limit
+        """
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.budget = budget
+
+    def new_budget(self):
+        """ Create a fresh retry budget for an operation
+        :returns: RetryBudget
+
+        """
+        return RetryBudget(self.budget)
+
+    def should_retry(self, method, attempt, status_code=None, connection_error=None):
+        """ Decide whether a failed attempt is retried
+
+        :method: http method of the request
+        :attempt: number of the failed attempt starting at 0
+        :status_code: status code of the response if there is one
+        :connection_error: exception if no response was received
+        :returns: True if the request should be sent again
+
+        """
+        if attempt >= self.retries:
+            return False
+        if connection_error is not None:
+            # A request that was never sent can always be repeated
+            not_sent = isinstance(connection_error, requests.exceptions.ConnectTimeout)
+            return not_sent or method.upper() in IDEMPOTENT_METHODS
+        if method.upper() in IDEMPOTENT_METHODS:
+            return status_code in RETRY_STATUS_CODES
+        return status_code in NOT_PROCESSED_STATUS_CODES
+
+    def wait(self, attempt, retry_after=None):
+        """ Sleep before the next attempt
+
+        :attempt: number of the failed attempt starting at 0
+        :retry_after: value of the Retry-After header if given
+        :returns: None
+
+        """
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        delay = max(delay, min(self.max_backoff, parse_retry_after(retry_after)))
+        time.sleep(delay)
+
+
+def parse_retry_after(value):
+    """ Parse the value of a Retry-After header
+
+    :value: seconds or http date, may be None
+    :returns: seconds to wait
+
+    """
+    if not value:
+        return 0
+    try:
+        return max(0, float(value))
+    except ValueError:
+        pass
+    try:
+        date = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return 0
+    return max(0, date.timestamp() - time.time())
@@ -3,8 +3,20 @@ Class for wrapping the secret part of the vault api. This has no claim to be a
 full representation of the api but rather to provide convenience functions that
 are needed by MPS GmbH.  However, extensions are most welcome.
 """
+import datetime
+import hashlib
 import json
 import logging
+import re
+from .exceptions import VaultHTTPError
+from .journal import MoveJournal
+from .pool import Progress, bounded_map
+from .walker import PathFilter, TreeWalker, visit
+
+# Timestamps of the kv metadata, split into seconds, fraction and offset
+TIMESTAMP = re.compile(
+    r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(\.\d+)?(Z|[+-]\d\d:\d\d)?$"
+)
 
 
 class Secret:
@@ -36,22 +48,69 @@ class Secret:
             exit(1)
         return data
 
-    def recursive_list(self, engine_path, path):
+    def join(self, path, key):
+        """ Join a listed key to the path of its folder
+
+        :path: path of the folder
+        :key: key as returned by list
+        :returns: normalized path of the key
+
+        """
+        return self.vault.normalize(path + "/" + key)
+
+    def recursive_list(
+        self, engine_path, path, workers=1, ordered=True, path_filter=None
+    ):
         """ List secrets on a given path recursively
 
         :engine_path: path of the secret engine
         :path: path to list
+        :workers: number of folders that are listed concurrently
+        :ordered: keep the depth first order if more than one worker is used
+        :path_filter: optional PathFilter, pruned folders are not listed
+        :returns: generator for the secret list
+
+        """
+        if workers > 1:
+            walker = TreeWalker(self, workers, ordered, path_filter)
+            return walker.walk(engine_path, path)
+        return self._recursive_list(engine_path, path, path_filter)
+
+    def _recursive_list(self, engine_path, path, path_filter=None):
+        """ List secrets on a given path recursively one folder at a time.
+        The walk keeps one listing per folder level on an explicit stack, so
+        the cost per secret does not grow with the depth and deep trees do not
+        hit the recursion limit.
+
+        :engine_path: path of the secret engine
+        :path: path to list
+        :path_filter: optional PathFilter, pruned folders are not listed
         :returns: generator for the secret list
 
         """
-        secret_list = self.list(engine_path, path)
-        for secret in secret_list:
-            new_secret = self.vault.normalize(path + "/" + secret)
-            yield new_secret
-            if secret.endswith("/"):
-                recursive_secrets = self.recursive_list(engine_path, new_secret)
-                for recursive_secret in recursive_secrets:
-                    yield recursive_secret
+        # Only the path of the current folder is kept, every level stores the
+        # length of its key to cut it off again. The children are built by
+        # appending the key instead of normalizing the whole path again.
+        prefix = self.join(path, "")
+        stack = [(0, iter(self.list(engine_path, path)))]
+        while stack:
+            for key in stack[-1][1]:
+                if key.startswith("/") or "//" in key:
+                    new_secret = self.join(prefix, key)
+                else:
+                    new_secret = prefix + key.replace(" ", "%20")
+                yielded, listed = visit(new_secret, path_filter)
+                if yielded:
+                    yield new_secret
+                if listed:
+                    keys = iter(self.list(engine_path, new_secret))
+                    stack.append((len(new_secret) - len(prefix), keys))
+                    prefix = new_secret
+                    break
+            else:
+                length, _ = stack.pop()
+                if length:
+                    prefix = prefix[:-length]
 
     def delete(self, engine_path, path):
         """ Delete the given secret permanently from vault
@@ -67,38 +126,114 @@ class Secret:
         logging.info("Deleting the secret: %s", address)
         self.vault.requests_request("DELETE", address, headers=self.vault.token_header)
 
-    def add(self, engine_path, path, data):
+    def destroy(self, engine_path, path, versions):
+        """ Destroy the data of the given versions of a secret permanently,
+        the metadata of the versions is kept
+
+        :engine_path: path of the secret engine
+        :path: path of the secret
+        :versions: list of version numbers
+        :returns: None
+
+        """
+        path = self.vault.normalize("/" + engine_path + "/destroy/" + path)
+        address = self.vault.vault_adress + "/v1" + path
+        logging.info("Destroying versions %s of the secret: %s", versions, address)
+        self.vault.requests_request(
+            "POST",
+            address,
+            headers=self.vault.token_header,
+            data=json.dumps({"versions": [int(version) for version in versions]}),
+        )
+
+    def update_metadata(self, engine_path, path, options):
+        """ Update the settings in the metadata of a secret
+
+        :engine_path: path of the secret engine
+        :path: path of the secret
+        :options: dict of settings, e.g. max_versions
+        :returns: None
+
+        """
+        path = self.vault.normalize("/" + engine_path + "/metadata/" + path)
+        address = self.vault.vault_adress + "/v1" + path
+        logging.info("Updating the metadata of the secret: %s", address)
+        self.vault.requests_request(
+            "POST", address, headers=self.vault.token_header, data=json.dumps(options)
+        )
+
+    def add(self, engine_path, path, data, cas=None):
         """ Add the given secret with the given data
 
         :engine_path: path of the secret engine
         :path: path of the new secret
         :data: data of the secret
-        :returns: None
+        :cas: optional check-and-set version, the write fails if the current
+        version of the secret differs, 0 only allows new secrets
+        :returns: version number of the written secret
 
         """
         path = self.vault.normalize("/" + engine_path + "/data/" + path)
         address = self.vault.vault_adress + "/v1" + path
         logging.info("Adding the secret: %s", address)
-        payload = json.dumps({"data": data})
+        payload = {"data": data}
+        if cas is not None:
+            payload["options"] = {"cas": cas}
         response = self.vault.requests_request(
-            "POST", address, headers=self.vault.token_header, data=payload
+            "POST", address, headers=self.vault.token_header, data=json.dumps(payload)
         )
-        if response.json()["data"]["version"] != 1:
+        version = response.json()["data"]["version"]
+        if version != 1 and cas is None:
             logging.warning(
                 "Secret already existed, creating new version with given data"
             )
+        return version
 
-    def recursive_delete(self, engine_path, path):
-        """ Delete all secrets under the given path permanently from vault
+    def recursive_delete(
+        self, engine_path, path, workers=1, ordered=True, dryrun=False, path_filter=None
+    ):
+        """ Delete all secrets under the given path permanently from vault. The
+        deletes are streamed from the walk as soon as the secrets are found.
+        Folders are not deleted, they vanish in vault with their last secret,
+        so no bottom-up ordering is needed.
 
         :engine_path: path of the secret engine
         :path: path to delete
-        :returns: None
+        :workers: number of concurrent list and delete requests
+        :ordered: keep the depth first order if more than one worker is used
+        :dryrun: only count the requests that would be issued
+        :path_filter: optional PathFilter, only matching secrets are deleted
+        :returns: tuple of the number of list and delete requests
 
         """
+        walk = self.recursive_list(engine_path, path, workers, ordered, path_filter)
+        # The given path itself is listed as well
+        counts = {"LIST": 1}
+
+        def secrets():
+            for secret in walk:
+                if secret.endswith("/"):
+                    if path_filter is None or path_filter.descend(secret):
+                        counts["LIST"] = counts["LIST"] + 1
+                    continue
+                yield secret
+
+        if dryrun:
+            deletes = sum(1 for _ in secrets())
+            print(
+                "Would issue %d DELETE requests after %d LIST requests"
+                % (deletes, counts["LIST"])
+            )
+            return counts["LIST"], deletes
 
-        for secret in self.recursive_list(engine_path, path):
-            self.delete(engine_path, secret)
+        progress = Progress("Deleted secrets")
+        deletes = bounded_map(
+            lambda secret: self.delete(engine_path, secret), secrets(), workers
+        )
+        for _ in deletes:
+            progress.advance()
+        progress.finish()
+        return counts["LIST"], progress.count
 
     def read(self, engine_path, path):
         """ read the details of the given secret
@@ -107,22 +242,87 @@ class Secret:
         :path: path of the secret
         :returns: secret details as dict
 
+        """
+        return self.read_data(engine_path, path)["data"]
+
+    def read_data(self, engine_path, path, version=None):
+        """ read the data of the given secret together with the metadata of
+        the read version
+
+        :engine_path: path of the secret engine
+        :path: path of the secret
+        :version: version number, the current version if None
+        :returns: dict with data and metadata
+
         """
         path = self.vault.normalize("/" + engine_path + "/data/" + path)
         address = self.vault.vault_adress + "/v1" + path
+        if version is not None:
+            address = address + "?version={}".format(version)
         logging.info("Reading the secret: %s", address)
         response = self.vault.requests_request(
             "GET", address, headers=self.vault.token_header
         )
-        secret_details = response.json()["data"]["data"]
-        return secret_details
+        return response.json()["data"]
+
+    def read_current(self, engine_path, path):
+        """ read the data and the number of the current version of a secret
+
+        :engine_path: path of the secret engine
+        :path: path of the secret
+        :returns: tuple of data and version, data is None if the secret does
+        not exist or its current version is deleted, version is 0 if the
+        secret does not exist
+
+        """
+        try:
+            secret = self.read_data(engine_path, path)
+        except VaultHTTPError as error:
+            if error.status_code != 404:
+                raise
+        else:
+            return secret["data"], secret["metadata"]["version"]
+        try:
+            metadata = self.read_metadata(engine_path, path)
+        except VaultHTTPError as error:
+            if error.status_code != 404:
+                raise
+            return None, 0
+        return None, metadata["current_version"]
+
+    def read_version(self, engine_path, path, version):
+        """ read the data of the given version of a secret
+
+        :engine_path: path of the secret engine
+        :path: path of the secret
+        :version: version number
+        :returns: secret data as dict
 
-    def recursive_mv(self, engine_path, from_path, to_path):
-        """move the given folders with all secrets and versions
+        """
+        return self.read_data(engine_path, path, version)["data"]
+
+    def recursive_mv(
+        self,
+        engine_path,
+        from_path,
+        to_path,
+        workers=1,
+        ordered=True,
+        journal=None,
+        version_workers=4,
+        path_filter=None,
+    ):
+        """move the given folders with all secrets and versions, the secrets
+        are moved in parallel
 
         :engine_path: path of the secret engine
         :from_path: path of the folders
         :to_path: path to move the folders
+        :workers: number of concurrent list requests and moved secrets
+        :ordered: keep the depth first order if more than one worker is used
+        :journal: optional MoveJournal to resume an interrupted move
+        :version_workers: number of versions of a secret read concurrently
+        :path_filter: optional PathFilter, only matching secrets are moved
         :returns: None
 
         """
@@ -132,34 +332,63 @@ class Secret:
         if not to_path.endswith("/"):
             to_path = to_path + "/"
 
-        for secret in self.recursive_list(engine_path, from_path):
-            if secret.endswith("/"):
-                continue
-            new_secret_path = secret.replace(from_path, to_path)
-            self.mv(engine_path, secret, new_secret_path)
+        def moves():
+            walk = self.recursive_list(
+                engine_path, from_path, workers, ordered, path_filter
+            )
+            for secret in walk:
+                if secret.endswith("/"):
+                    continue
+                new_secret_path = secret.replace(from_path, to_path)
+                if journal is not None and journal.is_done(secret, new_secret_path):
+                    continue
+                yield secret, new_secret_path
+
+        progress = Progress("Moved secrets")
+        results = bounded_map(
+            lambda move: self.mv(
+                engine_path, move[0], move[1], version_workers, journal
+            ),
+            moves(),
+            workers,
+        )
+        for _ in results:
+            progress.advance()
+        progress.finish()
 
-    def mv(self, engine_path, from_path, to_path):
-        """ move the given secret with all its versions
+    def mv(self, engine_path, from_path, to_path, workers=1, journal=None):
+        """ move the given secret with all its versions. The versions are read
+        concurrently and written to the target in their original order.
 
         :engine_path: path of the secret engine
         :from_path: path of the secret
         :to_path: path to move the secret to
+        :workers: number of versions read concurrently
+        :journal: optional MoveJournal, versions recorded in it are skipped
         :returns: None
 
         """
-
-        versions = self._read_version(engine_path, from_path)
-        path = self.vault.normalize("/" + engine_path + "/data/" + from_path)
-        for version in versions:
-            address = (
-                self.vault.vault_adress + "/v1" + path + "?version={}".format(version)
-            )
-            response = self.vault.requests_request(
-                "GET", address, headers=self.vault.token_header
-            )
-            data = response.json()["data"]["data"]
+        written = set()
+        if journal is not None:
+            if journal.is_done(from_path, to_path):
+                return
+            written = journal.written_versions(from_path, to_path)
+
+        versions = sorted(self._read_version(engine_path, from_path), key=int)
+        versions = [version for version in versions if version not in written]
+        datas = bounded_map(
+            lambda version: self.read_version(engine_path, from_path, version),
+            versions,
+            workers,
+            ordered=True,
+        )
+        for version, data in datas:
             self.add(engine_path, to_path, data)
+            if journal is not None:
+                journal.version_written(from_path, to_path, version)
         self.delete(engine_path, from_path)
+        if journal is not None:
+            journal.done(from_path, to_path)
 
     def _read_version(self, engine_path, path):
         """ read the versions of the given secret
@@ -168,13 +397,53 @@ class Secret:
         :path: path of the secret
         :returns: secret details as dict
 
+        """
+        return self.read_metadata(engine_path, path)["versions"].keys()
+
+    def read_metadata(self, engine_path, path):
+        """ read the metadata of the given secret
+
+        :engine_path: path of the secret engine
+        :path: path of the secret
+        :returns: metadata as dict with current_version, versions, ...
+
         """
         path = self.vault.normalize("/" + engine_path + "/metadata/" + path)
         address = self.vault.vault_adress + "/v1" + path
         response = self.vault.requests_request(
             "GET", address, headers=self.vault.token_header
         )
-        return response.json()["data"]["versions"].keys()
+        return response.json()["data"]
+
+
+def parse_time(timestamp):
+    """ Parse a timestamp of the kv metadata, e.g.
+    2018-03-22T02:24:06.945319214Z, vault writes up to nanoseconds
+
+    :timestamp: timestamp as string
+    :returns: timezone aware datetime or None for an empty timestamp
+
+    """
+    if not timestamp:
+        return None
+    match = TIMESTAMP.match(timestamp)
+    if match is None:
+        raise ValueError("Invalid timestamp: %s" % timestamp)
+    seconds, fraction, offset = match.groups()
+    fraction = (fraction or ".0")[:7]
+    offset = "+00:00" if not offset or offset == "Z" else offset
+    return datetime.datetime.fromisoformat(seconds + fraction + offset)
+
+
+def content_hash(data):
+    """ Hash of the data of a secret that does not depend on the key order
+
+    :data: data of the secret
+    :returns: hex digest
+
+    """
+    content = json.dumps(data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(content.encode()).hexdigest()
 
 
 def add(args, vault):
@@ -190,8 +459,24 @@ def delete(args, vault):
     :returns: None
 
     """
+    if args.recursive and args.asyncio:
+        run_async(
+            args,
+            vault,
+            lambda async_vault: async_vault.secret.recursive_delete(
+                args.engine, args.vaultpath, get_path_filter(args), args.dryrun
+            ),
+        )
+        return
     if args.recursive:
-        vault.secret.recursive_delete(args.engine, args.vaultpath)
+        vault.secret.recursive_delete(
+            args.engine,
+            args.vaultpath,
+            args.workers,
+            not args.unordered,
+            args.dryrun,
+            get_path_filter(args),
+        )
         return
     vault.secret.delete(args.engine, args.vaultpath)
 
@@ -201,7 +486,31 @@ def list_secrets(args, vault):
     :returns: None
 
     """
-    secret_list = vault.secret.recursive_list(args.engine, args.vaultpath)
+    # The index is read locally, --asyncio only applies to the walk
+    if args.asyncio and not args.index:
+
+        async def print_secrets(async_vault):
+            secret_list = async_vault.secret.recursive_list(
+                args.engine, args.vaultpath, not args.unordered, get_path_filter(args)
+            )
+            async for secret in secret_list:
+                print(secret)
+
+        run_async(args, vault, print_secrets)
+        return
+    if args.index:
+        # pylint: disable=import-outside-toplevel
+        from .index import indexed_list
+
+        secret_list = indexed_list(vault, args)
+    else:
+        secret_list = vault.secret.recursive_list(
+            args.engine,
+            args.vaultpath,
+            args.workers,
+            not args.unordered,
+            get_path_filter(args),
+        )
     for secret in secret_list:
         print(secret)
 
@@ -220,10 +529,62 @@ def mv(args, vault):
     :returns: None
 
     """
-    if args.recursive:
-        vault.secret.recursive_mv(args.engine, args.vaultpath, args.target_vaultpath)
+    if args.recursive and args.asyncio:
+        if args.journal:
+            logging.error("--journal is not supported with --asyncio")
+            exit(1)
+        run_async(
+            args,
+            vault,
+            lambda async_vault: async_vault.secret.recursive_mv(
+                args.engine,
+                args.vaultpath,
+                args.target_vaultpath,
+                get_path_filter(args),
+            ),
+        )
         return
-    vault.secret.mv(args.engine, args.vaultpath, args.target_vaultpath)
+    journal = MoveJournal(args.journal) if args.journal else None
+    try:
+        if args.recursive:
+            vault.secret.recursive_mv(
+                args.engine,
+                args.vaultpath,
+                args.target_vaultpath,
+                args.workers,
+                not args.unordered,
+                journal,
+                path_filter=get_path_filter(args),
+            )
+            return
+        vault.secret.mv(
+            args.engine, args.vaultpath, args.target_vaultpath, args.workers, journal
+        )
+    finally:
+        if journal is not None:
+            journal.close()
+
+
+def run_async(args, vault, operation):
+    """Run the given operation on an AsyncVault sharing the session of vault
+
+    :args: Parsed commandline arguments
+    :vault: Vault class
+    :operation: coroutine function taking the AsyncVault
+    :returns: None
+
+    """
+    # Imported here, async_vault imports this module via vault.vault and
+    # asyncio is only needed for this mode
+    # pylint: disable=import-outside-toplevel
+    import asyncio
+    from .async_vault import AsyncVault
+
+    async def main():
+        async with AsyncVault.from_vault(vault, args.workers) as async_vault:
+            await operation(async_vault)
+
+    asyncio.run(main())
 
 
 def parse_commandline_arguments(subparsers, config):
@@ -244,27 +605,135 @@ def parse_commandline_arguments(subparsers, config):
     mv_parser.set_defaults(func=mv)
 
     for parser in [add_parser, del_parser, list_parser, read_parser, mv_parser]:
-        if config is not None and "secret" in config and "engine" in config["secret"]:
-            parser.add_argument(
-                "engine",
-                nargs="?",
-                default=config["secret"]["engine"],
-                help="path of the secret engine in vault, if "
-                + "not provided the path in the config will be "
-                + "used",
-            )
-        else:
-            parser.add_argument("engine", help="path of the secret engine in vault")
-
+        add_engine_argument(parser, config)
         parser.add_argument(
             "vaultpath", help="path of the secret inside the secret engine vault"
         )
 
     mv_parser.add_argument("target_vaultpath", help="path to move the secret to")
 
+    mv_parser.add_argument(
+        "--journal",
+        help="file recording the progress of the move, rerun with the same "
+        + "file to resume an interrupted move, not supported with --asyncio",
+    )
+
+    del_parser.add_argument(
+        "--dryrun",
+        "-d",
+        help="only count the requests a recursive delete would issue",
+        action="store_true",
+    )
+
     add_parser.add_argument("data", help="data of the secret as json")
 
     for parser in [del_parser, mv_parser]:
         parser.add_argument(
             "-r", "--recursive", help="deletes secrets recursively", action="store_true"
         )
+
+    for parser in [del_parser, list_parser, mv_parser]:
+        add_walk_arguments(parser)
+        add_filter_arguments(parser)
+        parser.add_argument(
+            "--unordered",
+            help="stream secrets as soon as their folder is listed instead of "
+            + "keeping the depth first order",
+            action="store_true",
+        )
+        parser.add_argument(
+            "--asyncio",
+            help="run recursive operations on the asyncio client, --workers "
+            + "limits the requests in flight",
+            action="store_true",
+        )
+    add_index_arguments(list_parser)
+
+
+def add_engine_argument(parser, config):
+    """ Add the secret engine argument with the default from the config
+    :returns: None
+
+    """
+    if config is not None and "secret" in config and "engine" in config["secret"]:
+        parser.add_argument(
+            "engine",
+            nargs="?",
+            default=config["secret"]["engine"],
+            help="path of the secret engine in vault, if "
+            + "not provided the path in the config will be "
+            + "used",
+        )
+    else:
+        parser.add_argument("engine", help="path of the secret engine in vault")
+
+
+def add_walk_arguments(parser):
+    """ Add the commandline arguments for recursive walks to the given parser
+    :returns: None
+
+    """
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=8,
+        help="number of folders that are listed concurrently",
+    )
+
+
+def add_index_arguments(parser):
+    """ Add the commandline arguments to answer from a local index to the
+    given parser
+    :returns: None
+
+    """
+    parser.add_argument(
+        "--index", help="answer from this local index file, see secret-index"
+    )
+    parser.add_argument(
+        "--max-staleness",
+        type=float,
+        default=300,
+        help="seconds the index may be old before it is refreshed first",
+    )
+
+
+def add_filter_arguments(parser):
+    """ Add the include, exclude and depth arguments for recursive walks to
+    the given parser
+    :returns: None
+
+    """
+    parser.add_argument(
+        "--include",
+        action="append",
+        help="only handle secrets whose path inside the engine matches this "
+        + "glob, e.g. 'team/db/*', can be given multiple times",
+    )
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        help="skip secrets and folders matching this glob, excluded folders "
+        + "are not listed, can be given multiple times",
+    )
+    parser.add_argument(
+        "--regex",
+        help="--include and --exclude are regular expressions instead of globs",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--max-depth", type=int, help="number of folder levels that are listed"
+    )
+
+
+def get_path_filter(args):
+    """ Create the PathFilter of the commandline arguments
+    :returns: PathFilter or None if no filter is given
+
+    """
+    if not args.include and not args.exclude and args.max_depth is None:
+        return None
+    return PathFilter(
+        args.vaultpath, args.include, args.exclude, args.max_depth, args.regex
+    )
@@ -0,0 +1,287 @@
+"""
+This module reports the shape of the secrets below a path: number of secrets,
+versions per secret, payload size, fields per secret and depth, grouped by
+folder prefix. The summaries are histograms with power of two buckets, they
+use constant memory and can be merged.
+"""
+import json
+from .pool import bounded_map
+from .secret import add_engine_argument, add_walk_arguments
+
+
+class Log2Histogram:
+
+    """Histogram of non negative integers with power of two buckets, bucket n
+    counts the values with n bits."""
+
+    def __init__(self):
+        self.counts = {}
+        self.total = 0
+        self.sum = 0
+        self.max = 0
+
+    def add(self, value):
+        """ Add a single value
+        :returns: None
+
+        """
+        bucket = int(value).bit_length()
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.total = self.total + 1
+        self.sum = self.sum + value
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """ Add all values of another histogram
+        :returns: None
+
+        """
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.total = self.total + other.total
+        self.sum = self.sum + other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction):
+        """ Estimate the given percentile by the upper bound of its bucket
+
+        :fraction: percentile between 0 and 1
+        :returns: value as int
+
+        """
+        rank = fraction * self.total
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen = seen + self.counts[bucket]
+            if seen >= rank:
+                return min((1 << bucket) - 1, self.max)
+        return self.max
+
+    def to_dict(self):
+        """ Summary of the histogram
+        :returns: dict
+
+        """
+        return {
+            "sum": self.sum,
+            "mean": round(self.sum / self.total, 2) if self.total else 0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": self.max,
+            "buckets": {
+                str((1 << bucket) - 1): count
+                for bucket, count in sorted(self.counts.items())
+            },
+        }
+
+
+class ShapeStats:
+
+    """Histograms of the secrets of one folder prefix."""
+
+    FIELDS = ["versions", "bytes", "fields", "depth"]
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.secrets = 0
+        self.histograms = {name: Log2Histogram() for name in self.FIELDS}
+
+    def add(self, **values):
+        """ Add a single secret, the keyword arguments are the values of the
+        histograms
+        :returns: None
+
+        """
+        self.secrets = self.secrets + 1
+        for name, value in values.items():
+            self.histograms[name].add(value)
+
+    def merge(self, other):
+        """ Add all secrets of another prefix
+        :returns: None
+
+        """
+        self.secrets = self.secrets + other.secrets
+        for name, histogram in other.histograms.items():
+            self.histograms[name].merge(histogram)
+
+    def to_dict(self):
+        """ Summary of the prefix
+        :returns: dict
+
+        """
+        return {
+            "prefix": self.prefix,
+            "secrets": self.secrets,
+            **{name: self.histograms[name].to_dict() for name in self.FIELDS},
+        }
+
+    def row(self):
+        """ Summary of the prefix as row of the table
+        :returns: string
+
+        """
+        versions = self.histograms["versions"]
+        size = self.histograms["bytes"]
+        fields = self.histograms["fields"]
+        return "{:40} {:>8} {:>9} {:>6} {:>6} {:>11} {:>8} {:>8} {:>6} {:>5}".format(
+            self.prefix,
+            self.secrets,
+            versions.sum,
+            versions.percentile(0.95),
+            versions.max,
+            size.sum,
+            size.percentile(0.95),
+            size.max,
+            fields.percentile(0.95),
+            self.histograms["depth"].max,
+        )
+
+
+HEADER = "{:40} {:>8} {:>9} {:>6} {:>6} {:>11} {:>8} {:>8} {:>6} {:>5}".format(
+    "PREFIX",
+    "SECRETS",
+    "VERSIONS",
+    "V_P95",
+    "V_MAX",
+    "BYTES",
+    "B_P95",
+    "B_MAX",
+    "F_P95",
+    "DEPTH",
+)
+
+
+def secret_shape(vault, engine_path, path, read_data=True):
+    """ Read the numbers of a single secret
+
+    :vault: Vault class
+    :engine_path: path of the secret engine
+    :path: path of the secret
+    :read_data: read the data for the size and fields, otherwise only the
+    metadata is read
+    :returns: dict with versions, bytes and fields
+
+    """
+    metadata = vault.secret.read_metadata(engine_path, path)
+    versions = sum(
+        1 for details in metadata["versions"].values() if not details.get("destroyed")
+    )
+    shape = {"versions": versions, "bytes": 0, "fields": 0}
+    if read_data:
+        data, _ = vault.secret.read_current(engine_path, path)
+        if data is not None:
+            shape["bytes"] = len(json.dumps(data, separators=(",", ":")))
+            shape["fields"] = len(data)
+    return shape
+
+
+def prefix_of(relative, depth):
+    """ Folder prefix of a secret used for grouping
+
+    :relative: path of the secret below the root
+    :depth: number of folder levels of the prefix
+    :returns: prefix with trailing slash or "" for secrets above the depth
+
+    """
+    folders = relative.split("/")[:-1][:depth]
+    return "/".join(folders) + "/" if folders else ""
+
+
+def shape_stats(vault, engine_path, path, workers=8, depth=1, read_data=True):
+    """ Walk the given path and summarize the secrets per folder prefix. The
+    walk is depth first, so a prefix is finished as soon as the walk leaves
+    its folder and only the summaries of the current folders are kept.
+
+    :vault: Vault class
+    :engine_path: path of the secret engine
+    :path: path to summarize
+    :workers: number of concurrent requests
+    :depth: number of folder levels below the path used as prefix
+    :read_data: read the data of the secrets for size and fields
+    :returns: generator of ShapeStats, one per prefix and the total with the
+    prefix TOTAL last
+
+    """
+    root = vault.secret.join(path, "")
+    secrets = (
+        secret
+        for secret in vault.secret.recursive_list(engine_path, path, workers, True)
+        if not secret.endswith("/")
+    )
+    shapes = bounded_map(
+        lambda secret: secret_shape(vault, engine_path, secret, read_data),
+        secrets,
+        workers,
+        ordered=True,
+    )
+    # Labeled apart, the root itself is the only prefix with a group depth of 0
+    total = ShapeStats("TOTAL")
+    # Prefixes whose folders are still walked, the secrets directly in a
+    # folder above the grouping depth can come before and after its subfolders
+    open_stats = {}
+    for secret, shape in shapes:
+        relative = secret[len(root) :]
+        prefix = root + prefix_of(relative, depth)
+        for other in list(open_stats):
+            if not prefix.startswith(other):
+                total.merge(open_stats[other])
+                yield open_stats.pop(other)
+        if prefix not in open_stats:
+            open_stats[prefix] = ShapeStats(prefix)
+        open_stats[prefix].add(depth=relative.count("/") + 1, **shape)
+    for stats in sorted(open_stats.values(), key=lambda stats: stats.prefix):
+        total.merge(stats)
+        yield stats
+    yield total
+
+
+def run(args, vault):
+    """Run this module
+    :returns: None
+
+    """
+    summaries = shape_stats(
+        vault,
+        args.engine,
+        args.vaultpath,
+        args.workers,
+        args.group_depth,
+        not args.metadata_only,
+    )
+    if not args.json:
+        print(HEADER)
+    for summary in summaries:
+        if args.json:
+            print(json.dumps(summary.to_dict()), flush=True)
+        else:
+            print(summary.row(), flush=True)
+
+
+def parse_commandline_arguments(subparsers, config):
+    """ Commandline argument parser for this module
+    :returns: None
+
+    """
+    parser = subparsers.add_parser("secret-stats")
+    parser.set_defaults(func=run)
+    add_engine_argument(parser, config)
+    parser.add_argument("vaultpath", help="path of the secrets to summarize")
+    parser.add_argument(
+        "--group-depth",
+        type=int,
+        default=1,
+        help="number of folder levels below the path the secrets are grouped by",
+    )
+    parser.add_argument(
+        "--metadata-only",
+        help="only read the metadata, sizes and fields are not reported",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--json",
+        help="print one json object per prefix instead of a table, the last "
+        + "one is the total with the prefix TOTAL",
+        action="store_true",
+    )
+    add_walk_arguments(parser)
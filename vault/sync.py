@@ -0,0 +1,321 @@
+"""
+This module synchronizes the secrets below a path to another path, secret
+engine or vault cluster. Only missing or changed secrets are written, they are
+compared by the hash of their content.
+"""
+import collections
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from .exceptions import VaultHTTPError
+from .manifest import HashManifest
+from .pool import Progress, bounded_map
+from .secret import add_engine_argument, add_walk_arguments, content_hash
+from .vault import Vault
+
+
+def relative_paths(vault, engine_path, path, workers=8):
+    """ Secrets below the given path relative to it
+
+    :vault: Vault class
+    :engine_path: path of the secret engine
+    :path: path to list
+    :workers: number of concurrent list requests
+    :returns: generator of tuples of the secret path and the relative path
+
+    """
+    prefix = vault.secret.join(path, "")
+    for secret in vault.secret.recursive_list(engine_path, path, workers, False):
+        if not secret.endswith("/"):
+            yield secret, secret[len(prefix) :]
+
+
+def manifest_key(target, engine_path, path):
+    """ Key of a target secret in the manifest, it includes the address of
+    the target vault so a manifest cannot be reused for another cluster
+
+    :target: Vault class of the target
+    :engine_path: secret engine of the target
+    :path: path of the target secret
+    :returns: key as string
+
+    """
+    return target.vault_adress.rstrip("/") + "/" + engine_path + "/" + path
+
+
+def copy_versions(
+    source, target, source_engine, target_engine, path, target_path, workers=4
+):
+    """ Copy all versions of a secret that are not deleted to a new secret,
+    the versions are read concurrently and written in their original order
+
+    :source: Vault class of the source
+    :target: Vault class of the target
+    :source_engine: secret engine of the source
+    :target_engine: secret engine of the target
+    :path: path of the source secret
+    :target_path: path of the target secret
+    :workers: number of versions read concurrently
+    :returns: None
+
+    """
+    metadata = source.secret.read_metadata(source_engine, path)["versions"]
+    versions = [
+        version
+        for version in sorted(metadata, key=int)
+        if not metadata[version].get("destroyed")
+        and not metadata[version].get("deletion_time")
+    ]
+    datas = bounded_map(
+        lambda version: source.secret.read_version(source_engine, path, version),
+        versions,
+        workers,
+        ordered=True,
+    )
+    cas = 0
+    for _, data in datas:
+        cas = target.secret.add(target_engine, target_path, data, cas=cas)
+
+
+def sync_secret(
+    source,
+    target,
+    source_engine,
+    target_engine,
+    path,
+    target_path,
+    manifest=None,
+    preserve_versions=False,
+    dryrun=False,
+):
+    """ Write the given secret to the target if it is missing or differs
+
+    :source: Vault class of the source
+    :target: Vault class of the target
+    :source_engine: secret engine of the source
+    :target_engine: secret engine of the target
+    :path: path of the source secret
+    :target_path: path of the target secret
+    :manifest: optional HashManifest of the target, secrets with a matching
+    hash are skipped without reading the target
+    :preserve_versions: copy all versions of secrets missing in the target
+    :dryrun: do not write anything
+    :returns: "copied", "updated", "unchanged", "conflict" or "skipped" if the
+    current version of the source is deleted
+
+    """
+    data, _ = source.secret.read_current(source_engine, path)
+    if data is None:
+        return "skipped"
+    digest = content_hash(data)
+    key = manifest_key(target, target_engine, target_path)
+    if manifest is not None and manifest.get(key) == digest:
+        return "unchanged"
+    target_data, version = target.secret.read_current(target_engine, target_path)
+    if target_data is not None and content_hash(target_data) == digest:
+        if manifest is not None:
+            manifest.set(key, digest)
+        return "unchanged"
+    result = "copied" if version == 0 else "updated"
+    if dryrun:
+        return result
+    try:
+        if preserve_versions and version == 0:
+            copy_versions(
+                source, target, source_engine, target_engine, path, target_path
+            )
+        else:
+            target.secret.add(target_engine, target_path, data, cas=version)
+    except VaultHTTPError as error:
+        if error.status_code != 400:
+            raise
+        logging.warning("Secret %s was changed during the sync: %s", target_path, error)
+        return "conflict"
+    if manifest is not None:
+        manifest.set(key, digest)
+    return result
+
+
+def sync(
+    source,
+    target,
+    source_engine,
+    target_engine,
+    path,
+    target_path,
+    workers=8,
+    manifest=None,
+    preserve_versions=False,
+    delete_extra=False,
+    dryrun=False,
+):
+    """ Synchronize all secrets below the given path to the target. The source
+    is walked and its secrets are compared on a bounded pool of workers, with
+    delete_extra the target is walked at the same time.
+
+    :source: Vault class of the source
+    :target: Vault class of the target, may be the same as the source
+    :source_engine: secret engine of the source
+    :target_engine: secret engine of the target
+    :path: path of the source folder
+    :target_path: path of the target folder
+    :workers: number of concurrent requests
+    :manifest: optional HashManifest of the target
+    :preserve_versions: copy all versions of secrets missing in the target
+    :delete_extra: delete secrets of the target that are not in the source
+    :dryrun: only count the changes
+    :returns: counter of the results
+
+    """
+    target_prefix = target.secret.join(target_path, "")
+    counts = collections.Counter()
+    seen = set()
+
+    def target_secrets():
+        walk = relative_paths(target, target_engine, target_path, workers)
+        try:
+            return {relative: secret for secret, relative in walk}
+        except VaultHTTPError as error:
+            # The target folder does not exist yet
+            if error.status_code != 404:
+                raise
+            return {}
+
+    def secrets():
+        for secret, relative in relative_paths(source, source_engine, path, workers):
+            seen.add(relative)
+            yield secret, target_prefix + relative
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        extra = executor.submit(target_secrets) if delete_extra else None
+
+        progress = Progress("Synchronized secrets")
+        results = bounded_map(
+            lambda move: sync_secret(
+                source,
+                target,
+                source_engine,
+                target_engine,
+                move[0],
+                move[1],
+                manifest,
+                preserve_versions,
+                dryrun,
+            ),
+            secrets(),
+            workers,
+        )
+        for _, result in results:
+            counts[result] += 1
+            progress.advance()
+        progress.finish()
+
+        if extra is not None:
+            extras = [
+                (relative, secret)
+                for relative, secret in extra.result().items()
+                if relative not in seen
+            ]
+            if not dryrun:
+                deletes = bounded_map(
+                    lambda extra: target.secret.delete(target_engine, extra[1]),
+                    extras,
+                    workers,
+                )
+                for (relative, _), _ in deletes:
+                    if manifest is not None:
+                        secret = target_prefix + relative
+                        manifest.discard(manifest_key(target, target_engine, secret))
+            counts["deleted"] = len(extras)
+    return counts
+
+
+def run(args, vault):
+    """Run this module
+    :returns: None
+
+    """
+    target = vault
+    if args.target_url or args.target_token:
+        target = Vault(
+            args.target_url or args.url,
+            args.target_token or args.token,
+            pool_size=args.pool_size,
+            connect_timeout=args.connect_timeout,
+            read_timeout=args.read_timeout,
+            retry_policy=vault.retry_policy,
+            metrics=vault.metrics,
+        )
+    manifest = HashManifest(args.hash_cache) if args.hash_cache else None
+    try:
+        counts = sync(
+            vault,
+            target,
+            args.engine,
+            args.target_engine or args.engine,
+            args.vaultpath,
+            args.target_vaultpath,
+            args.workers,
+            manifest,
+            args.preserve_versions,
+            args.delete_extra,
+            args.dryrun,
+        )
+    finally:
+        if target is not vault:
+            target.close()
+    if manifest is not None and not args.dryrun:
+        manifest.save()
+    verb = "would be" if args.dryrun else "were"
+    print(
+        "%d secrets %s copied, %d updated and %d deleted, %d unchanged, "
+        "%d conflicts, %d skipped"
+        % (
+            counts["copied"],
+            verb,
+            counts["updated"],
+            counts["deleted"],
+            counts["unchanged"],
+            counts["conflict"],
+            counts["skipped"],
+        )
+    )
+
+
+def parse_commandline_arguments(subparsers, config):
+    """ Commandline argument parser for this module
+    :returns: None
+
+    """
+    parser = subparsers.add_parser("secret-sync")
+    parser.set_defaults(func=run)
+    add_engine_argument(parser, config)
+    parser.add_argument("vaultpath", help="path of the secrets to synchronize")
+    parser.add_argument("target_vaultpath", help="path to synchronize the secrets to")
+    parser.add_argument(
+        "--target-engine", help="secret engine of the target, default the source one"
+    )
+    parser.add_argument(
+        "--target-url", help="url of the target vault, default the source vault"
+    )
+    parser.add_argument(
+        "--target-token", help="token for the target vault, default the source token"
+    )
+    parser.add_argument(
+        "--preserve-versions",
+        help="copy all versions of secrets missing in the target, like secret-mv",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--delete-extra",
+        help="delete secrets in the target that do not exist in the source",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--hash-cache",
+        help="file with the content hashes of the synchronized secrets, target "
+        + "secrets with an unchanged hash are not read again",
+    )
+    parser.add_argument(
+        "--dryrun", "-d", help="only count the changes", action="store_true"
+    )
+    add_walk_arguments(parser)
@@ -7,6 +7,7 @@ import json
 import logging
 import random
 import string
+from .exceptions import VaultHTTPError
 
 
 class User:
@@ -168,12 +169,15 @@ class User:
 
         """
         address = self.vault.vault_adress + "/v1/identity/entity/name/" + name
-        request = self.vault.requests_request(
-            "GET", address, headers=self.vault.token_header
-        )
-        # If user does not exist return None
-        if request.status_code == 404:
-            return None
+        try:
+            request = self.vault.requests_request(
+                "GET", address, headers=self.vault.token_header
+            )
+        except VaultHTTPError as error:
+            # If user does not exist return None
+            if error.status_code == 404:
+                return None
+            raise
         return json.loads(request.content)["data"]
 
     def _get_entity_id(self, user):
@@ -3,10 +3,16 @@ Wrapper around the vault api. This has no claim to be a full representation of
 the api but rather to provide convenience functions that are needed by MPS GmbH.
 However, extensions are most welcome.
 """
+import contextlib
 import logging
 import json
 import os
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from .exceptions import VaultConnectionError, VaultHTTPError
+from .metrics import request_size
+from .retry import RetryBudget, RetryPolicy
 from .secret import Secret
 from .totp import Totp
 from .user import User
@@ -18,10 +24,38 @@ class Vault:
 
     """Class for wrapping the vault http api. """
 
-    def __init__(self, vault_adress, token):
+    def __init__(
+        self,
+        vault_adress,
+        token,
+        pool_size=10,
+        connect_timeout=5,
+        read_timeout=60,
+        retry_policy=None,
+        limiter=None,
+        metrics=None,
+        cache=None,
+    ):
         self.vault_adress = vault_adress
         self.token = token
         self.token_header = {"X-Vault-Token": self.token}
+        self.timeout = (connect_timeout, read_timeout)
+        self.retry_policy = retry_policy if retry_policy is not None else RetryPolicy()
+        self._retry_budget = self.retry_policy.new_budget()
+        # Optional limit of the requests in flight, see limiter.py
+        self.limiter = limiter
+        # Optional request metrics per endpoint, see metrics.py
+        self.metrics = metrics
+        # Optional cache for read mostly endpoints, see cache.py
+        self.cache = cache
+
+        # One keep-alive session is shared by all subclasses, so connections
+        # to vault are reused instead of opened for every single request.
+        # Threads wait for a free connection instead of opening extra ones.
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=pool_size, pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
         # Initialize Subclasses
         self.secret = Secret(self)
@@ -92,28 +126,122 @@ class Vault:
         """
         return path.replace(" ", "%20").replace("//", "/")
 
-    @staticmethod
-    def requests_request(*args, **kwargs):
-        """ Overwrites the requests.requests method with a default argument for verify
+    def close(self):
+        """ Close all pooled connections to vault
+        :returns: None
+
+        """
+        self.session.close()
+
+    @contextlib.contextmanager
+    def retry_budget(self, retries):
+        """ Limit the retries of all requests inside the with block
+
+        :retries: number of retries shared by all requests, None for no limit
+        :returns: context manager
+
+        """
+        previous_budget = self._retry_budget
+        self._retry_budget = RetryBudget(retries)
+        try:
+            yield
+        finally:
+            self._retry_budget = previous_budget
+
+    def requests_request(self, method, url, **kwargs):
+        """ Sends the request over the pooled session of this instance with the
+        configured default timeout. Transient errors are retried as given in
+        the retry policy, responses of read mostly endpoints are cached if a
+        cache is configured.
 
-        :returns: requests method
+        :returns: response
+        :raises VaultConnectionError: if vault could not be reached
+        :raises VaultHTTPError: if vault answered with an error status code
+
+        """
+        if self.cache is None:
+            return self._request(method, url, **kwargs)
+        token = kwargs.get("headers", {}).get("X-Vault-Token")
+        response = self.cache.get(token, method, url)
+        if response is not None:
+            return response
+        response = self._request(method, url, **kwargs)
+        self.cache.invalidate(token, method, url)
+        self.cache.put(token, method, url, response)
+        return response
+
+    def _request(self, method, *args, **kwargs):
+        """ Send the request and retry it on transient errors
+        :returns: response
 
         """
         logging.debug(kwargs)
         logging.debug(args)
+        kwargs.setdefault("timeout", self.timeout)
+        attempt = 0
+        while True:
+            try:
+                response = self._send(method, *args, **kwargs)
+            except requests.exceptions.RequestException as error:
+                if self._retry(method, attempt, connection_error=error):
+                    logging.warning("Retrying after connection error: %s", error)
+                    self.retry_policy.wait(attempt)
+                    attempt = attempt + 1
+                    continue
+                raise VaultConnectionError(
+                    f"An error occured during the connection to vault:\n\n {error} \n"
+                ) from error
+            logging.debug("%s %s", response.status_code, response.reason)
+            logging.debug(response.content)
+            if self._retry(method, attempt, status_code=response.status_code):
+                logging.warning(
+                    "Retrying after %s %s", response.status_code, response.reason
+                )
+                self.retry_policy.wait(attempt, response.headers.get("Retry-After"))
+                attempt = attempt + 1
+                continue
+            if response.status_code > 399:
+                raise VaultHTTPError.from_response(response)
+            return response
+
+    def _send(self, method, url, *args, **kwargs):
+        """ Send a single request over the session, waiting for the limiter and
+        recording the metrics if they are enabled
+        :returns: response
+
+        """
+        if self.limiter is None and self.metrics is None:
+            return self.session.request(method, url, *args, **kwargs)
+        if self.limiter is not None:
+            self.limiter.acquire()
+        start = time.monotonic()
+        response = None
         try:
-            response = requests.request(*args, **kwargs)
-        except Exception as error:  # pylint: disable=broad-except
-            logging.error(
-                "An error occured during the connection to vault:\n\n %s \n", error
+            response = self.session.request(method, url, *args, **kwargs)
+            return response
+        finally:
+            latency = time.monotonic() - start
+            status_code = response.status_code if response is not None else None
+            if self.limiter is not None:
+                self.limiter.release(latency, status_code == 429)
+            if self.metrics is not None:
+                self.metrics.record(
+                    method,
+                    url,
+                    status_code,
+                    request_size(response, kwargs),
+                    len(response.content) if response is not None else 0,
+                    latency,
+                )
+
+    def _retry(self, method, attempt, status_code=None, connection_error=None):
+        """ Check the retry policy and the budget whether to retry a request
+        :returns: True if the request should be sent again
+
+        """
+        return (
+            self.retry_policy.should_retry(
+                method, attempt, status_code, connection_error
             )
-            exit(1)
-        logging.debug("%s %s", response.status_code, response.reason)
-        logging.debug(response.content)
-        if response.status_code > 399:
-            logging.error("%s %s", response.status_code, response.reason)
-            error_text = "\n".join(response.json()["errors"])
-            if error_text:
-                logging.error(error_text)
-            exit(1)
-        return response
+            and self._retry_budget.consume()
+        )
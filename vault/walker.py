@@ -0,0 +1,216 @@
+"""
+Concurrent walker over the folder tree of a kv secret engine. Sibling folders
+are listed in parallel by a bounded pool of workers.
+"""
+import fnmatch
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def compile_pattern(pattern, regex=False):
+    """ Compile a glob or regular expression into a match function
+
+    :pattern: pattern as string or None
+    :regex: the pattern is a regular expression searched anywhere in the
+    string, otherwise a glob that has to match the whole string
+    :returns: function returning a truthy value for matching strings or None
+
+    """
+    if pattern is None:
+        return None
+    if regex:
+        return re.compile(pattern).search
+    return re.compile(fnmatch.translate(pattern)).match
+
+
+class PathFilter:
+
+    """Include and exclude patterns and a maximal depth for a walk. The
+    patterns are matched against the path inside the engine without a leading
+    slash, e.g. team/db/. Folders are only listed if they can contain an
+    included secret, so excluded branches cost no requests."""
+
+    def __init__(self, root, include=None, exclude=None, max_depth=None, regex=False):
+        """
+        :root: path the walk starts at, the depth is counted from it
+        :include: list of patterns, only matching paths are yielded
+        :exclude: list of patterns, matching paths and everything below them
+        are skipped
+        :max_depth: number of folder levels below the root that are listed
+        :regex: the patterns are regular expressions instead of globs
+        """
+        root = root.replace(" ", "%20").strip("/")
+        self.root = root + "/" if root else ""
+        self.include = [compile_pattern(pattern, regex) for pattern in include or []]
+        self.exclude = [compile_pattern(pattern, regex) for pattern in exclude or []]
+        self.max_depth = max_depth
+        # Literal beginnings of the include globs, used to prune folders that
+        # cannot contain a match. Regular expressions are never pruned.
+        self.prefixes = None
+        if include and not regex:
+            self.prefixes = [re.split(r"[*?[]", pattern, 1)[0] for pattern in include]
+
+    def depth(self, path):
+        """ Folder level of the given path below the root, the entries of the
+        root have depth 1
+
+        :path: path of a secret or folder
+        :returns: depth as int
+
+        """
+        relative = path.lstrip("/")[len(self.root) :]
+        return relative.rstrip("/").count("/") + 1
+
+    def matches(self, path):
+        """ Check whether the given secret or folder is yielded by the walk
+
+        :path: path of a secret or folder
+        :returns: bool
+
+        """
+        path = path.lstrip("/")
+        if any(match(path) for match in self.exclude):
+            return False
+        return not self.include or any(match(path) for match in self.include)
+
+    def descend(self, folder):
+        """ Check whether the given folder has to be listed
+
+        :folder: path of the folder
+        :returns: bool
+
+        """
+        folder = folder.lstrip("/")
+        if self.max_depth is not None and self.depth(folder) >= self.max_depth:
+            return False
+        if any(match(folder) for match in self.exclude):
+            return False
+        if self.prefixes is None:
+            return True
+        return any(
+            prefix.startswith(folder) or folder.startswith(prefix)
+            for prefix in self.prefixes
+        )
+
+    def visit(self, path):
+        """ Decide how the walk handles the given entry
+
+        :path: path of a secret or folder
+        :returns: tuple of bools, whether the entry is yielded and whether it
+        is listed
+
+        """
+        if not path.endswith("/"):
+            return self.matches(path), False
+        listed = self.descend(path)
+        # Listed folders are always yielded, so callers can count the lists
+        return listed or self.matches(path), listed
+
+
+def visit(path, path_filter=None):
+    """ Decide how a walk handles the given entry, see PathFilter.visit
+
+    :path: path of a secret or folder
+    :path_filter: optional PathFilter, without one every entry is yielded and
+    every folder is listed
+    :returns: tuple of bools, whether the entry is yielded and whether it is
+    listed
+
+    """
+    if path_filter is None:
+        return True, path.endswith("/")
+    return path_filter.visit(path)
+
+
+class TreeWalker:
+
+    """Class for listing the folder tree of a secret engine concurrently."""
+
+    def __init__(self, secret, workers=8, ordered=True, path_filter=None):
+        """
+        :secret: Secret instance used to list the folders
+        :workers: maximal number of concurrent list requests
+        :ordered: if True the secrets are yielded in the same depth first
+        order as Secret.recursive_list does, otherwise they are streamed as
+        soon as their folder was listed
+        :path_filter: optional PathFilter, pruned folders are not listed
+        """
+        self.secret = secret
+        self.workers = workers
+        self.ordered = ordered
+        self.path_filter = path_filter
+
+    def walk(self, engine_path, path):
+        """ List secrets on a given path recursively
+
+        :engine_path: path of the secret engine
+        :path: path to list
+        :returns: generator for the secret list
+
+        """
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            if self.ordered:
+                yield from self._walk_ordered(executor, engine_path, path)
+            else:
+                yield from self._walk_unordered(executor, engine_path, path)
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _walk_ordered(self, executor, engine_path, path):
+        """ Depth first walk, the folders are listed ahead of time
+
+        :executor: executor running the list requests
+        :engine_path: path of the secret engine
+        :path: path to list
+        :returns: generator for the secret list
+
+        """
+
+        def expand(folder, keys):
+            entries = []
+            for key in keys:
+                child = self.secret.join(folder, key)
+                yielded, listed = visit(child, self.path_filter)
+                future = None
+                if listed:
+                    future = executor.submit(self.secret.list, engine_path, child)
+                if yielded:
+                    entries.append((child, future))
+            return iter(entries)
+
+        stack = [expand(path, self.secret.list(engine_path, path))]
+        while stack:
+            for child, future in stack[-1]:
+                yield child
+                if future is not None:
+                    stack.append(expand(child, future.result()))
+                    break
+            else:
+                stack.pop()
+
+    def _walk_unordered(self, executor, engine_path, path):
+        """ Breadth first walk, the secrets are yielded as soon as their
+        folder was listed
+
+        :executor: executor running the list requests
+        :engine_path: path of the secret engine
+        :path: path to list
+        :returns: generator for the secret list
+
+        """
+        pending = {executor.submit(self.secret.list, engine_path, path): path}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                folder = pending.pop(future)
+                children = []
+                for key in future.result():
+                    child = self.secret.join(folder, key)
+                    yielded, listed = visit(child, self.path_filter)
+                    if listed:
+                        future = executor.submit(self.secret.list, engine_path, child)
+                        pending[future] = child
+                    if yielded:
+                        children.append(child)
+                yield from children
@@ -0,0 +1,355 @@
+"""
+This module watches the secrets below a path and prints a change event for
+every added, updated or deleted secret as a json line. Folders and secrets are
+polled with adaptive intervals: entries that changed are polled again soon,
+quiet entries less and less often.
+"""
+import heapq
+import logging
+import random
+import time
+from .changes import change_event, compact_metadata, print_event
+from .exceptions import VaultHTTPError
+from .pool import bounded_map
+from .secret import (
+    add_engine_argument,
+    add_filter_arguments,
+    add_walk_arguments,
+    get_path_filter,
+)
+from .walker import visit
+
+
+class Schedule:
+
+    """Poll times of folders or secrets. The interval of an entry is reset to
+    the minimum when it changed and doubled up to the maximum when it did
+    not. Quiet entries get a random jitter, so they do not all come up in the
+    same poll."""
+
+    def __init__(self, min_interval, max_interval):
+        """
+        :min_interval: seconds between two polls of a changing entry
+        :max_interval: seconds between two polls of a quiet entry
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.intervals = {}
+        self.due_at = {}
+        self._heap = []
+
+    def add(self, path, now):
+        """ Add an entry that is due immediately
+        :returns: None
+
+        """
+        self.intervals[path] = self.min_interval
+        self._push(path, now)
+
+    def remove(self, path):
+        """ Forget an entry, its heap item is dropped when it comes up
+        :returns: None
+
+        """
+        self.intervals.pop(path, None)
+        self.due_at.pop(path, None)
+
+    def reschedule(self, path, changed, now):
+        """ Schedule the next poll of an entry after it was polled
+
+        :path: path of the entry
+        :changed: whether the entry changed since the last poll
+        :now: current monotonic time
+        :returns: None
+
+        """
+        if path not in self.intervals:
+            return
+        if changed:
+            self.intervals[path] = self.min_interval
+            self._push(path, now + self.min_interval)
+            return
+        self.intervals[path] = min(2 * self.intervals[path], self.max_interval)
+        self._push(path, now + self.intervals[path] * random.uniform(0.5, 1))
+
+    def due(self, now):
+        """ Remove the entries that are due from the schedule
+        :returns: list of paths
+
+        """
+        paths = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, path = heapq.heappop(self._heap)
+            # Items of removed or rescheduled entries are stale
+            if self.due_at.get(path) == due_at:
+                del self.due_at[path]
+                paths.append(path)
+        return paths
+
+    def next_due(self):
+        """ Time of the next due entry
+        :returns: monotonic time or None if the schedule is empty
+
+        """
+        while self._heap and self.due_at.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def _push(self, path, due_at):
+        self.due_at[path] = due_at
+        heapq.heappush(self._heap, (due_at, path))
+
+
+def secret_state(metadata):
+    """ State of a secret compared between two polls
+
+    :metadata: metadata of the secret
+    :returns: tuple of the current version and whether it is deleted
+
+    """
+    version = metadata["current_version"]
+    details = metadata["versions"].get(str(version), {})
+    return version, bool(details.get("deletion_time") or details.get("destroyed"))
+
+
+class Watcher:
+
+    """Polls the folders and secrets below a path and yields change events.
+    The first poll only records the tree, the events are yielded from the
+    second poll on."""
+
+    def __init__(
+        self,
+        vault,
+        engine_path,
+        path,
+        workers=8,
+        min_interval=5,
+        max_interval=600,
+        with_data=False,
+        path_filter=None,
+        clock=time.monotonic,
+    ):
+        """
+        :vault: Vault class
+        :engine_path: path of the secret engine
+        :path: path to watch
+        :workers: number of concurrent requests
+        :min_interval: seconds between two polls of a changing entry
+        :max_interval: seconds between two polls of a quiet entry
+        :with_data: add the data of added and updated secrets to the events
+        :path_filter: optional PathFilter, pruned folders are not listed
+        :clock: function returning the monotonic time in seconds
+        """
+        self.vault = vault
+        self.engine_path = engine_path
+        self.workers = workers
+        self.with_data = with_data
+        self.path_filter = path_filter
+        self.clock = clock
+        self.root = vault.secret.join(path, "").lstrip("/")
+        # Listed keys of every folder and state of every secret
+        self.folders = {}
+        self.states = {}
+        self.folder_schedule = Schedule(min_interval, max_interval)
+        self.secret_schedule = Schedule(min_interval, max_interval)
+        self.folder_schedule.add(self.root, clock())
+        self.baseline = True
+
+    def list_folder(self, folder):
+        """ List a folder, a missing folder is empty
+        :returns: set of keys
+
+        """
+        try:
+            return set(self.vault.secret.list(self.engine_path, folder))
+        except VaultHTTPError as error:
+            if error.status_code != 404:
+                raise
+            return set()
+
+    def check_secret(self, item):
+        """ Read the metadata of a secret and its data if it changed
+
+        :item: tuple of the path and the state of the last poll or None
+        :returns: tuple of metadata and data, metadata is None if the secret
+        does not exist anymore, data is None unless it was read
+
+        """
+        secret, previous = item
+        try:
+            metadata = self.vault.secret.read_metadata(self.engine_path, secret)
+        except VaultHTTPError as error:
+            if error.status_code != 404:
+                raise
+            return None, None
+        state = secret_state(metadata)
+        data = None
+        # The first poll only records the tree and needs no data
+        if self.with_data and not self.baseline and not state[1] and state != previous:
+            data, _ = self.vault.secret.read_current(self.engine_path, secret)
+        return metadata, data
+
+    def poll(self):
+        """ Poll all folders and secrets that are due
+        :returns: generator of change events
+
+        """
+        now = self.clock()
+        folders = self.folder_schedule.due(now)
+        # Folders found in this poll are due immediately
+        while folders:
+            listings = bounded_map(self.list_folder, folders, self.workers)
+            for folder, keys in listings:
+                yield from self._update_folder(folder, keys, now)
+            folders = self.folder_schedule.due(now)
+
+        secrets = [
+            (secret, self.states.get(secret))
+            for secret in self.secret_schedule.due(now)
+        ]
+        results = bounded_map(self.check_secret, secrets, self.workers)
+        for (secret, previous), (metadata, data) in results:
+            if metadata is None:
+                yield from self._forget_secret(secret)
+                continue
+            state = secret_state(metadata)
+            self.states[secret] = state
+            self.secret_schedule.reschedule(secret, state != previous, now)
+            event = None
+            if previous is None:
+                event = None if state[1] else "added"
+            elif state[1] and not previous[1]:
+                event = "deleted"
+            elif state != previous and not state[1]:
+                event = "updated"
+            if event is not None and not self.baseline:
+                change = change_event(event, secret, compact_metadata(metadata))
+                if data is not None:
+                    change["data"] = data
+                yield change
+        self.baseline = False
+
+    def _update_folder(self, folder, keys, now):
+        """ Compare a listing with the last one of the folder
+        :returns: generator of change events
+
+        """
+        previous = self.folders.get(folder, set())
+        self.folders[folder] = keys
+        self.folder_schedule.reschedule(folder, keys != previous, now)
+        for key in keys - previous:
+            child = self.vault.secret.join(folder, key).lstrip("/")
+            yielded, listed = visit(child, self.path_filter)
+            if listed:
+                self.folder_schedule.add(child, now)
+            elif yielded and not child.endswith("/"):
+                self.secret_schedule.add(child, now)
+        for key in previous - keys:
+            child = self.vault.secret.join(folder, key).lstrip("/")
+            if child.endswith("/"):
+                yield from self._forget_folder(child)
+            else:
+                yield from self._forget_secret(child)
+
+    def _forget_folder(self, folder):
+        """ Forget a removed folder and everything below it
+        :returns: generator of change events
+
+        """
+        for other in [other for other in self.folders if other.startswith(folder)]:
+            del self.folders[other]
+            self.folder_schedule.remove(other)
+        for secret in [secret for secret in self.states if secret.startswith(folder)]:
+            yield from self._forget_secret(secret)
+
+    def _forget_secret(self, secret):
+        """ Forget a removed secret
+        :returns: generator of change events
+
+        """
+        self.secret_schedule.remove(secret)
+        state = self.states.pop(secret, None)
+        if state is not None and not state[1]:
+            yield change_event("deleted", secret)
+
+    def next_poll(self):
+        """ Time of the next poll
+        :returns: monotonic time
+
+        """
+        times = [
+            due
+            for due in (
+                self.folder_schedule.next_due(),
+                self.secret_schedule.next_due(),
+            )
+            if due is not None
+        ]
+        if not times:
+            return self.clock() + self.folder_schedule.max_interval
+        return min(times)
+
+    def watch(self):
+        """ Poll forever and sleep until the next entry is due
+        :returns: generator of change events
+
+        """
+        while True:
+            yield from self.poll()
+            time.sleep(max(0, self.next_poll() - self.clock()))
+
+
+def run(args, vault):
+    """Run this module
+    :returns: None
+
+    """
+    watcher = Watcher(
+        vault,
+        args.engine,
+        args.vaultpath,
+        args.workers,
+        args.min_interval,
+        args.max_interval,
+        args.data,
+        get_path_filter(args),
+    )
+    logging.info("Watching %s, stop with ctrl-c", args.vaultpath)
+    try:
+        for change in watcher.watch():
+            print_event(change, as_json=True)
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_commandline_arguments(subparsers, config):
+    """ Commandline argument parser for this module
+    :returns: None
+
+    """
+    parser = subparsers.add_parser("secret-watch")
+    parser.set_defaults(func=run)
+    add_engine_argument(parser, config)
+    parser.add_argument("vaultpath", help="path of the secrets to watch")
+    parser.add_argument(
+        "--min-interval",
+        type=float,
+        default=5,
+        help="seconds between two polls of a folder or secret that changed",
+    )
+    parser.add_argument(
+        "--max-interval",
+        type=float,
+        default=600,
+        help="seconds between two polls of a folder or secret that did not "
+        + "change for a while, updates of quiet secrets are noticed within "
+        + "this time",
+    )
+    parser.add_argument(
+        "--data",
+        help="add the data of added and updated secrets to the events",
+        action="store_true",
+    )
+    add_walk_arguments(parser)
+    add_filter_arguments(parser)
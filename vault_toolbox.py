@@ -9,23 +9,53 @@ However, extensions are most welcome.
 """
 import logging
 import argparse
-import yaml
-
-try:
-    import argcomplete
-except ImportError:
-    pass
-import vault.unwrap
-import vault.export_to_html
-import vault.user
-import vault.secret
-import vault.totp
-import vault.policy
-import vault.group
-import vault.import_from_csv
-from vault.vault import Vault
+import importlib
+import sys
 import os
 
+# Registry of all subcommands and the module implementing them. A module is
+# only imported when one of its subcommands is run or completed, so the
+# startup and tab completion do not pay for requests and the other modules.
+SUBCOMMANDS = {
+    "secret-add": "vault.secret",
+    "secret-del": "vault.secret",
+    "secret-list": "vault.secret",
+    "secret-read": "vault.secret",
+    "secret-mv": "vault.secret",
+    "secret-dump": "vault.dump",
+    "secret-restore": "vault.dump",
+    "secret-index": "vault.index",
+    "secret-find": "vault.find",
+    "secret-sync": "vault.sync",
+    "secret-prune": "vault.prune",
+    "secret-stats": "vault.secret_stats",
+    "secret-changes": "vault.changes",
+    "secret-watch": "vault.watch",
+    "user-add": "vault.user",
+    "user-del": "vault.user",
+    "user-list": "vault.user",
+    "totp-add": "vault.totp",
+    "totp-list": "vault.totp",
+    "totp-read": "vault.totp",
+    "totp-del": "vault.totp",
+    "totp-import": "vault.totp",
+    "unwrap": "vault.unwrap",
+    "export": "vault.export_to_html",
+    "import_from_csv": "vault.import_from_csv",
+    "policy-add": "vault.policy",
+    "policy-del": "vault.policy",
+    "policy-list": "vault.policy",
+    "policy-read": "vault.policy",
+    "policy-export": "vault.policy",
+    "policy-import": "vault.policy",
+    "group-add": "vault.group",
+    "group-del": "vault.group",
+    "group-list": "vault.group",
+    "group-read": "vault.group",
+    "group-yaml-export": "vault.group",
+    "group-yaml-import": "vault.group",
+}
+
 
 def main():
     """Entrypoint when used as an executable
@@ -35,17 +65,76 @@ def main():
     # Initialize Logging
     logging.basicConfig(level=logging.DEBUG)
 
-    config = read_config()
-    args = get_commandline_arguments(config)
+    subcommand = find_subcommand()
+    # The config is only needed for the defaults of a subcommand
+    config = read_config() if subcommand is not None else None
+    args = get_commandline_arguments(config, subcommand)
     init_logging(args)
     try:
-        args.func(args, Vault(args.url, args.token))
+        func = args.func
     except AttributeError:
         print(args.help)
+        return
+
+    # Imported here to keep requests out of the startup of the completion
+    # pylint: disable=import-outside-toplevel
+    from vault.vault import Vault
+    from vault.exceptions import VaultError
+    from vault.retry import RetryPolicy
+    from vault.metrics import Metrics
+    from vault.cache import DiskBackend, ResponseCache
+
+    limiter = get_limiter(args)
+    if limiter is not None and getattr(args, "workers", None) is not None:
+        # Let the limiter and not the worker pool bound the concurrency
+        args.workers = max(args.workers, limiter.maximum)
+    vault_instance = Vault(
+        args.url,
+        args.token,
+        pool_size=args.pool_size,
+        connect_timeout=args.connect_timeout,
+        read_timeout=args.read_timeout,
+        retry_policy=RetryPolicy(retries=args.retries, budget=args.retry_budget),
+        limiter=limiter,
+        metrics=Metrics() if want_stats(args) else None,
+    )
+    if not args.no_cache:
+        backend = DiskBackend(args.cache_dir) if args.cache_dir else None
+        vault_instance.cache = ResponseCache(max_size=args.cache_size, backend=backend)
+    try:
+        func(args, vault_instance)
+    except VaultError as error:
+        logging.error(error)
+        exit(1)
+    finally:
+        vault_instance.close()
+        if vault_instance.metrics is not None:
+            report_stats(args, vault_instance.metrics)
+
 
+def find_subcommand():
+    """Find the subcommand in the commandline without parsing it, during tab
+    completion the commandline is taken from argcomplete
 
-def get_commandline_arguments(config):
+    :returns: name of the subcommand or None if there is none
+
+    """
+    if "_ARGCOMPLETE" in os.environ:
+        words = os.environ.get("COMP_LINE", "").split()[1:]
+    else:
+        words = sys.argv[1:]
+    for word in words:
+        if word in SUBCOMMANDS:
+            return word
+    return None
+
+
+def get_commandline_arguments(config, subcommand=None):
     """ Commandline argument parser for this module
+
+    :config: parsed config.yaml or None
+    :subcommand: name of the subcommand whose module is loaded, the other
+    subcommands are only registered by name
     :returns: namespace with parsed arguments
 
     """
@@ -58,22 +147,91 @@ def get_commandline_arguments(config):
     group.add_argument(
         "-q", "--quiet", help="no output except errors", action="store_true"
     )
+    connection = {}
+    if config is not None and "connection" in config:
+        connection = config["connection"]
+    parser.add_argument(
+        "--pool-size",
+        type=int,
+        default=connection.get("pool_size", 10),
+        help="number of keep-alive connections kept open to vault",
+    )
+    parser.add_argument(
+        "--connect-timeout",
+        type=float,
+        default=connection.get("connect_timeout", 5),
+        help="seconds to wait for a connection to vault",
+    )
+    parser.add_argument(
+        "--read-timeout",
+        type=float,
+        default=connection.get("read_timeout", 60),
+        help="seconds to wait for a response from vault",
+    )
+    parser.add_argument(
+        "--retries",
+        type=int,
+        default=connection.get("retries", 5),
+        help="number of retries of a request after a transient error",
+    )
+    parser.add_argument(
+        "--retry-budget",
+        type=int,
+        default=connection.get("retry_budget"),
+        help="maximal number of retries of all requests of this run, "
+        + "unlimited if not given",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        default=connection.get("max_concurrency"),
+        help="maximal number of requests in flight or 'auto' to adapt it to "
+        + "the latency and rate limits of vault, up to the pool size",
+    )
+    cache = {}
+    if config is not None and "cache" in config:
+        cache = config["cache"]
+    parser.add_argument(
+        "--no-cache",
+        help="do not cache responses of read mostly endpoints like sys/auth",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=cache.get("directory"),
+        help="directory to share cached responses between runs, "
+        + "only kept in memory if not given",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=cache.get("max_size", 16 * 1024 * 1024),
+        help="maximal size of the responses cached in memory in bytes",
+    )
+    parser.add_argument(
+        "--stats",
+        help="print a summary of the requests per endpoint to stderr at exit",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--stats-json", help="write the request statistics as json to this file"
+    )
+    parser.add_argument(
+        "--stats-prometheus",
+        help="write the request statistics in the prometheus textfile format "
+        + "to this file",
+    )
     # Add parsers for subcommand
     subparsers = parser.add_subparsers(help="subcommand", dest="subcommand")
 
-    for subcommand in [
-        vault.secret,
-        vault.user,
-        vault.totp,
-        vault.unwrap,
-        vault.export_to_html,
-        vault.import_from_csv,
-        vault.policy,
-        vault.group,
-    ]:
-        subcommand.parse_commandline_arguments(subparsers, config)
-
-    for _, subparser in subparsers.choices.items():
+    if subcommand is not None:
+        module = importlib.import_module(SUBCOMMANDS[subcommand])
+        module.parse_commandline_arguments(subparsers, config)
+    loaded = list(subparsers.choices.values())
+    for name in SUBCOMMANDS:
+        if name not in subparsers.choices:
+            subparsers.add_parser(name)
+
+    for subparser in loaded:
         if config is not None and "token" in config:
             subparser.add_argument(
                 "token",
@@ -96,12 +254,76 @@ def get_commandline_arguments(config):
         else:
             subparser.add_argument("url", help="Url of vault server")
 
-    if "argcomplete" in globals():
-        argcomplete.autocomplete(parser)
+    if "_ARGCOMPLETE" in os.environ:
+        try:
+            import argcomplete  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            pass
+        else:
+            argcomplete.autocomplete(parser)
     args = parser.parse_args()
     return args
 
 
+def get_limiter(commandline_args):
+    """Create the concurrency limiter given in the commandline arguments
+
+    :commandline_args: namespace with commandline arguments including
+    max_concurrency and pool_size
+    :returns: limiter or None if the concurrency is not limited
+
+    """
+    # pylint: disable=import-outside-toplevel
+    from vault.limiter import AdaptiveLimiter, ConcurrencyLimiter
+
+    max_concurrency = commandline_args.max_concurrency
+    if max_concurrency is None:
+        return None
+    if str(max_concurrency) == "auto":
+        return AdaptiveLimiter(maximum=commandline_args.pool_size)
+    try:
+        return ConcurrencyLimiter(int(max_concurrency))
+    except ValueError:
+        logging.error("--max-concurrency must be a number or 'auto'")
+        exit(1)
+
+
+def want_stats(commandline_args):
+    """Check whether request statistics are requested
+
+    :commandline_args: namespace with commandline arguments
+    :returns: True if the requests should be measured
+
+    """
+    return bool(
+        commandline_args.stats
+        or commandline_args.stats_json
+        or commandline_args.stats_prometheus
+    )
+
+
+def report_stats(commandline_args, metrics):
+    """Output the request statistics as given in the commandline arguments
+
+    :commandline_args: namespace with commandline arguments
+    :metrics: Metrics of the run
+    :returns: None
+
+    """
+    if commandline_args.stats:
+        print(metrics.summary(), file=sys.stderr)
+    if commandline_args.stats_json:
+        with open(commandline_args.stats_json, "w") as f:
+            f.write(metrics.to_json())
+    if commandline_args.stats_prometheus:
+        # Write to a temporary file first, the textfile collector must never
+        # read a partially written file
+        tmp_file = commandline_args.stats_prometheus + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.write(metrics.to_prometheus())
+        os.replace(tmp_file, commandline_args.stats_prometheus)
+
+
 def init_logging(commandline_args):
     """Initialize logging as given in the commandline arguments
 
@@ -136,6 +358,8 @@ def read_config():
     """Parses config and returns config values
     :returns: config as dict
     """
+    import yaml  # pylint: disable=import-outside-toplevel
+
     dirname = os.path.dirname(__file__)
     config_path = os.path.join(dirname, 'config.yaml')
     try: